@@ -0,0 +1,137 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""
+Measures memory allocated while computing product listings (tracemalloc).
+
+Usage:
+
+    python -m benchmarks.bench_allocations --scale small --subpackages 3000
+
+Builds the listings of a small build and of a huge build (with the given
+number of subpackages) on a generated composedb and reports the time, the
+peak of memory allocated during the call and the memory retained by the
+result. Use --tree-index to take the package lookups from the in-memory tree
+index, so the numbers are not dominated by allocations of DB rows.
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.composedb import SCALES, create_database, label_name, sample_builds
+from benchmarks.suite import git_revision, koji_sessions
+from product_listings_manager import products
+from product_listings_manager.tree_index import TreeIndex
+
+
+def measure(func, repeat):
+    func()  # warm up caches
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = func()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+
+    return {
+        "median_ms": statistics.median(times) * 1000,
+        "peak_kib": (peak - baseline) / 1024,
+        "retained_kib": (retained - baseline) / 1024,
+    }
+
+
+def run(scale, database_url, repeat, tree_index):
+    create_database(database_url, scale)
+    engine = create_engine(database_url)
+    session_factory = sessionmaker(bind=engine)
+    builds = sample_builds(scale)
+    label = label_name(scale.labels - 1)
+
+    index = None
+    if tree_index:
+        index = TreeIndex(products.latest_tree_ids, refresh_interval=3600)
+        with session_factory() as db:
+            index.refresh(db)
+
+    results = {}
+    with (
+        koji_sessions(scale, None),
+        patch.object(products, "TREE_INDEX", index),
+    ):
+        for build in ("small_build", "huge_build"):
+
+            def call(build=build):
+                with session_factory() as db:
+                    return products.get_product_listings(db, label, builds[build])
+
+            results[build] = measure(call, repeat)
+            print(
+                f"{build:12} {results[build]['median_ms']:10.2f} ms"
+                f" {results[build]['peak_kib']:10.1f} KiB peak"
+                f" {results[build]['retained_kib']:10.1f} KiB retained"
+            )
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument(
+        "--subpackages",
+        type=int,
+        default=3000,
+        help="Number of subpackages of the huge build",
+    )
+    parser.add_argument(
+        "--database-url",
+        help="Scratch database to use instead of a temporary SQLite database",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--tree-index",
+        action="store_true",
+        help="Look up packages in the in-memory tree index",
+    )
+    parser.add_argument("--output", help="Write results to a JSON file")
+    args = parser.parse_args()
+
+    scale = dataclasses.replace(
+        SCALES[args.scale], huge_package_subpackages=args.subpackages
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database_url = args.database_url or "sqlite:///" + os.path.join(
+            tmpdir, "allocations.db"
+        )
+        results = {
+            "revision": git_revision(),
+            "scale": args.scale,
+            "subpackages": args.subpackages,
+            "tree_index": args.tree_index,
+            "builds": run(scale, database_url, args.repeat, args.tree_index),
+        }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""
+Compares JSON serialization of large API responses.
+
+Usage:
+
+    python -m benchmarks.bench_json --rows 10000
+"""
+
+import argparse
+import datetime
+import json
+import timeit
+from decimal import Decimal
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from product_listings_manager import responses
+
+ARCHES = ["aarch64", "ppc64le", "s390x", "x86_64"]
+
+
+def dbquery_rows(count):
+    """Rows similar to a SELECT from trees/packages tables."""
+    date = datetime.datetime(2024, 5, 1, 12, 30)
+    return [
+        {
+            "id": i,
+            "name": f"package-{i}",
+            "arch": ARCHES[i % len(ARCHES)],
+            "version": f"1.{i % 100}.{i % 7}",
+            "date": date + datetime.timedelta(minutes=i),
+            "size": Decimal(i) / 100,
+            "imported": 1,
+            "compatlayer": False,
+        }
+        for i in range(count)
+    ]
+
+
+def product_listings(count):
+    """Listings for a build with many subpackages in a few variants."""
+    variants = ["AppStream", "BaseOS", "CRB", "Supplementary"]
+    per_variant = max(1, count // len(variants))
+    return {
+        variant: {
+            f"package-{variant}-{i}-1.0-1.el9": {arch: list(ARCHES) for arch in ARCHES}
+            for i in range(per_variant)
+        }
+        for variant in variants
+    }
+
+
+def default_response(content):
+    """FastAPI path for endpoints without a return type annotation."""
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+ROWS_ADAPTER = TypeAdapter(list[dict[str, Any]])
+
+
+def pydantic_response(content):
+    """FastAPI path for dbquery endpoint with a return type annotation."""
+    return ROWS_ADAPTER.dump_json(ROWS_ADAPTER.validate_python(content))
+
+
+FAST_SERIALIZERS = {
+    "fast (orjson)": responses.dumps,
+}
+
+
+def run(count, repeat):
+    cases = {
+        "dbquery": (dbquery_rows(count), {"pydantic": pydantic_response}),
+        "product_listings": (
+            product_listings(count),
+            {"jsonable_encoder+json": default_response},
+        ),
+    }
+    results = {}
+    for data_name, (content, serializers) in cases.items():
+        for name, serializer in {**serializers, **FAST_SERIALIZERS}.items():
+            timer = timeit.Timer(lambda s=serializer, c=content: s(c))
+            best = min(timer.repeat(repeat=repeat, number=1))
+            results[f"{data_name}: {name}"] = best
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, seconds in run(args.rows, args.repeat).items():
+        print(f"{name:40} {seconds * 1000:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
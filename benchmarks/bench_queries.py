@@ -0,0 +1,205 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""
+Measures the Python-side overhead of the hot queries of products.
+
+Usage:
+
+    python -m benchmarks.bench_queries --scale small --repeat 200
+
+Runs precalc_treelist, get_overrides, get_module_overrides and the package
+lookup of dest_get_archs on a generated composedb, as the prebuilt Core
+statements of products ("core") and as the ORM queries they replaced ("orm").
+Reports the median time per call, the median time spent executing the
+statements in the database driver and the difference, mostly the time spent
+in SQLAlchemy and in building the result. Only the "core" functions are
+wrapped in observe_db_query, so their overhead includes the metrics.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event, select, tuple_
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.composedb import SCALES, create_database, label_name
+from benchmarks.suite import git_revision
+from product_listings_manager import models, products
+
+
+def orm_precalc_treelist(db, product, version, variant=None):
+    query = (
+        db.query(models.Trees)
+        .join(models.Trees.products)
+        .order_by(models.Trees.date.desc(), models.Trees.id.desc())
+        .filter(
+            models.Products.label == product,
+            models.Products.version == version,
+        )
+    )
+    if variant:
+        query = query.filter(models.Products.variant == variant)
+    return [row.id for row in products._latest_trees(query.all())]
+
+
+def orm_get_overrides(db, product, version, variant=None):
+    query = (
+        db.query(models.Overrides)
+        .join(models.Overrides.productref)
+        .filter(
+            models.Products.label == product,
+            models.Products.version == version,
+        )
+    )
+    if variant:
+        query = query.filter(models.Products.variant == variant)
+    overrides = {}
+    for row in query.all():
+        overrides.setdefault(row.name, {}).setdefault(row.pkg_arch, {}).setdefault(
+            row.product_arch, row.include
+        )
+    return overrides
+
+
+def orm_get_module_overrides(db, product, version, modules):
+    return (
+        db.query(models.ModuleOverrides)
+        .with_entities(
+            models.Products.variant,
+            models.ModuleOverrides.name,
+            models.ModuleOverrides.stream,
+            models.ModuleOverrides.product_arch,
+        )
+        .join(models.ModuleOverrides.productref)
+        .filter(
+            models.Products.label == product,
+            models.Products.version == version,
+            tuple_(models.ModuleOverrides.name, models.ModuleOverrides.stream).in_(
+                modules
+            ),
+        )
+        .all()
+    )
+
+
+def orm_query_dest_archs(db, trees, names_by_arch):
+    names = {name for arch_names in names_by_arch.values() for name in arch_names}
+    return (
+        db.query(models.Trees)
+        .with_entities(models.Packages.arch, models.Trees.arch, models.Packages.name)
+        .join(models.Trees.packages)
+        .filter(
+            models.Packages.arch.in_(names_by_arch),
+            models.Packages.name.in_(names),
+            models.Trees.id.in_(trees),
+            models.Trees.imported == 1,
+        )
+        .all()
+    )
+
+
+QUERIES = {
+    "precalc_treelist": (orm_precalc_treelist, products.precalc_treelist),
+    "get_overrides": (orm_get_overrides, products.get_overrides),
+    "get_module_overrides": (
+        orm_get_module_overrides,
+        products.get_module_overrides,
+    ),
+    "dest_archs": (orm_query_dest_archs, products._query_dest_archs),
+}
+
+
+def run(scale, database_url, repeat):
+    create_database(database_url, scale)
+    engine = create_engine(database_url)
+    session_factory = sessionmaker(bind=engine)
+    label = label_name(scale.labels - 1)
+    with session_factory() as db:
+        version, variants = products.get_product_info(db, label)
+        variant = variants[0]
+        trees = products.precalc_treelist(db, label, version, variant)
+        names = sorted(
+            db.execute(select(models.Packages.name).distinct().limit(10)).scalars()
+        )
+        modules = db.execute(
+            select(models.Modules.name, models.Modules.stream).distinct().limit(3)
+        ).all()
+    arguments = {
+        "precalc_treelist": (label, version, variant),
+        "get_overrides": (label, version, variant),
+        "get_module_overrides": (label, version, [tuple(m) for m in modules]),
+        "dest_archs": (trees, {"src": names, "x86_64": names}),
+    }
+
+    driver_time = [0.0]
+    started = []
+
+    def before_cursor_execute(*args):
+        started.append(time.perf_counter())
+
+    def after_cursor_execute(*args):
+        driver_time[0] += time.perf_counter() - started.pop()
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+    results = {}
+    with session_factory() as db:
+        for name, funcs in QUERIES.items():
+            for mode, func in zip(("orm", "core"), funcs):
+                func(db, *arguments[name])  # warm up caches
+                total = []
+                driver = []
+                for _ in range(repeat):
+                    driver_time[0] = 0.0
+                    start = time.perf_counter()
+                    func(db, *arguments[name])
+                    total.append(time.perf_counter() - start)
+                    driver.append(driver_time[0])
+                result = {
+                    "median_us": statistics.median(total) * 1e6,
+                    "driver_us": statistics.median(driver) * 1e6,
+                }
+                result["overhead_us"] = result["median_us"] - result["driver_us"]
+                results[f"{name}/{mode}"] = result
+                print(
+                    f"{name:22} {mode:4}"
+                    f" {result['median_us']:9.1f} us/call"
+                    f" {result['driver_us']:9.1f} us driver"
+                    f" {result['overhead_us']:9.1f} us overhead"
+                )
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument(
+        "--database-url",
+        help="Scratch database to use instead of a temporary SQLite database",
+    )
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", help="Write results to a JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database_url = args.database_url or "sqlite:///" + os.path.join(
+            tmpdir, "queries.db"
+        )
+        results = {
+            "revision": git_revision(),
+            "scale": args.scale,
+            "queries": run(SCALES[args.scale], database_url, args.repeat),
+        }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
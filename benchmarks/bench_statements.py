@@ -0,0 +1,191 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""
+Compares statements of package lookups with IN lists and array parameters.
+
+Usage:
+
+    python -m benchmarks.bench_statements --scale small --sizes 1 10 100 1000 5000
+
+Looks up the given numbers of package names in the latest trees of a label
+of a generated composedb, with the names, arches and trees bound as IN lists
+(a parameter per value) and as single array parameters (see any_of). Reports
+the number of distinct SQL strings, the longest statement, the time from
+executing the statement to sending it to the database (compiling and
+rendering) and, on PostgreSQL, the planning time (EXPLAIN SUMMARY).
+
+Statements compiled for PostgreSQL are reported for any database (SQLite
+gets IN lists in both modes, see sql_arrays).
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.composedb import SCALES, create_database, label_name
+from benchmarks.suite import git_revision
+from product_listings_manager import models, products
+from product_listings_manager.sql_arrays import any_of
+
+PLANNING_TIME_RE = re.compile(r"Planning Time: ([\d.]+) ms")
+
+FILTERS = {
+    "in_list": lambda column, values: column.in_(values),
+    "array": any_of,
+}
+
+
+def lookup_query(filter_in, trees, names, arches):
+    packages = models.Packages.__table__
+    tree_packages = models.TreePackages.__table__
+    trees_table = models.Trees.__table__
+    return (
+        select(packages.c.arch, trees_table.c.arch, packages.c.name)
+        .select_from(trees_table)
+        .join(tree_packages, tree_packages.c.trees_id == trees_table.c.id)
+        .join(packages, packages.c.id == tree_packages.c.packages_id)
+        .where(
+            filter_in(packages.c.arch, arches),
+            filter_in(packages.c.name, names),
+            filter_in(trees_table.c.id, trees),
+            trees_table.c.imported == 1,
+        )
+    )
+
+
+def planning_ms(conn, statement, parameters):
+    result = conn.exec_driver_sql(f"EXPLAIN (SUMMARY) {statement}", parameters)
+    for (line,) in result:
+        match = PLANNING_TIME_RE.search(line)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def run(scale, database_url, sizes, repeat):
+    create_database(database_url, scale)
+    engine = create_engine(database_url)
+    session_factory = sessionmaker(bind=engine)
+    label = label_name(scale.labels - 1)
+    with session_factory() as db:
+        version, variants = products.get_product_info(db, label)
+        trees = sorted(
+            {
+                tree
+                for variant in variants
+                for tree in products.precalc_treelist(db, label, version, variant)
+            }
+        )
+        all_names = sorted(
+            db.execute(select(models.Packages.name).distinct()).scalars()
+        )
+
+    sent: list[tuple[float, str, object]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        sent.append((time.perf_counter(), statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    pg_dialect = postgresql.dialect()
+    results = {}
+    for mode, filter_in in FILTERS.items():
+        render_ms = []
+        statements = set()
+        longest = 0
+        plans = []
+        pg_statements = set()
+        pg_compile_ms = []
+        with engine.connect() as conn:
+            for _ in range(repeat):
+                for size in sizes:
+                    names = (all_names * (size // len(all_names) + 1))[:size]
+                    query = lookup_query(filter_in, trees, names, ["src", "x86_64"])
+                    sent.clear()
+                    start = time.perf_counter()
+                    conn.execute(query).all()
+                    sent_at, statement, parameters = sent[0]
+                    render_ms.append((sent_at - start) * 1000)
+                    statements.add(statement)
+                    longest = max(longest, len(statement))
+                    if engine.dialect.name == "postgresql":
+                        plans.append(planning_ms(conn, statement, parameters))
+                    start = time.perf_counter()
+                    expanded = query.compile(
+                        dialect=pg_dialect
+                    ).construct_expanded_state()
+                    pg_compile_ms.append((time.perf_counter() - start) * 1000)
+                    pg_statements.add(expanded.statement)
+        results[mode] = {
+            "distinct_statements": len(statements),
+            "longest_statement_bytes": longest,
+            "median_render_ms": statistics.median(render_ms),
+            "max_render_ms": max(render_ms),
+            "median_planning_ms": statistics.median(plans) if plans else None,
+            "postgresql_distinct_statements": len(pg_statements),
+            "postgresql_longest_statement_bytes": max(map(len, pg_statements)),
+            "postgresql_median_compile_ms": statistics.median(pg_compile_ms),
+        }
+        print(
+            f"{mode:8} {len(statements):5} statements"
+            f" {longest:9} bytes longest"
+            f" {results[mode]['median_render_ms']:8.3f} ms render (median)"
+            f" {results[mode]['max_render_ms']:8.3f} ms render (max)"
+            + (
+                f" {results[mode]['median_planning_ms']:8.3f} ms planning (median)"
+                if plans
+                else ""
+            )
+        )
+        print(
+            f"{'':8} {len(pg_statements):5} statements"
+            f" {results[mode]['postgresql_longest_statement_bytes']:9} bytes longest"
+            f" {results[mode]['postgresql_median_compile_ms']:8.3f} ms compile (median)"
+            " for PostgreSQL"
+        )
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1, 10, 100, 1000, 5000],
+        help="Numbers of package names to look up",
+    )
+    parser.add_argument(
+        "--database-url",
+        help="Scratch database to use instead of a temporary SQLite database",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write results to a JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database_url = args.database_url or "sqlite:///" + os.path.join(
+            tmpdir, "statements.db"
+        )
+        results = {
+            "revision": git_revision(),
+            "scale": args.scale,
+            "sizes": args.sizes,
+            "lookups": run(SCALES[args.scale], database_url, args.sizes, args.repeat),
+        }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
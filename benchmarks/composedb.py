@@ -0,0 +1,423 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""
+Generates a synthetic composedb with realistic shapes.
+
+Usage:
+
+    python -m benchmarks.composedb --scale medium --database-url sqlite:///plm.db
+
+WARNING: All PLM tables in the target database are dropped first, use only
+a scratch database.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import random
+import time
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import create_engine, event, insert, text
+
+from product_listings_manager.models import (
+    BaseModel,
+    MatchVersions,
+    ModuleOverrides,
+    Modules,
+    Overrides,
+    Packages,
+    Products,
+    TreeModules,
+    TreePackages,
+    TreeProductMap,
+    Trees,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHES = ("x86_64", "aarch64", "ppc64le", "s390x")
+# Packages from this arch are shipped in compat trees for x86_64
+COMPAT_ARCH = "i686"
+BATCH_SIZE = 10000
+
+
+@dataclass(frozen=True)
+class Scale:
+    labels: int
+    versions: int
+    variants: int
+    source_packages: int
+    # Every n-th source package is huge (like kernel or texlive)
+    huge_package_every: int = 500
+    huge_package_subpackages: int = 300
+    # Older trees per variant and arch superseded by the latest ones
+    tree_history: int = 1
+    modules: int = 20
+    # Overrides per product version, split between its variants
+    overrides: int = 50
+    match_versions: int = 10
+    seed: int = 0
+
+
+SCALES = {
+    "small": Scale(labels=2, versions=2, variants=3, source_packages=100),
+    "medium": Scale(labels=5, versions=3, variants=5, source_packages=1000),
+    "large": Scale(labels=10, versions=3, variants=6, source_packages=5000),
+}
+
+
+def label_name(label):
+    return f"RHEL-{label + 1}"
+
+
+def product_version(version):
+    return f"{version + 1}.0.0"
+
+
+def variant_name(variant, version):
+    return f"Variant{variant}-{product_version(version)}.GA"
+
+
+def source_name(source):
+    return f"package{source}"
+
+
+def package_version(source, version):
+    return f"{source % 7 + 1}.{version}"
+
+
+def release(version):
+    return f"1.el{version + 1}"
+
+
+def source_nvr(source, version):
+    return (
+        f"{source_name(source)}-{package_version(source, version)}-{release(version)}"
+    )
+
+
+def module_nvr(module):
+    return f"module{module}-1.0-{module + 1}00000000.abcdef"
+
+
+def subpackages(scale, source):
+    """
+    Returns list of (name, noarch) for binary packages built from a source
+    package.
+    """
+    name = source_name(source)
+    if source % scale.huge_package_every == 0:
+        count = scale.huge_package_subpackages
+    else:
+        count = 1 + source % 4
+    return [(name if i == 0 else f"{name}-sub{i}", i % 3 == 2) for i in range(count)]
+
+
+def binary_rpms(scale, source):
+    """
+    Returns list of (name, arch) for all binary RPMs of a build, including
+    debuginfo.
+    """
+    rpms = []
+    for name, noarch in subpackages(scale, source):
+        if noarch:
+            rpms.append((name, "noarch"))
+        else:
+            for arch in (*ARCHES, COMPAT_ARCH):
+                rpms.append((name, arch))
+                rpms.append((f"{name}-debuginfo", arch))
+    return rpms
+
+
+def variant_sources(scale, rng, variant):
+    """Source packages shipped in a variant; variants overlap partially."""
+    count = max(1, scale.source_packages * 2 // (scale.variants + 1))
+    sources = set(rng.sample(range(scale.source_packages), count))
+    # the huge packages are in the first variant (like BaseOS)
+    if variant == 0:
+        sources.update(range(0, scale.source_packages, scale.huge_package_every))
+    return sorted(sources)
+
+
+class _Inserter:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = {}
+        self.counts = {}
+
+    def add(self, model, **values):
+        rows = self.rows.setdefault(model, [])
+        rows.append(values)
+        if len(rows) >= BATCH_SIZE:
+            self.flush(model)
+
+    def flush(self, model=None):
+        for m in [model] if model else list(self.rows):
+            rows = self.rows.pop(m, [])
+            if rows:
+                self.conn.execute(insert(m), rows)
+                table = m.__tablename__
+                self.counts[table] = self.counts.get(table, 0) + len(rows)
+
+
+def generate(engine, scale):
+    """
+    Creates PLM tables in the database and fills them with synthetic data.
+
+    Returns number of rows created per table.
+    """
+    rng = random.Random(scale.seed)
+    BaseModel.metadata.drop_all(bind=engine)
+    BaseModel.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        rows = _Inserter(conn)
+        package_ids = {}
+
+        def package_id(name, arch, version):
+            key = (name, arch, version)
+            if key not in package_ids:
+                package_ids[key] = len(package_ids) + 1
+                rows.add(
+                    Packages,
+                    id=package_ids[key],
+                    name=name,
+                    arch=arch,
+                    version=version,
+                )
+            return package_ids[key]
+
+        sources_by_variant = [
+            variant_sources(scale, rng, variant) for variant in range(scale.variants)
+        ]
+
+        modules = []
+        for module in range(scale.modules):
+            modules.append(module + 1)
+            rows.add(
+                Modules,
+                id=module + 1,
+                name=f"module{module}",
+                stream="1.0",
+                version=f"{module + 1}00000000",
+            )
+
+        product_id = 0
+        tree_id = 0
+        start_date = datetime.datetime(2020, 1, 1)
+        for label in range(scale.labels):
+            for name in rng.sample(
+                [source_name(s) for s in range(scale.source_packages)],
+                min(scale.match_versions, scale.source_packages),
+            ):
+                rows.add(MatchVersions, name=name, product=label_name(label))
+
+            for version in range(scale.versions):
+                for variant, sources in enumerate(sources_by_variant):
+                    product_id += 1
+                    rows.add(
+                        Products,
+                        id=product_id,
+                        label=label_name(label),
+                        version=product_version(version),
+                        variant=variant_name(variant, version),
+                        allow_source_only=variant == 0,
+                    )
+
+                    tree_arches = [(arch, False) for arch in ARCHES]
+                    tree_arches.append(("x86_64", True))
+                    for arch, compatlayer in tree_arches:
+                        package_arches = (
+                            (COMPAT_ARCH,) if compatlayer else (arch, "noarch", "src")
+                        )
+                        packages = [
+                            package_id(name, package_arch, pkg_version)
+                            for source in sources
+                            for pkg_version in [package_version(source, version)]
+                            for name, package_arch in binary_rpms(scale, source)
+                            + [(source_name(source), "src")]
+                            if package_arch in package_arches
+                        ]
+                        for history in range(scale.tree_history + 1):
+                            tree_id += 1
+                            date = start_date + datetime.timedelta(
+                                days=label * 100 + version * 10 + history,
+                                seconds=tree_id,
+                            )
+                            rows.add(
+                                Trees,
+                                id=tree_id,
+                                name=f"{label_name(label)}-{variant}-{arch}-{history}",
+                                buildname=f"compose-{tree_id}",
+                                date=date,
+                                arch=arch,
+                                imported=1,
+                                compatlayer=compatlayer,
+                            )
+                            rows.add(
+                                TreeProductMap, tree_id=tree_id, product_id=product_id
+                            )
+                            for package in packages:
+                                rows.add(
+                                    TreePackages, trees_id=tree_id, packages_id=package
+                                )
+                            if not compatlayer:
+                                for module in modules[variant :: scale.variants]:
+                                    rows.add(
+                                        TreeModules, trees_id=tree_id, modules_id=module
+                                    )
+
+                    for _ in range(scale.overrides // scale.variants):
+                        source = rng.choice(sources)
+                        name, _noarch = rng.choice(subpackages(scale, source))
+                        rows.add(
+                            Overrides,
+                            name=name,
+                            pkg_arch=rng.choice(ARCHES),
+                            product_arch=rng.choice(ARCHES),
+                            product=product_id,
+                            include=rng.random() < 0.5,
+                        )
+                    for module in modules[variant :: scale.variants][:2]:
+                        rows.add(
+                            ModuleOverrides,
+                            name=f"module{module - 1}",
+                            stream="1.0",
+                            product=product_id,
+                            product_arch=rng.choice(ARCHES),
+                        )
+        rows.flush()
+
+    # update planner statistics for the new data
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    return rows.counts
+
+
+def sample_builds(scale):
+    """
+    Returns NVRs of builds to query in benchmarks: a small build, a build
+    with many subpackages and a build which is not shipped anywhere.
+    """
+    version = scale.versions - 1
+    return {
+        "small_build": source_nvr(1, version),
+        "huge_build": source_nvr(0, version),
+        "unshipped_build": f"unshipped-1.0-{release(version)}",
+        "module_build": module_nvr(0),
+    }
+
+
+class FakeKojiSession:
+    """
+    In-process stand-in for koji.ClientSession serving builds of the
+    generated composedb.
+    """
+
+    def __init__(self, scale):
+        self.scale = scale
+        self.builds = {}
+        self.rpms = {}
+        for version in range(scale.versions):
+            for source in range(scale.source_packages):
+                self._add_build(source, version)
+        self._add_build(None, scale.versions - 1)
+        for module in range(scale.modules):
+            nvr = module_nvr(module)
+            name, stream, module_version = nvr.rsplit("-", 2)
+            build_id = len(self.builds) + 1
+            self.builds[nvr] = {
+                "id": build_id,
+                "nvr": nvr,
+                "package_name": name,
+                "version": stream,
+                "release": module_version,
+                "extra": {
+                    "typeinfo": {"module": {"name": f"module{module}", "stream": "1.0"}}
+                },
+            }
+            self.rpms[build_id] = []
+
+    def _add_build(self, source, version):
+        if source is None:
+            name, pkg_version, rpms = "unshipped", "1.0", [("unshipped", "x86_64")]
+        else:
+            name = source_name(source)
+            pkg_version = package_version(source, version)
+            rpms = binary_rpms(self.scale, source)
+        rel = release(version)
+        build_id = len(self.builds) + 1
+        nvr = f"{name}-{pkg_version}-{rel}"
+        self.builds[nvr] = {
+            "id": build_id,
+            "nvr": nvr,
+            "package_name": name,
+            "version": pkg_version,
+            "release": rel,
+            "extra": None,
+        }
+        self.rpms[build_id] = [
+            {
+                "name": rpm_name,
+                "arch": arch,
+                "version": pkg_version,
+                "release": rel,
+                "nvr": f"{rpm_name}-{pkg_version}-{rel}",
+                "build_id": build_id,
+            }
+            for rpm_name, arch in [(name, "src"), *rpms]
+        ]
+
+    def getAPIVersion(self):  # noqa: N802
+        return 1
+
+    def getBuild(self, buildInfo, strict=False):  # noqa: N802, N803
+        import koji
+
+        build = self.builds.get(buildInfo)
+        if build is None and strict:
+            raise koji.GenericError(f"No such build: {buildInfo!r}")
+        return build
+
+    def listRPMs(self, buildID=None):  # noqa: N802, N803
+        return self.rpms.get(buildID, [])
+
+
+def _fast_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA synchronous = OFF")
+    cursor.execute("PRAGMA journal_mode = MEMORY")
+    cursor.close()
+
+
+def create_database(url, scale):
+    engine = create_engine(url)
+    if url.startswith("sqlite"):
+        event.listen(engine, "connect", _fast_sqlite)
+    start = time.perf_counter()
+    counts = generate(engine, scale)
+    logger.info(
+        "Generated composedb in %.1fs: %s",
+        time.perf_counter() - start,
+        json.dumps(counts),
+    )
+    engine.dispose()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    scale = Scale(**{**asdict(SCALES[args.scale]), "seed": args.seed})
+    counts = create_database(args.database_url, scale)
+    print(json.dumps(counts, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""
+Fake koji hub serving builds of a synthetic composedb.
+
+Usage:
+
+    python -m benchmarks.fakehub --scale medium --port 8081 --latency 0.05
+
+Only getAPIVersion, getBuild, listRPMs and multiCall are implemented. Each
+HTTP request is delayed by the given latency to simulate a remote hub.
+"""
+
+import argparse
+import logging
+import random
+import socketserver
+import threading
+import time
+from dataclasses import asdict
+from xmlrpc.client import Fault
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+import koji
+
+from benchmarks.composedb import SCALES, FakeKojiSession, Scale
+
+logger = logging.getLogger(__name__)
+
+METHODS = ("getAPIVersion", "getBuild", "listRPMs")
+
+
+class FakeHub:
+    def __init__(self, session, latency=0.0, jitter=0.0):
+        self.session = session
+        self.latency = latency
+        self.jitter = jitter
+
+    def _dispatch(self, method, params):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if method == "multiCall":
+            return [self._multicall_item(call) for call in params[0]]
+        return self._call(method, params)
+
+    def _call(self, method, params):
+        if method not in METHODS:
+            raise Fault(koji.GenericError.faultCode, f"Invalid method: {method}")
+
+        args, kwargs = koji.decode_args(*params)
+        try:
+            return getattr(self.session, method)(*args, **kwargs)
+        except koji.GenericError as e:
+            raise Fault(e.faultCode, str(e))
+
+    def _multicall_item(self, call):
+        try:
+            return [self._call(call["methodName"], call["params"])]
+        except Fault as e:
+            return {"faultCode": e.faultCode, "faultString": e.faultString}
+
+
+class _RequestHandler(SimpleXMLRPCRequestHandler):
+    # accept any path, e.g. /kojihub
+    rpc_paths = ()
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+class FakeHubServer(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+    def __init__(self, address, hub):
+        super().__init__(
+            address, requestHandler=_RequestHandler, allow_none=True, logRequests=False
+        )
+        self.register_instance(hub)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/kojihub"
+
+
+def start_fake_hub(scale, latency=0.0, jitter=0.0, host="127.0.0.1", port=0):
+    """Starts the server in a background thread; returns the server."""
+    hub = FakeHub(FakeKojiSession(scale), latency=latency, jitter=jitter)
+    server = FakeHubServer((host, port), hub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Delay for each request (seconds)"
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="Maximum random delay added to the latency (seconds)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    scale = Scale(**{**asdict(SCALES[args.scale]), "seed": args.seed})
+    hub = FakeHub(FakeKojiSession(scale), latency=args.latency, jitter=args.jitter)
+    with FakeHubServer((args.host, args.port), hub) as server:
+        logger.info("Serving fake koji hub at %s", server.url)
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
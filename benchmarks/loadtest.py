@@ -0,0 +1,282 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""
+Load test with a mix of API requests at a target concurrency.
+
+Usage:
+
+    python -m benchmarks.loadtest --scale medium --concurrency 16 --duration 30
+
+By default, the app is started in-process with uvicorn on a generated
+temporary SQLite composedb and a fake koji hub; all users are authorized to
+use dbquery. Use --url to test an already running instance serving a
+composedb generated with the same --scale (use --negotiate for dbquery).
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+import requests
+import uvicorn
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.composedb import (
+    SCALES,
+    create_database,
+    label_name,
+    module_nvr,
+    source_nvr,
+)
+from benchmarks.suite import DBQUERY_TREE_PACKAGES, benchmark_app, koji_sessions
+
+ROUTES = (
+    "product-info",
+    "product-labels",
+    "product-listings",
+    "module-product-listings",
+    "dbquery",
+)
+DEFAULT_MIX = (
+    "product-info=20,product-labels=5,product-listings=50,"
+    "module-product-listings=15,dbquery=10"
+)
+
+
+def parse_mix(value):
+    """Parses route weights, e.g. "product-info=1,product-listings=3"."""
+    mix = {}
+    for item in value.split(","):
+        route, _, weight = item.partition("=")
+        if route not in ROUTES:
+            raise argparse.ArgumentTypeError(f"Unknown route: {route}")
+        try:
+            mix[route] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Bad weight for {route}: {weight}")
+    return mix
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of sorted values."""
+    index = max(0, int(len(sorted_values) * percent / 100 + 0.5) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class RequestFactory:
+    """Creates random requests for the routes of a generated composedb."""
+
+    def __init__(self, scale, base_url, rng):
+        self.scale = scale
+        self.api = base_url.rstrip("/") + "/api/v1.0"
+        self.rng = rng
+
+    def label(self):
+        return label_name(self.rng.randrange(self.scale.labels))
+
+    def request(self, route):
+        if route == "product-info":
+            return "GET", f"{self.api}/product-info/{self.label()}", None
+        if route == "product-labels":
+            return "GET", f"{self.api}/product-labels", None
+        if route == "product-listings":
+            nvr = source_nvr(
+                self.rng.randrange(self.scale.source_packages),
+                self.rng.randrange(self.scale.versions),
+            )
+            return "GET", f"{self.api}/product-listings/{self.label()}/{nvr}", None
+        if route == "module-product-listings":
+            nvr = module_nvr(self.rng.randrange(self.scale.modules))
+            return (
+                "GET",
+                f"{self.api}/module-product-listings/{self.label()}/{nvr}",
+                None,
+            )
+        query = dict(DBQUERY_TREE_PACKAGES)
+        query["params"] = {"tree_id": self.rng.randrange(1, 100)}
+        return "POST", f"{self.api}/dbquery", query
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, route, latency, ok):
+        with self.lock:
+            self.latencies[route].append(latency)
+            if not ok:
+                self.errors[route] += 1
+
+    def summary(self, duration):
+        routes = {}
+        for route, latencies in [*self.latencies.items(), ("all", self.all())]:
+            latencies = sorted(latencies)
+            errors = sum(self.errors.values()) if route == "all" else self.errors[route]
+            routes[route] = {
+                "requests": len(latencies),
+                "errors": errors,
+                "error_rate": errors / len(latencies) if latencies else 0.0,
+                "throughput_rps": len(latencies) / duration,
+                "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+                "p95_ms": percentile(latencies, 95) * 1000 if latencies else None,
+                "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+                "max_ms": latencies[-1] * 1000 if latencies else None,
+            }
+        return {"duration_seconds": duration, "routes": routes}
+
+    def all(self):
+        return [latency for values in self.latencies.values() for latency in values]
+
+
+def worker(factory, mix, deadline, results, auth):
+    routes = list(mix)
+    weights = list(mix.values())
+    with requests.Session() as session:
+        session.auth = auth
+        while time.monotonic() < deadline:
+            route = factory.rng.choices(routes, weights)[0]
+            method, url, body = factory.request(route)
+            start = time.perf_counter()
+            try:
+                ok = session.request(method, url, json=body, timeout=60).ok
+            except requests.RequestException:
+                ok = False
+            results.add(route, time.perf_counter() - start, ok)
+
+
+def run(base_url, scale, mix, concurrency, duration, seed=0, auth=None):
+    results = Results()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(
+                RequestFactory(scale, base_url, random.Random(seed + i)),
+                mix,
+                deadline,
+                results,
+                auth,
+            ),
+        )
+        for i in range(concurrency)
+    ]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results.summary(time.monotonic() - start)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def local_server(scale, database_url, koji_latency, pool_size):
+    """Starts the app in a background thread; yields its URL."""
+    create_database(database_url, scale)
+    engine = create_engine(database_url, pool_size=pool_size, max_overflow=pool_size)
+    session_factory = sessionmaker(bind=engine)
+    with ExitStack() as stack:
+        stack.enter_context(koji_sessions(scale, koji_latency))
+        app = stack.enter_context(benchmark_app(session_factory))
+        port = free_port()
+        server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+        )
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+        try:
+            yield f"http://127.0.0.1:{port}"
+        finally:
+            server.should_exit = True
+            thread.join()
+            engine.dispose()
+
+
+def print_summary(summary):
+    print(
+        f"{'route':25} {'requests':>8} {'errors':>7} {'req/s':>8}"
+        f" {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+    for route, stats in summary["routes"].items():
+        if not stats["requests"]:
+            continue
+        print(
+            f"{route:25} {stats['requests']:8} {stats['errors']:7}"
+            f" {stats['throughput_rps']:8.1f} {stats['p50_ms']:9.1f}"
+            f" {stats['p95_ms']:9.1f} {stats['p99_ms']:9.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="URL of a running instance")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument(
+        "--database-url",
+        help="Scratch database for the local instance (default: temporary SQLite)",
+    )
+    parser.add_argument(
+        "--koji-latency",
+        type=float,
+        default=0.05,
+        help="Latency of the fake koji hub for the local instance (seconds)",
+    )
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--negotiate",
+        action="store_true",
+        help="Use GSSAPI authentication (for dbquery on a running instance)",
+    )
+    parser.add_argument("--output", help="Write results to a JSON file")
+    args = parser.parse_args()
+
+    scale = SCALES[args.scale]
+    auth = None
+    if args.negotiate:
+        from requests_gssapi import OPTIONAL, HTTPSPNEGOAuth
+
+        auth = HTTPSPNEGOAuth(mutual_authentication=OPTIONAL)
+
+    with ExitStack() as stack:
+        base_url = args.url
+        if base_url is None:
+            tmpdir = stack.enter_context(tempfile.TemporaryDirectory())
+            database_url = args.database_url or "sqlite:///" + os.path.join(
+                tmpdir, "plm.db"
+            )
+            base_url = stack.enter_context(
+                local_server(scale, database_url, args.koji_latency, args.concurrency)
+            )
+        summary = run(
+            base_url, scale, args.mix, args.concurrency, args.duration, args.seed, auth
+        )
+
+    summary["concurrency"] = args.concurrency
+    summary["mix"] = args.mix
+    print_summary(summary)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""
+Benchmarks product listings queries on synthetic composedb of several sizes.
+
+Usage:
+
+    python -m benchmarks.suite --sizes small medium --output results.json
+    python -m benchmarks.suite --compare results.json
+
+By default, a temporary SQLite database is generated for each size. Use
+--database-url to benchmark against PostgreSQL (the database is
+overwritten). Koji hub is simulated in-process, use --koji-latency to run
+a fake koji hub XML-RPC server instead. Use --db-latency to add a delay to
+each SQL statement, like round trips to a remote database.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import koji
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.composedb import (
+    SCALES,
+    FakeKojiSession,
+    create_database,
+    label_name,
+    sample_builds,
+)
+from benchmarks.fakehub import start_fake_hub
+from product_listings_manager import products
+from product_listings_manager.app import create_app
+from product_listings_manager.models import get_db, get_listings_db
+from product_listings_manager.replicas import ReplicaSet
+
+DBQUERY_TREE_PACKAGES = {
+    "query": (
+        "SELECT packages.name, packages.arch, packages.version"
+        " FROM packages"
+        " JOIN tree_packages ON tree_packages.packages_id = packages.id"
+        " WHERE tree_packages.trees_id = :tree_id"
+    ),
+    "params": {"tree_id": 1},
+}
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def add_statement_latency(engine, latency):
+    """Delays each SQL statement by the given number of seconds."""
+
+    def delay(*args):
+        time.sleep(latency)
+
+    event.listen(engine, "before_cursor_execute", delay)
+
+
+def benchmark(func, repeat, counter):
+    """Returns timing statistics for calling func repeatedly."""
+    func()  # warm up caches
+    durations = []
+    statements = counter.count
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    statements = (counter.count - statements) // repeat
+    return {
+        "min_ms": min(durations) * 1000,
+        "median_ms": statistics.median(durations) * 1000,
+        "mean_ms": statistics.fmean(durations) * 1000,
+        "max_ms": max(durations) * 1000,
+        "repeat": repeat,
+        "statements": statements,
+    }
+
+
+@contextmanager
+def benchmark_app(session_factory):
+    """The app using the benchmark DB, all users are authorized."""
+
+    def get_benchmark_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = create_app()
+    app.dependency_overrides[get_db] = get_benchmark_db
+    app.dependency_overrides[get_listings_db] = get_benchmark_db
+    with (
+        patch(
+            "product_listings_manager.models.replica_set",
+            ReplicaSet(session_factory, []),
+        ),
+        patch("product_listings_manager.rest_api_v1.ldap_config"),
+        patch(
+            "product_listings_manager.rest_api_v1.get_user",
+            return_value=("benchmark", {}),
+        ),
+        patch(
+            "product_listings_manager.rest_api_v1.has_permission",
+            return_value=True,
+        ),
+    ):
+        yield app
+
+
+@contextmanager
+def koji_sessions(scale, koji_latency):
+    """Patches koji sessions to use fake hub for the generated composedb."""
+    if koji_latency is None:
+        koji_session = FakeKojiSession(scale)
+        with patch.object(products, "get_koji_session", return_value=koji_session):
+            yield
+        return
+
+    server = start_fake_hub(scale, latency=koji_latency)
+    try:
+        with patch.object(
+            products,
+            "get_koji_session",
+            side_effect=lambda: koji.ClientSession(server.url),
+        ):
+            yield
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def run_size(size, database_url, repeat, koji_latency=None, db_latency=None):
+    scale = SCALES[size]
+    counts = create_database(database_url, scale)
+    engine = create_engine(database_url)
+    counter = StatementCounter(engine)
+    if db_latency:
+        add_statement_latency(engine, db_latency)
+    session_factory = sessionmaker(bind=engine)
+    builds = sample_builds(scale)
+    label = label_name(scale.labels - 1)
+
+    def call(func, *args):
+        def run():
+            with session_factory() as db:
+                return func(db, *args)
+
+        return run
+
+    def dbquery(client):
+        def run():
+            r = client.post("/api/v1.0/dbquery", json=DBQUERY_TREE_PACKAGES)
+            r.raise_for_status()
+
+        return run
+
+    benchmarks = {
+        "product_info": call(products.get_product_info, label),
+        "product_labels": call(products.get_product_labels),
+        "product_listings_small_build": call(
+            products.get_product_listings, label, builds["small_build"]
+        ),
+        "product_listings_huge_build": call(
+            products.get_product_listings, label, builds["huge_build"]
+        ),
+        "product_listings_unshipped_build": call(
+            products.get_product_listings, label, builds["unshipped_build"]
+        ),
+        "module_product_listings": call(
+            products.get_module_product_listings, label, builds["module_build"]
+        ),
+    }
+    results = {}
+    with (
+        koji_sessions(scale, koji_latency),
+        benchmark_app(session_factory) as app,
+    ):
+        client = TestClient(app)
+        benchmarks["dbquery_tree_packages"] = dbquery(client)
+        for name, func in benchmarks.items():
+            results[name] = benchmark(func, repeat, counter)
+            print(
+                f"{size:8} {name:35} {results[name]['median_ms']:10.2f} ms"
+                f" {results[name]['statements']:6} statements"
+            )
+    engine.dispose()
+    return {"rows": counts, "benchmarks": results}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current):
+    for size, result in current["sizes"].items():
+        base = baseline["sizes"].get(size)
+        if not base:
+            continue
+        for name, stats in result["benchmarks"].items():
+            base_stats = base["benchmarks"].get(name)
+            if not base_stats:
+                continue
+            ratio = stats["median_ms"] / base_stats["median_ms"]
+            print(
+                f"{size:8} {name:35} {base_stats['median_ms']:10.2f} ms"
+                f" -> {stats['median_ms']:10.2f} ms ({ratio:.2f}x)"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", nargs="+", choices=SCALES, default=["small", "medium"]
+    )
+    parser.add_argument(
+        "--database-url",
+        help="Scratch database to use instead of temporary SQLite databases",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--koji-latency",
+        type=float,
+        help="Use fake koji hub server with given latency per call (seconds)",
+    )
+    parser.add_argument(
+        "--db-latency",
+        type=float,
+        help="Add given latency to each SQL statement (seconds)",
+    )
+    parser.add_argument("--output", help="Write results to a JSON file")
+    parser.add_argument("--compare", help="Compare with results from a JSON file")
+    args = parser.parse_args()
+
+    results = {
+        "revision": git_revision(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "sizes": {},
+    }
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in args.sizes:
+            database_url = args.database_url or "sqlite:///" + os.path.join(
+                tmpdir, f"{size}.db"
+            )
+            results["sizes"][size] = run_size(
+                size, database_url, args.repeat, args.koji_latency, args.db_latency
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
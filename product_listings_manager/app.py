@@ -7,11 +7,13 @@ from fastapi import FastAPI
 from fastapi.responses import JSONResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
-from product_listings_manager import rest_api_v1, root
+from product_listings_manager import rest_api_v1, root, utils
 from product_listings_manager.middleware import (
     AddResponseHeaders,
+    MetricsMiddleware,
     UrlRedirectMiddleware,
 )
+from product_listings_manager.server_timing import ServerTimingMiddleware
 from product_listings_manager.tracing import init_tracing
 
 logger = logging.getLogger(__name__)
@@ -40,6 +42,19 @@ def create_app():
     if headers:
         app.add_middleware(AddResponseHeaders, headers=headers)
 
+    add_server_timing = utils.getenv_bool("PLM_SERVER_TIMING")
+    slow_request_seconds = os.getenv("PLM_SLOW_REQUEST_SECONDS")
+    if add_server_timing or slow_request_seconds:
+        app.add_middleware(
+            ServerTimingMiddleware,
+            add_header=add_server_timing,
+            slow_request_seconds=float(slow_request_seconds)
+            if slow_request_seconds
+            else None,
+        )
+
+    app.add_middleware(MetricsMiddleware)
+
     app.include_router(root.router)
     app.include_router(rest_api_v1.router)
     init_tracing(app)
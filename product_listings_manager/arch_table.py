@@ -0,0 +1,37 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Compact sets of arches as integer bitmasks"""
+
+
+class ArchTable:
+    """
+    Interns arches as bits of integer masks.
+
+    Masks are expanded to sorted lists of arches. Expanded lists are cached
+    and shared, they must not be modified.
+    """
+
+    def __init__(self):
+        self.archs: list[str] = []
+        self.bits: dict[str, int] = {}
+        self.expanded: dict[int, list[str]] = {}
+
+    def bit(self, arch: str) -> int:
+        bit = self.bits.get(arch)
+        if bit is None:
+            bit = 1 << len(self.archs)
+            self.bits[arch] = bit
+            self.archs.append(arch)
+        return bit
+
+    def expand(self, mask: int) -> list[str]:
+        archs = self.expanded.get(mask)
+        if archs is None:
+            archs = sorted(arch for arch in self.archs if mask & self.bits[arch])
+            self.expanded[mask] = archs
+        return archs
+
+    def expand_all(self, masks: list[int]) -> list[str]:
+        """Expands and concatenates masks."""
+        if len(masks) == 1:
+            return self.expand(masks[0])
+        return [arch for mask in masks for arch in self.expand(mask)]
@@ -6,11 +6,14 @@ import logging
 import gssapi
 from fastapi import HTTPException, status
 
+from product_listings_manager.metrics import observe_gssapi
+
 logger = logging.getLogger(__name__)
 
 
 # Inspired by https://github.com/mkomitee/flask-kerberos/blob/master/flask_kerberos.py
 # Later cleaned and ported to python-gssapi
+@observe_gssapi()
 def process_gssapi_request(token):
     stage = "initialize server context"
     try:
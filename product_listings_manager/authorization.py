@@ -6,6 +6,8 @@ from dataclasses import dataclass
 import ldap
 from fastapi import HTTPException, status
 
+from product_listings_manager.metrics import observe_ldap
+
 log = logging.getLogger(__name__)
 
 
@@ -30,24 +32,25 @@ def get_group_membership(
 
 def get_user_groups(user: str, ldap_config: LdapConfig) -> Generator[str, None, None]:
     ldap_connection = None
-    try:
-        ldap_connection = ldap.initialize(ldap_config.host)
-        if ldap_config.use_gssapi:
-            ldap_connection.sasl_gssapi_bind_s()
-        for ldap_search in ldap_config.searches:
-            yield from get_group_membership(user, ldap_connection, ldap_search)
-    except ldap.SERVER_DOWN:
-        log.exception("The LDAP server is unreachable")
-        raise HTTPException(
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            detail="The LDAP server is unreachable",
-        )
-    except ldap.LDAPError:
-        log.exception("Unexpected LDAP connection error")
-        raise HTTPException(
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            detail="Unexpected LDAP connection error",
-        )
-    finally:
-        if ldap_connection:
-            ldap_connection.unbind_s()
+    with observe_ldap():
+        try:
+            ldap_connection = ldap.initialize(ldap_config.host)
+            if ldap_config.use_gssapi:
+                ldap_connection.sasl_gssapi_bind_s()
+            for ldap_search in ldap_config.searches:
+                yield from get_group_membership(user, ldap_connection, ldap_search)
+        except ldap.SERVER_DOWN:
+            log.exception("The LDAP server is unreachable")
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="The LDAP server is unreachable",
+            )
+        except ldap.LDAPError:
+            log.exception("Unexpected LDAP connection error")
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Unexpected LDAP connection error",
+            )
+        finally:
+            if ldap_connection:
+                ldap_connection.unbind_s()
@@ -0,0 +1,332 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Product listings of many builds evaluated at once
+
+Package membership in the latest trees of all variants of the product is
+loaded with a single query into a sparse matrix (rows are package arch, name
+and matched version, columns are trees). Masks of destination arches (see
+ArchTable) of every package for every variant are computed from the matrix
+with array operations, and RPMs of all builds are mapped to matrix rows at
+once. Overrides and the debuginfo fallback are applied as mask updates per
+build.
+
+The matrix is evaluated with NumPy if it is installed (and there are at most
+64 arches), otherwise builds are evaluated one by one.
+"""
+
+from typing import Any
+
+import koji
+from sqlalchemy import select
+
+from product_listings_manager import models, products
+from product_listings_manager.arch_table import ArchTable
+from product_listings_manager.metrics import observe_db_query, observe_koji_call
+from product_listings_manager.sql_arrays import MAX_ARRAY_SIZE, any_of
+from product_listings_manager.utils import chunks
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None  # type: ignore[assignment]
+
+# Masks of destination arches must fit into numpy.uint64
+MAX_ARCHES = 64
+
+
+def _call_build(call):
+    """Returns the build from a getBuild multicall result, or the error."""
+    try:
+        return call.result
+    except koji.GenericError as ex:
+        return products.ProductListingsNotFoundError(str(ex))
+
+
+def get_bulk_product_listings(db, product_label, build_nvrs):
+    """
+    Get product listings (see products.get_product_listings) of multiple
+    builds, fetched from kojihub in two multicalls.
+
+    Returns a map of build NVRs to listings or to a
+    ProductListingsNotFoundError for unknown builds and builds without RPMs.
+    """
+    session = products.get_koji_session()
+    with (
+        observe_koji_call("multiCall"),
+        session.multicall(strict=False, batch=products.KOJI_MULTICALL_BATCH) as m,
+    ):
+        build_calls = {nvr: m.getBuild(nvr, strict=True) for nvr in build_nvrs}
+
+    results: dict[str, Any] = {}
+    build_ids = {}
+    for nvr, call in build_calls.items():
+        build = _call_build(call)
+        if isinstance(build, products.ProductListingsNotFoundError):
+            results[nvr] = build
+        else:
+            build_ids[nvr] = build["id"]
+
+    rpms_by_build = {}
+    if build_ids:
+        with (
+            observe_koji_call("multiCall"),
+            session.multicall(strict=True, batch=products.KOJI_MULTICALL_BATCH) as m,
+        ):
+            rpm_calls = {
+                nvr: m.listRPMs(buildID=build_id) for nvr, build_id in build_ids.items()
+            }
+        for nvr, call in rpm_calls.items():
+            rpms = call.result
+            if rpms:
+                rpms_by_build[nvr] = rpms
+            else:
+                results[nvr] = products.ProductListingsNotFoundError(
+                    f"Could not find any RPMs for build: {nvr}"
+                )
+
+    if rpms_by_build:
+        results.update(product_listings(db, product_label, rpms_by_build))
+    return {nvr: results[nvr] for nvr in build_calls}
+
+
+def product_listings(db, product_label, rpms_by_build):
+    """
+    Returns product listings of builds given as {build: RPMs}, the same as
+    products.get_rpms_product_listings returns for each of the builds.
+    """
+    if numpy is None:
+        return {
+            build: products.get_rpms_product_listings(db, product_label, rpms)
+            for build, rpms in rpms_by_build.items()
+        }
+
+    version, variants = products.get_product_info(db, product_label)
+    match_version = products.get_match_versions(db, product_label)
+    allow_src_only = products.get_srconly_flag(db, product_label, version)
+
+    # Columns of the result, a variant listed twice gets the masks twice
+    treelists: dict[str, list[int]] = {}
+    for variant in variants:
+        if variant is None:
+            # dict keys must be a string
+            variant = ""
+        if variant not in treelists:
+            treelists[variant] = products.precalc_treelist(
+                db, product_label, version, variant
+            )
+    variant_index = {
+        variant: i for i, variant in enumerate(v for v, t in treelists.items() if t)
+    }
+    columns = [variant or "" for variant in variants]
+    columns = [variant for variant in columns if variant in variant_index]
+
+    # The version is matched for all packages if the last RPM is listed in
+    # match versions
+    builds = {}
+    keys: dict[tuple[str, str, str | None], int] = {}
+    for build, rpms in rpms_by_build.items():
+        rpms = products.sort_rpms(rpms)
+        last_rpm = rpms[-1]
+        rpm_version = (
+            last_rpm["version"] if last_rpm["name"] in match_version else None
+        ) or None
+        for rpm in rpms:
+            keys.setdefault((rpm["arch"], rpm["name"], rpm_version), len(keys))
+        builds[build] = (rpms, rpm_version)
+
+    arch_table = ArchTable()
+    membership = _load_membership(db, treelists, keys, arch_table)
+    # overrides apply only if versions are not matched
+    overrides = {}
+    if any(rpm_version is None for _, rpm_version in builds.values()):
+        overrides = _override_masks(
+            db, product_label, version, variant_index, arch_table
+        )
+    if len(arch_table.archs) > MAX_ARCHES:
+        return {
+            build: products.get_rpms_product_listings(db, product_label, rpms)
+            for build, rpms in rpms_by_build.items()
+        }
+
+    found = _found_masks(membership, treelists, variant_index, len(keys))
+    override_arrays = {
+        key: (
+            numpy.array(include, dtype=numpy.uint64),
+            numpy.array(exclude, dtype=numpy.uint64),
+        )
+        for key, (include, exclude) in overrides.items()
+    }
+    return {
+        build: _build_listings(
+            rpms,
+            found[[keys[(rpm["arch"], rpm["name"], rpm_version)] for rpm in rpms]],
+            override_arrays if rpm_version is None else {},
+            variant_index,
+            columns,
+            allow_src_only,
+            arch_table,
+        )
+        for build, (rpms, rpm_version) in builds.items()
+    }
+
+
+@observe_db_query
+def _select_tree_packages(db, trees, keys):
+    """
+    Returns (package arch, package name, package version, tree ID, tree arch)
+    of the packages of the given arches and names in the imported trees.
+    """
+    tree_packages = models.TreePackages.__table__
+    packages = models.Packages.__table__
+    trees_table = models.Trees.__table__
+    arches = {arch for arch, _, _ in keys}
+    rows = []
+    for chunk in chunks(sorted({name for _, name, _ in keys}), MAX_ARRAY_SIZE):
+        query = (
+            select(
+                packages.c.arch,
+                packages.c.name,
+                packages.c.version,
+                trees_table.c.id,
+                trees_table.c.arch,
+            )
+            .select_from(tree_packages)
+            .join(packages, packages.c.id == tree_packages.c.packages_id)
+            .join(trees_table, trees_table.c.id == tree_packages.c.trees_id)
+            .where(
+                any_of(packages.c.arch, arches),
+                any_of(packages.c.name, chunk),
+                any_of(trees_table.c.id, trees),
+                trees_table.c.imported == 1,
+            )
+        )
+        rows.extend(db.execute(query))
+    return rows
+
+
+def _load_membership(db, treelists, keys, arch_table):
+    """
+    Returns the package keys (matrix rows) and trees (matrix columns) of the
+    packages found in the trees, and tree IDs and arch bits of the columns.
+    """
+    tree_ids = sorted({tree for trees in treelists.values() for tree in trees})
+    rows: list[int] = []
+    cols: list[int] = []
+    tree_index: dict[int, int] = {}
+    tree_bits: list[int] = []
+    if not tree_ids or not keys:
+        return rows, cols, tree_index, tree_bits
+
+    for arch, name, pkg_version, tree_id, tree_arch in _select_tree_packages(
+        db, tree_ids, keys
+    ):
+        col = tree_index.get(tree_id)
+        if col is None:
+            col = tree_index[tree_id] = len(tree_bits)
+            tree_bits.append(arch_table.bit(tree_arch))
+        for key in ((arch, name, None), (arch, name, pkg_version)):
+            row = keys.get(key)
+            if row is not None:
+                rows.append(row)
+                cols.append(col)
+    return rows, cols, tree_index, tree_bits
+
+
+def _found_masks(membership, treelists, variant_index, key_count):
+    """
+    Returns masks of arches of the trees containing each package for each
+    variant as a (package key, variant) array.
+    """
+    rows, cols, tree_index, tree_bits = membership
+    found = numpy.zeros((key_count, len(variant_index)), dtype=numpy.uint64)
+    if not rows:
+        return found
+
+    # (variant, tree) -> arch bit of the tree if it is in the variant
+    bits = numpy.zeros((len(variant_index), len(tree_bits)), dtype=numpy.uint64)
+    for variant, i in variant_index.items():
+        for tree_id in treelists[variant]:
+            col = tree_index.get(tree_id)
+            if col is not None:
+                bits[i, col] = tree_bits[col]
+
+    row_array = numpy.array(rows, dtype=numpy.intp)
+    col_array = numpy.array(cols, dtype=numpy.intp)
+    numpy.bitwise_or.at(found, row_array, bits[:, col_array].T)
+    return found
+
+
+def _override_masks(db, product_label, version, variant_index, arch_table):
+    """
+    Returns {(name, arch): (include, exclude)} with lists of masks of arches
+    to add and to remove for each variant.
+    """
+    ret: dict[tuple[str, str], tuple[list[int], list[int]]] = {}
+    for variant, i in variant_index.items():
+        overrides = products.get_overrides(db, product_label, version, variant)
+        for name, by_arch in overrides.items():
+            for arch, tree_archs in by_arch.items():
+                masks = ret.get((name, arch))
+                if masks is None:
+                    masks = ret[(name, arch)] = (
+                        [0] * len(variant_index),
+                        [0] * len(variant_index),
+                    )
+                for tree_arch, include in tree_archs.items():
+                    masks[0 if include else 1][i] |= arch_table.bit(tree_arch)
+    return ret
+
+
+def _build_listings(
+    rpms, masks, overrides, variant_index, columns, allow_src_only, arch_table
+):
+    """
+    Returns product listings of the sorted RPMs of a build given masks of
+    arches of the trees containing them ((RPM, variant) array).
+    """
+    include = numpy.zeros_like(masks)
+    exclude = numpy.zeros_like(masks)
+    for i, rpm in enumerate(rpms):
+        override = overrides.get((rpm["name"], rpm["arch"]))
+        if override is not None:
+            include[i], exclude[i] = override
+
+    debuginfo = numpy.array([koji.is_debuginfo(rpm["name"]) for rpm in rpms])
+    arches = {}
+    arch_indexes = numpy.array(
+        [arches.setdefault(rpm["arch"], len(arches)) for rpm in rpms],
+        dtype=numpy.intp,
+    )
+
+    # Non-debug RPMs are resolved first, debuginfo RPMs not found in the trees
+    # fall back to the arches of the non-debug RPMs
+    nondebug = ~debuginfo
+    masks[nondebug] = (masks[nondebug] | include[nondebug]) & ~exclude[nondebug]
+    cached = numpy.zeros((len(arches), masks.shape[1]), dtype=numpy.uint64)
+    binary = nondebug & (arch_indexes != arches.get("src", -1))
+    numpy.bitwise_or.at(cached, arch_indexes[binary], masks[binary])
+    debug_masks = masks[debuginfo]
+    debug_masks = numpy.where(
+        debug_masks != 0, debug_masks, cached[arch_indexes[debuginfo]]
+    )
+    masks[debuginfo] = (debug_masks | include[debuginfo]) & ~exclude[debuginfo]
+
+    order = [i for i in range(len(rpms)) if nondebug[i]]
+    order.extend(i for i in range(len(rpms)) if debuginfo[i])
+    masks_by_variant = masks.T.tolist()
+
+    # listings[variant][nvr][arch] is a list of masks of destination arches
+    listings: dict[str, dict[str, dict[str, list[int]]]] = {}
+    for variant in columns:
+        variant_masks = masks_by_variant[variant_index[variant]]
+        for i in order:
+            dest_mask = variant_masks[i]
+            if dest_mask:
+                rpm = rpms[i]
+                listings.setdefault(variant, {}).setdefault(rpm["nvr"], {}).setdefault(
+                    rpm["arch"], []
+                ).append(dest_mask)
+
+        # BREW-260: check for allow_src_only flag added
+        products.drop_source_only(listings, variant, allow_src_only)
+
+    return products.expand_listings(listings, arch_table)
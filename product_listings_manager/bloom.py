@@ -0,0 +1,142 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Bloom filters of package names in tree sets
+
+A filter of the names of all packages in the imported trees of a tree set is
+built when the tree set is first searched. Names of build packages not in the
+filter are definitely not in any of the trees, so they are not looked up (and
+when no name passes the filter, no query is executed at all). Names passing
+the filter are looked up as usual; those not found are false positives.
+
+Filters are keyed by the fingerprint of the tree set (see ImportedTrees) and
+the least recently used ones are dropped.
+"""
+
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+from product_listings_manager import models
+from product_listings_manager.metrics import (
+    BLOOM_FILTER_CHECKS,
+    BLOOM_FILTER_FALSE_POSITIVES,
+    BLOOM_FILTER_SKIPPED_QUERIES,
+    observe_db_query,
+)
+from product_listings_manager.sql_arrays import MAX_ARRAY_SIZE, any_of
+from product_listings_manager.utils import chunks
+
+
+class BloomFilter:
+    """
+    Probabilistic set of strings sized for the given capacity and false
+    positive rate.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(
+            64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing of a single 128-bit digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+@observe_db_query
+def _select_package_names(db, tree_ids) -> set[str]:
+    tree_packages = models.TreePackages.__table__
+    packages = models.Packages.__table__
+    names: set[str] = set()
+    for chunk in chunks(tree_ids, MAX_ARRAY_SIZE):
+        query = (
+            select(packages.c.name)
+            .distinct()
+            .select_from(tree_packages)
+            .join(packages, packages.c.id == tree_packages.c.packages_id)
+            .where(any_of(tree_packages.c.trees_id, chunk))
+        )
+        names.update(name for (name,) in db.execute(query))
+    return names
+
+
+class PackageNameFilters:
+    def __init__(self, error_rate: float, max_size: int = 64):
+        self.error_rate = error_rate
+        self.max_size = max_size
+        self.filters: OrderedDict[tuple[int, ...], BloomFilter] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, db, fingerprint) -> BloomFilter:
+        """Returns the filter of package names in the imported trees."""
+        with self.lock:
+            bloom = self.filters.get(fingerprint)
+            if bloom is not None:
+                self.filters.move_to_end(fingerprint)
+                return bloom
+
+        names = _select_package_names(db, fingerprint)
+        bloom = BloomFilter(len(names), self.error_rate)
+        for name in names:
+            bloom.add(name)
+        with self.lock:
+            self.filters[fingerprint] = bloom
+            while len(self.filters) > self.max_size:
+                self.filters.popitem(last=False)
+        return bloom
+
+    def possible_names(self, db, fingerprint, names_by_arch):
+        """
+        Returns {arch: [name, ...]} without names definitely not in any of
+        the imported trees.
+        """
+        bloom = self.get(db, fingerprint)
+        possible: dict[str, list[str]] = {}
+        absent = 0
+        for arch, names in names_by_arch.items():
+            found = [name for name in names if name in bloom]
+            absent += len(names) - len(found)
+            if found:
+                possible[arch] = found
+        BLOOM_FILTER_CHECKS.labels("absent").inc(absent)
+        BLOOM_FILTER_CHECKS.labels("possible").inc(
+            sum(len(names) for names in possible.values())
+        )
+        if names_by_arch and not possible:
+            BLOOM_FILTER_SKIPPED_QUERIES.inc()
+        return possible
+
+    def count_false_positives(self, possible, found):
+        """
+        Counts names that passed the filter (as returned by possible_names)
+        but were not found in {arch: {name: ...}}.
+        """
+        BLOOM_FILTER_FALSE_POSITIVES.inc(
+            sum(
+                1
+                for arch, names in possible.items()
+                for name in names
+                if name not in found.get(arch, ())
+            )
+        )
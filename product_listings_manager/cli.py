@@ -0,0 +1,131 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Command line tools for product-listings-manager administrators"""
+
+import argparse
+import sys
+
+from product_listings_manager import products
+from product_listings_manager.explain import explain_call
+from product_listings_manager.export import export_snapshot
+from product_listings_manager.indexes import check_indexes
+from product_listings_manager.models import SessionLocal, engine
+
+
+def cmd_check_indexes(args) -> int:
+    with engine.connect() as conn:
+        checks = check_indexes(conn)
+
+    missing = [check for check in checks if check.missing]
+    for check in checks:
+        columns = ", ".join(check.columns)
+        if not check.missing:
+            print(f"OK      {check.table} ({columns}): {check.existing_index}")
+            continue
+
+        print(f"MISSING {check.table} ({columns}): {check.ddl};")
+        print(f"    estimated rows: {check.rows}")
+        if check.plan is not None:
+            if check.plan.cost is not None:
+                print(f"    lookup cost: {check.plan.cost}")
+            if check.plan.sequential_scans:
+                print("    sequential scan: " + ", ".join(check.plan.sequential_scans))
+            for line in check.plan.plan.splitlines():
+                print(f"    | {line}")
+
+    print(f"{len(missing)} of {len(checks)} recommended indexes missing")
+    return 1 if missing else 0
+
+
+def cmd_explain(args) -> int:
+    func = {
+        "product-listings": products.get_product_listings,
+        "module-product-listings": products.get_module_product_listings,
+    }[args.endpoint]
+    with SessionLocal() as db:
+        try:
+            _, queries = explain_call(
+                db, func, args.label, args.nvr, analyze=args.analyze
+            )
+        except products.ProductListingsNotFoundError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+
+    for query, statements in queries.items():
+        total = sum(statement.duration_ms for statement in statements)
+        print(f"== {query}: {len(statements)} statements, {total:.1f} ms")
+        for statement in statements:
+            print(f"-- {statement.duration_ms:.1f} ms: {statement.statement}")
+            print(f"   parameters: {statement.parameters!r}")
+            if statement.plan is not None:
+                for line in statement.plan.plan.splitlines():
+                    print(f"   | {line}")
+    return 0
+
+
+def cmd_export_snapshot(args) -> int:
+    with engine.connect() as conn:
+        counts = export_snapshot(conn, args.output, args.labels)
+
+    for table, count in counts.items():
+        print(f"{table}: {count} rows")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="product-listings-manager",
+        description=(
+            "Administration of product-listings-manager. The database is set"
+            " with SQLALCHEMY_DATABASE_URI environment variable."
+        ),
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    check = subparsers.add_parser(
+        "check-indexes",
+        help="report recommended indexes missing in the database",
+    )
+    check.set_defaults(func=cmd_check_indexes)
+
+    explain = subparsers.add_parser(
+        "explain",
+        help=(
+            "show query plans of SQL statements executed for product listings,"
+            " grouped by logical DB query"
+        ),
+    )
+    explain.add_argument(
+        "endpoint", choices=["product-listings", "module-product-listings"]
+    )
+    explain.add_argument("label", help="product label")
+    explain.add_argument("nvr", help="build NVR")
+    explain.add_argument(
+        "--no-analyze",
+        dest="analyze",
+        action="store_false",
+        help="do not execute the statements with EXPLAIN ANALYZE (PostgreSQL)",
+    )
+    explain.set_defaults(func=cmd_explain)
+
+    export = subparsers.add_parser(
+        "export-snapshot",
+        help=(
+            "export data needed for product listings of the latest product"
+            " versions to a SQLite file (see PLM_SNAPSHOT_PATH)"
+        ),
+    )
+    export.add_argument("output", help="SQLite file to create or replace atomically")
+    export.add_argument(
+        "--label",
+        dest="labels",
+        action="append",
+        help="export only the given product label (can be repeated)",
+    )
+    export.set_defaults(func=cmd_export_snapshot)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,17 +2,65 @@
 """Helper function for managing raw SQL queries"""
 
 import logging
+import re
 from typing import Any
 
 from fastapi import HTTPException, status
 from sqlalchemy import text
 from sqlalchemy.exc import ResourceClosedError, SQLAlchemyError
 
+from product_listings_manager.metrics import observe_db_query
+from product_listings_manager.permissions import normalize
 from product_listings_manager.schemas import SqlQuery
 
 logger = logging.getLogger(__name__)
 
 
+# Read-only queries must not contain these (writing a table, locking rows)
+WRITE_KEYWORDS_RE = re.compile(r"\b(INTO|FOR (NO KEY )?UPDATE|FOR (KEY )?SHARE)\b")
+# Comments and quoting which could hide other statements and function calls
+UNSAFE_SYNTAX_RE = re.compile(r"--|/\*|\$")
+STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+# Names followed by a parenthesis: function calls, or keywords and type names
+CALL_RE = re.compile(r'("[^"]*"|[A-Z_][A-Z0-9_]*(?: ?\. ?[A-Z_][A-Z0-9_]*)*) ?\(')
+# Keywords, type names and functions without side effects allowed in queries
+# executed on a read replica; any other function could write or take locks
+READ_ONLY_CALLS = frozenset(
+    (
+        # keywords
+        "ALL AND ANY ARRAY AS BETWEEN BY CASE DISTINCT ELSE EXCEPT EXISTS"
+        " FILTER FROM HAVING IN INTERSECT IS JOIN LATERAL LIKE ILIKE NOT ON OR"
+        " OVER ROW SELECT SOME THEN UNION USING VALUES WHEN WHERE WITHIN"
+        # type names
+        " CHAR DECIMAL NUMERIC VARCHAR"
+        # functions
+        " ABS ARRAY_AGG ARRAY_LENGTH AVG BOOL_AND BOOL_OR CARDINALITY CAST"
+        " CEIL COALESCE CONCAT CONCAT_WS COUNT DATE_TRUNC DENSE_RANK EXTRACT"
+        " FLOOR GREATEST JSON_AGG JSONB_AGG LEAST LENGTH LOWER MAX MIN NULLIF"
+        " POSITION RANK REPLACE ROUND ROW_NUMBER SPLIT_PART STRING_AGG STRPOS"
+        " SUBSTR SUBSTRING SUM TO_CHAR TRIM UNNEST UPPER"
+    ).split()
+)
+
+
+def is_read_only(query: str) -> bool:
+    """
+    Returns True if the query is a single SELECT statement which can be
+    executed on a read replica: it calls only functions in READ_ONLY_CALLS
+    and does not write or lock rows.
+    """
+    query = normalize(query)
+    if not query.startswith("SELECT ") or UNSAFE_SYNTAX_RE.search(query):
+        return False
+    query = STRING_LITERAL_RE.sub("''", query)
+    return (
+        ";" not in query
+        and not WRITE_KEYWORDS_RE.search(query)
+        and all(name in READ_ONLY_CALLS for name in CALL_RE.findall(query))
+    )
+
+
+@observe_db_query
 def execute_queries(db, queries: list[SqlQuery]) -> list[dict[str, Any]]:
     for query in queries:
         query_text = query.query
@@ -0,0 +1,61 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""LRU cache of destination arches of packages
+
+Entries are keyed by (fingerprint of the tree set, package arch, package
+name, matched version) and hold the arches of the trees containing the
+package, before overrides and the debuginfo fallback are applied. Different
+builds of the same package (and all requests for it) share the entries.
+
+The fingerprint is the sorted tuple of imported trees of the tree set (see
+ImportedTrees), so a new latest tree or a newly imported tree yields a
+different key and the old entries age out.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+from product_listings_manager.metrics import DEST_ARCH_CACHE_LOOKUPS
+
+
+class DestArchCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: OrderedDict[tuple, tuple[str, ...]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def lookup(self, fingerprint, names_by_arch, version):
+        """
+        Returns the cached arches as {arch: {name: tree arches}} and the
+        packages not in the cache as {arch: [name, ...]}.
+        """
+        found: dict[str, dict[str, tuple[str, ...]]] = {}
+        missing: dict[str, list[str]] = {}
+        hits = 0
+        with self.lock:
+            for arch, names in names_by_arch.items():
+                for name in names:
+                    key = (fingerprint, arch, name, version)
+                    archs = self.entries.get(key)
+                    if archs is None:
+                        missing.setdefault(arch, []).append(name)
+                    else:
+                        self.entries.move_to_end(key)
+                        found.setdefault(arch, {})[name] = archs
+                        hits += 1
+        DEST_ARCH_CACHE_LOOKUPS.labels("hit").inc(hits)
+        DEST_ARCH_CACHE_LOOKUPS.labels("miss").inc(
+            sum(len(names) for names in missing.values())
+        )
+        return found, missing
+
+    def store(self, fingerprint, archs_by_package, version):
+        """Stores {(arch, name): tree arches} found for the fingerprint."""
+        intern = sys.intern
+        with self.lock:
+            for (arch, name), archs in archs_by_package.items():
+                key = (fingerprint, intern(arch), intern(name), version)
+                self.entries[key] = tuple(sorted(intern(a) for a in archs))
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
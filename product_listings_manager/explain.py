@@ -0,0 +1,173 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Query plans of SQL statements for PostgreSQL and SQLite
+
+Statements executed by a function (for example get_product_listings) can be
+captured and explained, grouped by the logical DB query.
+"""
+
+import json
+import re
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from product_listings_manager.metrics import current_db_query
+
+SQLITE_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)$")
+
+
+@dataclass
+class QueryPlan:
+    plan: str
+    # Estimated total cost (PostgreSQL only)
+    cost: float | None = None
+    # Execution time measured by EXPLAIN ANALYZE (PostgreSQL only)
+    execution_ms: float | None = None
+    # Tables read without using an index
+    sequential_scans: list[str] = field(default_factory=list)
+
+
+@dataclass
+class ExplainedStatement:
+    statement: str
+    parameters: Any
+    duration_ms: float
+    # Query plan, only for SELECT statements
+    plan: QueryPlan | None = None
+
+
+captured_statements: ContextVar[list[tuple[str, ExplainedStatement]] | None] = (
+    ContextVar("captured_statements", default=None)
+)
+
+
+def _postgresql_plan(node, depth, lines, plan):
+    relation = node.get("Relation Name")
+    index = node.get("Index Name")
+    line = node["Node Type"]
+    if relation:
+        line += f" on {relation}"
+    if index:
+        line += f" using {index}"
+    line += f" (cost={node['Total Cost']} rows={node['Plan Rows']})"
+    if "Actual Total Time" in node:
+        line += (
+            f" (actual time={node['Actual Total Time']} rows={node['Actual Rows']}"
+            f" loops={node['Actual Loops']})"
+        )
+    if "Shared Hit Blocks" in node:
+        line += (
+            f" (buffers hit={node['Shared Hit Blocks']}"
+            f" read={node['Shared Read Blocks']})"
+        )
+    lines.append("  " * depth + line)
+    if node["Node Type"] == "Seq Scan":
+        plan.sequential_scans.append(relation)
+    for child in node.get("Plans", []):
+        _postgresql_plan(child, depth + 1, lines, plan)
+
+
+def explain(
+    conn, statement: str, params=None, analyze=False, driver_sql=False
+) -> QueryPlan:
+    """
+    Returns query plan for a SQL statement.
+
+    The conn argument can be a Connection or a Session. If analyze is set,
+    the statement is executed (PostgreSQL only). If driver_sql is set, the
+    statement and params are in the DB driver format and conn must be a
+    Connection.
+    """
+    dialect = (conn.get_bind() if isinstance(conn, Session) else conn).dialect.name
+
+    def execute(prefix):
+        if driver_sql:
+            return conn.exec_driver_sql(f"{prefix} {statement}", params)
+        return conn.execute(text(f"{prefix} {statement}"), params)
+
+    if dialect == "postgresql":
+        options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+        root = execute(f"EXPLAIN ({options})").scalar()
+        if isinstance(root, str):
+            root = json.loads(root)
+        node = root[0]["Plan"]
+        lines: list[str] = []
+        plan = QueryPlan(
+            plan="",
+            cost=node["Total Cost"],
+            execution_ms=root[0].get("Execution Time"),
+        )
+        _postgresql_plan(node, 0, lines, plan)
+        plan.plan = "\n".join(lines)
+        return plan
+
+    if dialect == "sqlite":
+        rows = execute("EXPLAIN QUERY PLAN").all()
+        depths = {0: -1}
+        lines = []
+        plan = QueryPlan(plan="")
+        for id, parent, _, detail in rows:
+            depths[id] = depths.get(parent, -1) + 1
+            lines.append("  " * depths[id] + detail)
+            match = SQLITE_SCAN_RE.match(detail)
+            if match:
+                plan.sequential_scans.append(match.group(1))
+        plan.plan = "\n".join(lines)
+        return plan
+
+    rows = execute("EXPLAIN").all()
+    return QueryPlan(plan="\n".join(" ".join(map(str, row)) for row in rows))
+
+
+def capture_statement(statement, parameters, duration: float) -> None:
+    """
+    Captures the statement if called within explain_call() (see
+    metrics.instrument_engine).
+    """
+    captured = captured_statements.get()
+    if captured is not None:
+        captured.append(
+            (
+                current_db_query.get(),
+                ExplainedStatement(
+                    statement=statement,
+                    parameters=parameters,
+                    duration_ms=duration * 1000,
+                ),
+            )
+        )
+
+
+def explain_call(db, func, *args, analyze: bool = True):
+    """
+    Calls func(db, *args) and explains the SQL statements it executed.
+
+    Returns the result of the call and the statements with query plans
+    grouped by the logical DB query (see metrics.observe_db_query).
+    """
+    captured: list[tuple[str, ExplainedStatement]] = []
+    token = captured_statements.set(captured)
+    try:
+        result = func(db, *args)
+    finally:
+        captured_statements.reset(token)
+
+    queries: dict[str, list[ExplainedStatement]] = {}
+    try:
+        conn = db.connection()
+        for query, explained in captured:
+            if explained.statement.lstrip().upper().startswith(("SELECT", "WITH")):
+                explained.plan = explain(
+                    conn,
+                    explained.statement,
+                    explained.parameters,
+                    analyze=analyze,
+                    driver_sql=True,
+                )
+            queries.setdefault(query, []).append(explained)
+    finally:
+        db.rollback()
+    return result, queries
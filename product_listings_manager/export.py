@@ -0,0 +1,133 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Export of the composedb subset needed for product listings to SQLite
+
+Only the latest version of each product (see products.get_product_info) and
+the latest tree per arch (and compat layer) of each of its variants (see
+products.precalc_treelist) are exported, with packages and modules of those
+trees, overrides and match versions.
+"""
+
+import os
+
+from sqlalchemy import create_engine, select, text
+
+from product_listings_manager import models
+from product_listings_manager.products import latest_products, latest_trees
+from product_listings_manager.utils import chunks
+
+
+class _Exporter:
+    def __init__(self, source, target):
+        self.source = source
+        self.target = target
+        self.counts: dict[str, int] = {}
+
+    def copy(self, table, column, values) -> list:
+        """Copies rows with the column value in values, returns the rows."""
+        copied = []
+        for chunk in chunks(sorted(values)):
+            rows = [
+                dict(row._mapping)
+                for row in self.source.execute(
+                    select(table).where(column.in_(chunk)).order_by(*table.primary_key)
+                )
+            ]
+            if rows:
+                self.target.execute(table.insert(), rows)
+            copied.extend(rows)
+        self.counts[table.name] = self.counts.get(table.name, 0) + len(copied)
+        return copied
+
+    def insert(self, table, rows):
+        if rows:
+            self.target.execute(table.insert(), rows)
+        self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+
+
+def export_snapshot(source, path: str, labels=None) -> dict[str, int]:
+    """
+    Exports data needed for product listings from the source DB connection
+    to a new SQLite file which atomically replaces the file at path.
+
+    Returns the number of exported rows per table.
+    """
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    target_engine = create_engine(f"sqlite:///{tmp_path}")
+    try:
+        models.BaseModel.metadata.create_all(bind=target_engine)
+        with target_engine.begin() as target:
+            exporter = _Exporter(source, target)
+            counts = exporter.counts
+
+            product_ids = latest_products(source, labels)
+            products = exporter.copy(
+                models.Products.__table__, models.Products.id, product_ids
+            )
+
+            tree_map = latest_trees(source, product_ids)
+            trees = exporter.copy(
+                models.Trees.__table__,
+                models.Trees.id,
+                {tree_id for _, tree_id in tree_map},
+            )
+            exporter.insert(
+                models.TreeProductMap.__table__,
+                [
+                    {"product_id": product_id, "tree_id": tree_id}
+                    for product_id, tree_id in sorted(tree_map)
+                ],
+            )
+
+            # Packages are looked up only in imported trees
+            tree_packages = exporter.copy(
+                models.TreePackages.__table__,
+                models.TreePackages.trees_id,
+                {tree["id"] for tree in trees if tree["imported"] == 1},
+            )
+            exporter.copy(
+                models.Packages.__table__,
+                models.Packages.id,
+                {row["packages_id"] for row in tree_packages},
+            )
+
+            tree_modules = exporter.copy(
+                models.TreeModules.__table__,
+                models.TreeModules.trees_id,
+                {tree["id"] for tree in trees},
+            )
+            exporter.copy(
+                models.Modules.__table__,
+                models.Modules.id,
+                {row["modules_id"] for row in tree_modules},
+            )
+
+            exporter.copy(
+                models.Overrides.__table__, models.Overrides.product, product_ids
+            )
+            exporter.copy(
+                models.ModuleOverrides.__table__,
+                models.ModuleOverrides.product,
+                product_ids,
+            )
+            exporter.copy(
+                models.MatchVersions.__table__,
+                models.MatchVersions.product,
+                {product["label"] for product in products},
+            )
+
+        with target_engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as target:
+            target.execute(text("ANALYZE"))
+            target.execute(text("VACUUM"))
+    except BaseException:
+        target_engine.dispose()
+        os.remove(tmp_path)
+        raise
+
+    target_engine.dispose()
+    os.replace(tmp_path, path)
+    return counts
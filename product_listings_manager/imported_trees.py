@@ -0,0 +1,44 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Tracking of imported trees for the in-memory caches of tree sets"""
+
+import threading
+
+from sqlalchemy import select
+
+from product_listings_manager import models
+from product_listings_manager.metrics import observe_db_query
+from product_listings_manager.sql_arrays import MAX_ARRAY_SIZE, any_of
+from product_listings_manager.utils import chunks
+
+
+@observe_db_query
+def _select_imported_trees(db, tree_ids) -> set[int]:
+    trees = models.Trees.__table__
+    imported: set[int] = set()
+    for chunk in chunks(tree_ids, MAX_ARRAY_SIZE):
+        query = select(trees.c.id).where(
+            any_of(trees.c.id, chunk), trees.c.imported == 1
+        )
+        imported.update(tree_id for (tree_id,) in db.execute(query))
+    return imported
+
+
+class ImportedTrees:
+    def __init__(self):
+        # Trees are not expected to become not imported again
+        self.trees: set[int] = set()
+        self.lock = threading.Lock()
+
+    def fingerprint(self, db, trees) -> tuple[int, ...]:
+        """
+        Returns sorted IDs of the imported trees.
+
+        Only imported trees are searched for packages, so a new latest tree or
+        a newly imported tree yields a different fingerprint.
+        """
+        unknown = [tree_id for tree_id in trees if tree_id not in self.trees]
+        if unknown:
+            imported = _select_imported_trees(db, unknown)
+            with self.lock:
+                self.trees.update(imported)
+        return tuple(sorted(t for t in trees if t in self.trees))
@@ -0,0 +1,93 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Verification of recommended composedb indexes
+
+Recommended indexes are defined in the models.
+"""
+
+from dataclasses import dataclass
+
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.schema import CreateIndex
+
+from product_listings_manager.explain import QueryPlan, explain
+from product_listings_manager.models import BaseModel
+
+
+@dataclass
+class IndexCheck:
+    table: str
+    name: str
+    columns: list[str]
+    # Name of an existing index starting with the recommended columns
+    existing_index: str | None
+    # SQL statement to create the index
+    ddl: str
+    # Estimated number of rows in the table
+    rows: int | None = None
+    # Plan for a lookup by the leading index column if the index is missing
+    plan: QueryPlan | None = None
+
+    @property
+    def missing(self) -> bool:
+        return self.existing_index is None
+
+
+def _existing_indexes(inspector, table):
+    indexes = {
+        index["name"]: list(index["column_names"])
+        for index in inspector.get_indexes(table)
+    }
+    pk = inspector.get_pk_constraint(table)
+    if pk.get("constrained_columns"):
+        indexes[pk.get("name") or f"{table} primary key"] = list(
+            pk["constrained_columns"]
+        )
+    return indexes
+
+
+def _estimated_rows(conn, table):
+    if conn.dialect.name == "postgresql":
+        return conn.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"),
+            {"table": table.name},
+        ).scalar()
+    return conn.execute(select(func.count()).select_from(table)).scalar()
+
+
+def _lookup_plan(conn, table, column):
+    """Query plan for looking up rows by the column."""
+    value = conn.execute(select(table.c[column]).limit(1)).scalar()
+    if value is None:
+        return None
+    statement = f"SELECT * FROM {table.name} WHERE {column} = :value"  # nosec B608
+    return explain(conn, statement, {"value": value})
+
+
+def check_indexes(conn) -> list[IndexCheck]:
+    """Compares recommended indexes with the ones in the database."""
+    inspector = inspect(conn)
+    checks = []
+    for table in BaseModel.metadata.sorted_tables:
+        existing = _existing_indexes(inspector, table.name)
+        for index in sorted(table.indexes, key=lambda index: str(index.name)):
+            columns = [column.name for column in index.columns]
+            existing_index = next(
+                (
+                    name
+                    for name, index_columns in existing.items()
+                    if index_columns[: len(columns)] == columns
+                ),
+                None,
+            )
+            check = IndexCheck(
+                table=table.name,
+                name=str(index.name),
+                columns=columns,
+                existing_index=existing_index,
+                ddl=str(CreateIndex(index).compile(dialect=conn.dialect)).strip(),
+            )
+            if check.missing:
+                check.rows = _estimated_rows(conn, table)
+                check.plan = _lookup_plan(conn, table, columns[0])
+            checks.append(check)
+    return checks
@@ -0,0 +1,266 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Product listings of a build computed by a single SQL statement
+
+The statement takes the RPMs of the build as a parameter (arrays unnested on
+PostgreSQL, a JSON array on other databases) and uses CTEs for each step of
+get_product_listings:
+
+- latest trees of each variant (a product without variant gets trees of all
+  variants, see precalc_treelist),
+- packages of the RPMs in the imported latest trees, of the version of the
+  last RPM if it is listed in match versions,
+- overrides (ignored if the version is matched),
+- arches of non-debuginfo RPMs per variant and RPM arch for debuginfo RPMs
+  not found in the trees.
+
+It returns (variant, NVR, RPM arch, destination arch) rows ordered by the
+position of the RPM.
+"""
+
+import json
+
+from sqlalchemy import (
+    Integer,
+    String,
+    and_,
+    bindparam,
+    case,
+    except_,
+    exists,
+    false,
+    func,
+    or_,
+    select,
+    true,
+    union,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from product_listings_manager import models
+from product_listings_manager.metrics import observe_db_query
+
+RPM_COLUMNS = ("idx", "nvr", "name", "arch", "debuginfo")
+
+
+def _rpms_cte(dialect, rpms):
+    """Returns CTE of the RPMs given as (idx, nvr, name, arch, debuginfo)."""
+    if dialect == "postgresql":
+        arrays = [list(values) for values in zip(*rpms)]
+        types = (Integer, String, String, String, Integer)
+        table = (
+            func.unnest(
+                *(
+                    bindparam(f"rpm_{name}", values, type_=ARRAY(type_))
+                    for name, values, type_ in zip(RPM_COLUMNS, arrays, types)
+                )
+            )
+            .table_valued(*RPM_COLUMNS)
+            .render_derived()
+        )
+        return select(*(table.c[name] for name in RPM_COLUMNS)).cte("rpms")
+
+    table = func.json_each(json.dumps(rpms)).table_valued("value")
+    return select(
+        *(
+            func.json_extract(table.c.value, f"$[{i}]").label(name)
+            for i, name in enumerate(RPM_COLUMNS)
+        )
+    ).cte("rpms")
+
+
+def product_listings_statement(dialect, label, version, rpms, last_rpm):
+    """
+    Returns the statement for the RPMs given as (idx, nvr, name, arch,
+    debuginfo) tuples and the last RPM by NVR.
+    """
+    products = models.Products.__table__
+    tree_product_map = models.TreeProductMap.__table__
+    trees = models.Trees.__table__
+    tree_packages = models.TreePackages.__table__
+    packages = models.Packages.__table__
+    overrides = models.Overrides.__table__
+    match_versions = models.MatchVersions.__table__
+
+    rpm_table = _rpms_cte(dialect, rpms)
+
+    variant_keys = (
+        select(func.coalesce(products.c.variant, "").label("variant"))
+        .where(products.c.label == label, products.c.version == version)
+        .distinct()
+        .cte("variant_keys")
+    )
+    variant_products = (
+        select(variant_keys.c.variant, products.c.id)
+        .join(
+            products,
+            and_(
+                products.c.label == label,
+                products.c.version == version,
+                or_(
+                    variant_keys.c.variant == "",
+                    products.c.variant == variant_keys.c.variant,
+                ),
+            ),
+        )
+        .cte("variant_products")
+    )
+    ranked_trees = (
+        select(
+            variant_products.c.variant,
+            trees.c.id,
+            trees.c.arch,
+            trees.c.imported,
+            func.row_number()
+            .over(
+                partition_by=(
+                    variant_products.c.variant,
+                    trees.c.arch,
+                    trees.c.compatlayer,
+                ),
+                order_by=(trees.c.date.desc(), trees.c.id.desc()),
+            )
+            .label("position"),
+        )
+        .select_from(variant_products)
+        .join(tree_product_map, tree_product_map.c.product_id == variant_products.c.id)
+        .join(trees, trees.c.id == tree_product_map.c.tree_id)
+        .cte("ranked_trees")
+    )
+    latest_trees = (
+        select(ranked_trees.c.variant, ranked_trees.c.id, ranked_trees.c.arch)
+        .where(ranked_trees.c.position == 1, ranked_trees.c.imported == 1)
+        .cte("latest_trees")
+    )
+
+    # The version is matched for all packages if the last RPM is listed in
+    # match versions
+    if last_rpm["version"]:
+        matched = exists().where(
+            match_versions.c.product == label,
+            match_versions.c.name == last_rpm["name"],
+        )
+        version_filter = or_(~matched, packages.c.version == last_rpm["version"])
+    else:
+        matched = false()
+        version_filter = true()
+
+    found = (
+        select(
+            latest_trees.c.variant,
+            rpm_table.c.idx,
+            latest_trees.c.arch.label("dest_arch"),
+        )
+        .select_from(rpm_table)
+        .join(
+            packages,
+            and_(
+                packages.c.name == rpm_table.c.name,
+                packages.c.arch == rpm_table.c.arch,
+            ),
+        )
+        .join(tree_packages, tree_packages.c.packages_id == packages.c.id)
+        .join(latest_trees, latest_trees.c.id == tree_packages.c.trees_id)
+        .where(version_filter)
+        .distinct()
+        .cte("found")
+    )
+
+    # overrides apply only if versions are not matched and only to variants
+    # with trees
+    override_arches = (
+        select(
+            variant_products.c.variant,
+            rpm_table.c.idx,
+            overrides.c.product_arch.label("dest_arch"),
+            func.max(case((overrides.c.include, 1), else_=0)).label("include"),
+        )
+        .select_from(variant_products)
+        .join(overrides, overrides.c.product == variant_products.c.id)
+        .join(
+            rpm_table,
+            and_(
+                rpm_table.c.name == overrides.c.name,
+                rpm_table.c.arch == overrides.c.pkg_arch,
+            ),
+        )
+        .where(
+            variant_products.c.variant.in_(select(ranked_trees.c.variant)),
+            ~matched,
+        )
+        .group_by(variant_products.c.variant, rpm_table.c.idx, overrides.c.product_arch)
+        .cte("override_arches")
+    )
+
+    def select_arches(table, debuginfo, *where):
+        return (
+            select(table.c.variant, table.c.idx, table.c.dest_arch)
+            .join(rpm_table, rpm_table.c.idx == table.c.idx)
+            .where(rpm_table.c.debuginfo == debuginfo, *where)
+        )
+
+    def included(debuginfo):
+        return select_arches(override_arches, debuginfo, override_arches.c.include == 1)
+
+    excluded = select(
+        override_arches.c.variant,
+        override_arches.c.idx,
+        override_arches.c.dest_arch,
+    ).where(override_arches.c.include == 0)
+
+    nondebug_arches = union(select_arches(found, 0), included(0)).cte("nondebug_arches")
+    nondebug_dest = except_(
+        select(
+            nondebug_arches.c.variant,
+            nondebug_arches.c.idx,
+            nondebug_arches.c.dest_arch,
+        ),
+        excluded,
+    ).cte("nondebug_dest")
+
+    # arch -> destination arches of the non-debug RPMs
+    fallback = (
+        select(nondebug_dest.c.variant, rpm_table.c.arch, nondebug_dest.c.dest_arch)
+        .join(rpm_table, rpm_table.c.idx == nondebug_dest.c.idx)
+        .where(rpm_table.c.arch != "src")
+        .distinct()
+        .cte("debuginfo_fallback")
+    )
+    debug_arches = union(
+        select_arches(found, 1),
+        select(fallback.c.variant, rpm_table.c.idx, fallback.c.dest_arch)
+        .join(fallback, fallback.c.arch == rpm_table.c.arch)
+        .where(
+            rpm_table.c.debuginfo == 1,
+            ~exists().where(
+                found.c.variant == fallback.c.variant,
+                found.c.idx == rpm_table.c.idx,
+            ),
+        ),
+        included(1),
+    ).cte("debug_arches")
+    debug_dest = except_(
+        select(debug_arches.c.variant, debug_arches.c.idx, debug_arches.c.dest_arch),
+        excluded,
+    ).cte("debug_dest")
+
+    dest = union_all(
+        select(nondebug_dest.c.variant, nondebug_dest.c.idx, nondebug_dest.c.dest_arch),
+        select(debug_dest.c.variant, debug_dest.c.idx, debug_dest.c.dest_arch),
+    ).cte("dest")
+    return (
+        select(dest.c.variant, rpm_table.c.nvr, rpm_table.c.arch, dest.c.dest_arch)
+        .join(rpm_table, rpm_table.c.idx == dest.c.idx)
+        .order_by(rpm_table.c.idx, dest.c.variant, dest.c.dest_arch)
+    )
+
+
+@observe_db_query
+def select_product_listings(db, label, version, rpms, last_rpm):
+    """
+    Returns (variant, NVR, RPM arch, destination arch) rows for the RPMs
+    given as (idx, nvr, name, arch, debuginfo) tuples.
+    """
+    dialect = db.get_bind().dialect.name
+    query = product_listings_statement(dialect, label, version, rpms, last_rpm)
+    return db.execute(query).all()
@@ -0,0 +1,219 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Prometheus metrics
+
+If PROMETHEUS_MULTIPROC_DIR environment variable is set, metrics from all
+worker processes are collected from that directory.
+"""
+
+import functools
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from product_listings_manager.server_timing import timed
+
+# Name of the logical DB query (function in products module) being executed
+current_db_query: ContextVar[str] = ContextVar("current_db_query", default="other")
+
+HTTP_REQUESTS = Counter(
+    "plm_http_requests_total",
+    "Number of HTTP requests",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "plm_http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route"],
+)
+KOJI_CALL_DURATION = Histogram(
+    "plm_koji_call_duration_seconds",
+    "Koji hub call latency",
+    ["method"],
+)
+DB_QUERY_DURATION = Histogram(
+    "plm_db_query_duration_seconds",
+    "Latency of logical DB queries including processing of the results",
+    ["query"],
+)
+DB_STATEMENTS = Counter(
+    "plm_db_statements_total",
+    "Number of executed SQL statements",
+    ["query"],
+)
+DB_STATEMENT_DURATION = Histogram(
+    "plm_db_statement_duration_seconds",
+    "SQL statement latency",
+    ["query"],
+)
+LDAP_DURATION = Histogram(
+    "plm_ldap_duration_seconds",
+    "Latency of LDAP group membership lookups",
+)
+GSSAPI_DURATION = Histogram(
+    "plm_gssapi_duration_seconds",
+    "Latency of GSSAPI authentication",
+)
+DB_READ_SESSIONS = Counter(
+    "plm_db_read_sessions_total",
+    "Number of DB sessions for read-only queries per target (replica or primary)",
+    ["target"],
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "plm_db_pool_connections",
+    "Number of open DB connections",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "plm_db_pool_checked_out_connections",
+    "Number of DB connections currently in use",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "plm_db_pool_checkout_wait_seconds",
+    "Time waiting for a DB connection from the pool (including connecting)",
+)
+DB_POOL_TIMEOUTS = Counter(
+    "plm_db_pool_timeouts_total",
+    "Number of times no DB connection was available within the pool timeout",
+)
+TREE_INDEX_TREES = Gauge(
+    "plm_tree_index_trees",
+    "Number of trees in the in-memory tree index",
+    multiprocess_mode="livemax",
+)
+TREE_INDEX_PACKAGES = Gauge(
+    "plm_tree_index_packages",
+    "Number of package names and arches in the in-memory tree index",
+    multiprocess_mode="livemax",
+)
+TREE_INDEX_BYTES = Gauge(
+    "plm_tree_index_bytes",
+    "Approximate memory used by the in-memory tree index",
+    multiprocess_mode="livesum",
+)
+DEST_ARCH_CACHE_LOOKUPS = Counter(
+    "plm_dest_arch_cache_lookups_total",
+    "Number of package lookups in the destination arch cache per result",
+    ["result"],
+)
+BLOOM_FILTER_CHECKS = Counter(
+    "plm_bloom_filter_checks_total",
+    "Number of packages checked against the Bloom filter of package names per result",
+    ["result"],
+)
+BLOOM_FILTER_FALSE_POSITIVES = Counter(
+    "plm_bloom_filter_false_positives_total",
+    "Number of packages passing the Bloom filter of package names but not found",
+)
+BLOOM_FILTER_SKIPPED_QUERIES = Counter(
+    "plm_bloom_filter_skipped_queries_total",
+    "Number of package lookups skipped because no package passed the Bloom filter",
+)
+
+
+@contextmanager
+def observe_koji_call(method: str):
+    with KOJI_CALL_DURATION.labels(method).time(), timed("koji"):
+        yield
+
+
+@contextmanager
+def observe_gssapi():
+    with GSSAPI_DURATION.time(), timed("auth"):
+        yield
+
+
+@contextmanager
+def observe_ldap():
+    with LDAP_DURATION.time(), timed("auth"):
+        yield
+
+
+def observe_db_query(func):
+    """
+    Decorator for functions executing DB queries.
+
+    SQL statements executed by the function are counted under the function
+    name.
+    """
+    name = func.__name__
+    histogram = DB_QUERY_DURATION.labels(name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = current_db_query.set(name)
+        try:
+            with histogram.time():
+                return func(*args, **kwargs)
+        finally:
+            current_db_query.reset(token)
+
+    return wrapper
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["plm_statement_start"] = time.perf_counter()
+
+
+def instrument_engine(engine, statement_subscribers=()):
+    """
+    Collects statement and connection pool metrics for the DB engine.
+
+    Each of statement_subscribers is called with the statement, parameters and
+    duration in seconds after each SQL statement is executed.
+    """
+    subscribers = tuple(statement_subscribers)
+
+    def after_cursor_execute(conn, cursor, statement, parameters, *args):
+        duration = time.perf_counter() - conn.info["plm_statement_start"]
+        query = current_db_query.get()
+        DB_STATEMENTS.labels(query).inc()
+        DB_STATEMENT_DURATION.labels(query).observe(duration)
+        for subscriber in subscribers:
+            subscriber(statement, parameters, duration)
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "connect", lambda *_: DB_POOL_CONNECTIONS.inc())
+    event.listen(engine, "close", lambda *_: DB_POOL_CONNECTIONS.dec())
+    event.listen(engine, "checkout", lambda *_: DB_POOL_CHECKED_OUT.inc())
+    event.listen(engine, "checkin", lambda *_: DB_POOL_CHECKED_OUT.dec())
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool observing the time spent waiting for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
+def generate_metrics() -> tuple[bytes, str]:
+    """Returns metrics in Prometheus text format and the content type."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,11 +1,14 @@
 # SPDX-License-Identifier: GPL-2.0+
 import re
+import time
 
 from fastapi import Request
 from starlette.datastructures import URL
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import RedirectResponse
-from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from product_listings_manager.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS
 
 repeated_quotes = re.compile(r"//+")
 
@@ -43,3 +46,38 @@ class UrlRedirectMiddleware:
             await response(scope, receive, send)
         else:
             await self.app(scope, receive, send)
+
+
+class MetricsMiddleware:
+    """
+    Collects request count and latency per route.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Use route path template to avoid a separate time series for
+            # every product label and build
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            HTTP_REQUEST_DURATION.labels(method, route).observe(
+                time.perf_counter() - start
+            )
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
@@ -7,6 +7,9 @@ These models are not fully relecting the composedb schema:
 - Length of String() column is not required by postgresql(composedb uses
   it), in case of testing with other db backend(e.g. sqlite) a value is given
   in following definition and it has no side effect to postgresql(composedb).
+
+- Indexes are the ones recommended for the queries PLM runs, use
+  "product-listings-manager check-indexes" to find the missing ones.
 """
 
 import os
@@ -17,28 +20,124 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     create_engine,
+    event,
 )
-from sqlalchemy.orm import DeclarativeBase, relationship, sessionmaker
+from sqlalchemy.orm import DeclarativeBase, Session, relationship, sessionmaker
 from sqlalchemy.pool import StaticPool
 
-DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URI", "sqlite://")
+from product_listings_manager import explain, metrics, server_timing, utils
+from product_listings_manager.replicas import ReplicaSet
+from product_listings_manager.snapshot import Snapshot
 
-if DATABASE_URL.startswith("sqlite://"):
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
+DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URI", "sqlite://")
+REPLICA_DATABASE_URLS = [
+    url.strip()
+    for url in os.getenv("PLM_REPLICA_DATABASE_URIS", "").split(",")
+    if url.strip()
+]
+
+
+def _getenv_seconds(name: str) -> float | None:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+# Maximum duration of SQL statements per endpoint class, unlimited if unset
+LISTINGS_STATEMENT_TIMEOUT = _getenv_seconds("PLM_LISTINGS_STATEMENT_TIMEOUT")
+DBQUERY_STATEMENT_TIMEOUT = _getenv_seconds("PLM_DBQUERY_STATEMENT_TIMEOUT")
+
+
+def pool_options() -> dict:
+    """Connection pool options for the DB engines and snapshots."""
+    return {
+        "poolclass": metrics.InstrumentedQueuePool,
+        "pool_size": int(os.getenv("PLM_DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("PLM_DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("PLM_DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("PLM_DB_POOL_RECYCLE", "-1")),
+        "pool_pre_ping": utils.getenv_bool("PLM_DB_POOL_PRE_PING"),
+    }
+
+
+def instrument_engine(engine):
+    metrics.instrument_engine(
+        engine,
+        statement_subscribers=(
+            server_timing.record_statement,
+            explain.capture_statement,
+        ),
     )
-else:
-    engine = create_engine(DATABASE_URL)
 
-SQLAlchemyInstrumentor().instrument(engine=engine)
+
+def create_db_engine(url, connect_timeout: int | None = None):
+    if url.startswith("sqlite://"):
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+    else:
+        connect_args = {}
+        if connect_timeout and url.startswith("postgresql"):
+            connect_args["connect_timeout"] = connect_timeout
+        engine = create_engine(url, connect_args=connect_args, **pool_options())
+
+    instrument_engine(engine)
+    return engine
+
+
+def create_snapshot_engine(path, creator):
+    engine = create_engine(f"sqlite:///{path}", creator=creator, **pool_options())
+    instrument_engine(engine)
+    return engine
+
+
+engine = create_db_engine(DATABASE_URL)
+replica_engines = [
+    create_db_engine(url, int(os.getenv("PLM_REPLICA_CONNECT_TIMEOUT", "5")))
+    for url in REPLICA_DATABASE_URLS
+]
+
+SQLAlchemyInstrumentor().instrument(engines=[engine, *replica_engines])
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+replica_set = ReplicaSet(
+    SessionLocal,
+    replica_engines,
+    max_lag=float(os.getenv("PLM_REPLICA_MAX_LAG_SECONDS", "30")),
+    lag_check_interval=float(os.getenv("PLM_REPLICA_LAG_CHECK_INTERVAL", "5")),
+)
+
+SNAPSHOT_PATH = os.getenv("PLM_SNAPSHOT_PATH")
+snapshot = (
+    Snapshot(
+        SNAPSHOT_PATH,
+        create_snapshot_engine,
+        check_interval=float(os.getenv("PLM_SNAPSHOT_CHECK_INTERVAL", "5")),
+    )
+    if SNAPSHOT_PATH
+    else None
+)
+
+
+def set_statement_timeout(db, timeout: float | None):
+    """Limits duration of SQL statements in the following DB transactions."""
+    db.info["statement_timeout"] = timeout
+
+
+@event.listens_for(Session, "after_begin")
+def _set_local_statement_timeout(session, transaction, connection):
+    timeout = session.info.get("statement_timeout")
+    if timeout and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(
+            f"SET LOCAL statement_timeout = {int(timeout * 1000)}"
+        )
+
 
 class BaseModel(DeclarativeBase):
     pass
@@ -56,6 +155,19 @@ async def get_db():
         db.close()
 
 
+async def get_listings_db():
+    """
+    Session for the listing endpoints, uses the snapshot or a read replica if
+    configured.
+    """
+    db = snapshot.session() if snapshot else replica_set.read_session()
+    set_statement_timeout(db, LISTINGS_STATEMENT_TIMEOUT)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 class Packages(BaseModel):
     """packages table in composedb.
 
@@ -63,6 +175,9 @@ class Packages(BaseModel):
     """
 
     __tablename__ = "packages"
+    __table_args__ = (
+        Index("ix_packages_name_arch_version", "name", "arch", "version"),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String(255), nullable=False)
@@ -75,6 +190,7 @@ class Packages(BaseModel):
 
 class TreeProductMap(BaseModel):
     __tablename__ = "tree_product_map"
+    __table_args__ = (Index("ix_tree_product_map_product_id", "product_id", "tree_id"),)
 
     tree_id = Column(Integer, ForeignKey("trees.id"), primary_key=True)
     product_id = Column(
@@ -88,6 +204,9 @@ class Products(BaseModel):
     """products table in composedb."""
 
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_label_version_variant", "label", "version", "variant"),
+    )
 
     id = Column(Integer, primary_key=True)
     label = Column(String(100), nullable=False)
@@ -107,6 +226,7 @@ class Products(BaseModel):
 
 class TreePackages(BaseModel):
     __tablename__ = "tree_packages"
+    __table_args__ = (Index("ix_tree_packages_packages_id", "packages_id", "trees_id"),)
 
     trees_id = Column(Integer, ForeignKey("trees.id"), primary_key=True)
     packages_id = Column(
@@ -118,6 +238,7 @@ class TreePackages(BaseModel):
 
 class TreeModules(BaseModel):
     __tablename__ = "tree_modules"
+    __table_args__ = (Index("ix_tree_modules_modules_id", "modules_id", "trees_id"),)
 
     trees_id = Column(Integer, ForeignKey("trees.id"), primary_key=True)
     modules_id = Column(Integer, ForeignKey("modules.id"), primary_key=True)
@@ -127,6 +248,10 @@ class Trees(BaseModel):
     """trees table in composedb."""
 
     __tablename__ = "trees"
+    __table_args__ = (
+        Index("ix_trees_date_id", "date", "id"),
+        Index("ix_trees_arch_imported_compatlayer", "arch", "imported", "compatlayer"),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String(255), nullable=False)
@@ -155,6 +280,7 @@ class Overrides(BaseModel):
     """
 
     __tablename__ = "overrides"
+    __table_args__ = (Index("ix_overrides_product", "product"),)
 
     name = Column(String(255), primary_key=True)
     pkg_arch = Column(String(32), primary_key=True)
@@ -173,6 +299,7 @@ class MatchVersions(BaseModel):
     """match_versions table in composedb."""
 
     __tablename__ = "match_versions"
+    __table_args__ = (Index("ix_match_versions_product", "product"),)
 
     name = Column(String(255), primary_key=True)
     product = Column(String(100), primary_key=True)
@@ -185,6 +312,7 @@ class Modules(BaseModel):
     """modules table in composedb."""
 
     __tablename__ = "modules"
+    __table_args__ = (Index("ix_modules_name_stream", "name", "stream"),)
 
     id = Column(Integer, primary_key=True)
     name = Column(String(255), nullable=False)
@@ -199,6 +327,7 @@ class ModuleOverrides(BaseModel):
     """module_overrides table in composedb."""
 
     __tablename__ = "module_overrides"
+    __table_args__ = (Index("ix_module_overrides_product", "product"),)
 
     name = Column(String(255), primary_key=True)
     stream = Column(String(255), primary_key=True)
@@ -0,0 +1,74 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Parallel evaluation of product variants
+
+Variants are evaluated on a pool of threads shared by all requests. Each task
+gets its own DB session bound to the engine of the request session (primary
+database, read replica or snapshot) with the same statement timeout, and runs
+in a copy of the request context, so DB time and statements are accounted to
+the request. A request keeps at most max_per_request tasks in the pool at
+once, so a product with many variants cannot take all the workers.
+
+The transaction of the request session is committed before the tasks start,
+so the request does not hold its connection while the workers use theirs.
+"""
+
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from sqlalchemy.orm import Session
+
+from product_listings_manager import models
+
+
+class VariantExecutor:
+    def __init__(self, max_workers: int, max_per_request: int):
+        self.executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="plm-variants"
+        )
+        self.max_per_request = max_per_request
+
+    def map(self, db, func, items, max_workers=None) -> list:
+        """
+        Returns [func(worker_db, item) for item in items] with the calls
+        running in parallel, at most max_workers of them (limited by
+        max_per_request) at once.
+
+        If a call fails, the calls not started yet are cancelled and the
+        exception is raised.
+
+        Unless the calls run sequentially, the db transaction is committed
+        first to return its connection to the pool.
+        """
+        items = list(items)
+        limit = self.max_per_request
+        if max_workers is not None:
+            limit = min(limit, max_workers)
+        if limit <= 1 or len(items) <= 1:
+            return [func(db, item) for item in items]
+
+        bind = db.get_bind()
+        timeout = db.info.get("statement_timeout")
+        db.commit()
+
+        def run(item):
+            with Session(bind=bind) as worker_db:
+                models.set_statement_timeout(worker_db, timeout)
+                return func(worker_db, item)
+
+        results: list = [None] * len(items)
+        pending: dict[Future, int] = {}
+        next_index = 0
+        try:
+            while next_index < len(items) or pending:
+                while next_index < len(items) and len(pending) < limit:
+                    context = contextvars.copy_context()
+                    future = self.executor.submit(context.run, run, items[next_index])
+                    pending[future] = next_index
+                    next_index += 1
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+        return results
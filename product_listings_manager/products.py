@@ -1,22 +1,41 @@
 # koji hub plugin
 
-import copy
+import contextvars
 import functools
 import logging
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from itertools import zip_longest
+from typing import Any
 
 import koji
 from opentelemetry.instrumentation.requests import RequestsInstrumentor
-
-from product_listings_manager import models
+from sqlalchemy import bindparam, func, select, tuple_
+
+from product_listings_manager import models, utils
+from product_listings_manager.arch_table import ArchTable
+from product_listings_manager.bloom import PackageNameFilters
+from product_listings_manager.dest_cache import DestArchCache
+from product_listings_manager.imported_trees import ImportedTrees
+from product_listings_manager.listings_query import select_product_listings
+from product_listings_manager.metrics import observe_db_query, observe_koji_call
+from product_listings_manager.parallel import VariantExecutor
+from product_listings_manager.sql_arrays import MAX_ARRAY_SIZE, any_of
+from product_listings_manager.tree_index import TreeIndex
+from product_listings_manager.utils import chunks
 
 logger = logging.getLogger(__name__)
 
 RequestsInstrumentor().instrument()
 
 KOJI_CONFIG_PROFILE = os.getenv("PLM_KOJI_CONFIG_PROFILE", "brew")
+# Maximum number of calls in a single koji multiCall request
+KOJI_MULTICALL_BATCH = 100
+# Builds are fetched from kojihub while the product is loaded from the DB, by
+# default one thread per request thread (the limit of the FastAPI thread pool)
+KOJI_FETCH_THREADS = int(os.getenv("PLM_KOJI_FETCH_THREADS", "40"))
 
 ALL_RELEASE_TYPES = (
     re.compile(r"^TEST\d*", re.IGNORECASE),
@@ -45,7 +64,8 @@ def get_build(nvr, session=None):
         session = get_koji_session()
 
     try:
-        return session.getBuild(nvr, strict=True)
+        with observe_koji_call("getBuild"):
+            return session.getBuild(nvr, strict=True)
     except koji.GenericError as ex:
         raise ProductListingsNotFoundError(str(ex))
 
@@ -109,6 +129,7 @@ def product_version_sort(x, y):
     return 0
 
 
+@observe_db_query
 def get_product_info(db, label):
     """Get the latest version of product and its variants."""
     products = db.query(models.Products).filter_by(label=label).all()
@@ -129,36 +150,56 @@ def get_product_info(db, label):
     )
 
 
+# Statements of the hot queries are built once, with bound parameters, so
+# that executing them skips building ORM queries and hydrating ORM rows, and
+# takes the compiled form from the SQLAlchemy cache.
+_packages = models.Packages.__table__
+_products = models.Products.__table__
+_trees = models.Trees.__table__
+_tree_packages = models.TreePackages.__table__
+_tree_product_map = models.TreeProductMap.__table__
+_overrides = models.Overrides.__table__
+_module_overrides = models.ModuleOverrides.__table__
+
+_OVERRIDES_QUERY = (
+    select(
+        _overrides.c.name,
+        _overrides.c.pkg_arch,
+        _overrides.c.product_arch,
+        _overrides.c.include,
+    )
+    .join(_products, _products.c.id == _overrides.c.product)
+    .where(
+        _products.c.label == bindparam("product"),
+        _products.c.version == bindparam("version"),
+    )
+)
+_VARIANT_OVERRIDES_QUERY = _OVERRIDES_QUERY.where(
+    _products.c.variant == bindparam("variant")
+)
+
+
+@observe_db_query
 def get_overrides(db, product, version, variant=None):
     """
     Returns the list of package overrides for the particular product specified.
     """
 
-    query = (
-        db.query(models.Overrides)
-        .join(models.Overrides.productref)
-        .filter(
-            models.Products.label == product,
-            models.Products.version == version,
-        )
-    )
+    params = {"product": product, "version": version}
+    query = _OVERRIDES_QUERY
     if variant:
-        query = query.filter(models.Products.variant == variant)
+        query = _VARIANT_OVERRIDES_QUERY
+        params["variant"] = variant
 
     overrides = {}
-    for row in query.all():
-        name, pkg_arch, product_arch, include = (
-            row.name,
-            row.pkg_arch,
-            row.product_arch,
-            row.include,
-        )
+    for name, pkg_arch, product_arch, include in db.execute(query, params):
         overrides.setdefault(name, {}).setdefault(pkg_arch, {}).setdefault(
             product_arch, include
         )
     return overrides
 
 
+@observe_db_query
 def get_match_versions(db, product):
     """
     Returns the list of packages for this product where we must match the version.
@@ -168,6 +209,7 @@ def get_match_versions(db, product):
     ]
 
 
+@observe_db_query
 def get_srconly_flag(db, product, version):
     """
     BREW-260 - Returns allow_source_only field for the product and matching version.
@@ -178,104 +220,326 @@ def get_srconly_flag(db, product, version):
     return db.query(q.exists()).scalar()
 
 
+_TREELIST_QUERY = (
+    select(_trees.c.id, _trees.c.arch, _trees.c.compatlayer)
+    .join(_tree_product_map, _tree_product_map.c.tree_id == _trees.c.id)
+    .join(_products, _products.c.id == _tree_product_map.c.product_id)
+    .where(
+        _products.c.label == bindparam("product"),
+        _products.c.version == bindparam("version"),
+    )
+    .order_by(_trees.c.date.desc(), _trees.c.id.desc())
+)
+_VARIANT_TREELIST_QUERY = _TREELIST_QUERY.where(
+    _products.c.variant == bindparam("variant")
+)
+
+
+@observe_db_query
 def precalc_treelist(db, product, version, variant=None):
     """Returns the list of trees to consider.
 
     Looks in the compose db for a list of trees (one per arch) that are the most
     recent for the particular product specified."""
 
-    query = (
-        db.query(models.Trees)
-        .join(models.Trees.products)
-        .order_by(models.Trees.date.desc(), models.Trees.id.desc())
-        .filter(
-            models.Products.label == product,
-            models.Products.version == version,
-        )
-    )
+    params = {"product": product, "version": version}
+    query = _TREELIST_QUERY
     if variant:
-        query = query.filter(models.Products.variant == variant)
+        query = _VARIANT_TREELIST_QUERY
+        params["variant"] = variant
+
+    return [row.id for row in _latest_trees(db.execute(query, params))]
+
 
+def _latest_trees(rows):
+    """
+    Returns the first row for each arch of regular and of compat layer trees
+    from rows ordered by date, latest first.
+    """
     trees = {}
     compat_trees = {}
-    for row in query.all():
-        id = row.id
+    for row in rows:
         arch = row.arch
         if row.compatlayer:
             if arch not in compat_trees:
-                compat_trees[arch] = id
+                compat_trees[arch] = row
         else:
             if arch not in trees:
-                trees[arch] = id
+                trees[arch] = row
     return list(trees.values()) + list(compat_trees.values())
 
 
-def dest_get_archs(
-    db, trees, src_arch, names, cache_entry, version=None, overrides=None
-):
-    """Return a list of arches that this package/arch combination ships on."""
+@observe_db_query
+def latest_products(db, labels=None) -> list[int]:
+    """
+    Returns IDs of products of the latest version of each label (see
+    get_product_info).
+    """
+    products = models.Products.__table__
+    query = select(products.c.id, products.c.label, products.c.version)
+    if labels:
+        query = query.where(any_of(products.c.label, labels))
+
+    by_label: dict[str, list] = {}
+    for row in db.execute(query):
+        by_label.setdefault(row.label, []).append(row)
+
+    ids: list[int] = []
+    for rows in by_label.values():
+        versions = [row.version for row in rows]
+        versions.sort(key=functools.cmp_to_key(product_version_sort))
+        versions.reverse()
+        ids.extend(row.id for row in rows if row.version == versions[0])
+    return ids
+
+
+@observe_db_query
+def latest_trees(db, product_ids) -> set[tuple[int, int]]:
+    """
+    Returns (product_id, tree_id) for the latest tree of each product per
+    arch and compat layer (see precalc_treelist).
+    """
+    trees = models.Trees.__table__
+    tree_product_map = models.TreeProductMap.__table__
+    latest: dict[tuple[int, str, bool], int] = {}
+    for chunk in chunks(product_ids, MAX_ARRAY_SIZE):
+        query = (
+            select(
+                tree_product_map.c.product_id,
+                trees.c.id,
+                trees.c.arch,
+                trees.c.compatlayer,
+            )
+            .join(trees, trees.c.id == tree_product_map.c.tree_id)
+            .where(any_of(tree_product_map.c.product_id, chunk))
+            .order_by(trees.c.date.desc(), trees.c.id.desc())
+        )
+        for product_id, tree_id, arch, compatlayer in db.execute(query):
+            latest.setdefault((product_id, arch, bool(compatlayer)), tree_id)
+    return {(product_id, tree_id) for (product_id, _, _), tree_id in latest.items()}
 
-    if trees is None:
-        return {name: src_arch for name in names}
 
-    query = (
-        db.query(models.Trees)
-        .with_entities(models.Trees.arch, models.Packages.name)
-        .join(models.Trees.packages)
-        .filter(
-            models.Packages.arch == src_arch,
-            models.Packages.name.in_(names),
-            models.Trees.id.in_(trees),
-            models.Trees.imported == 1,
-        )
+def latest_tree_ids(db) -> set[int]:
+    """Returns IDs of the latest trees of the latest product versions."""
+    return {tree_id for _, tree_id in latest_trees(db, latest_products(db))}
+
+
+TREE_INDEX = (
+    TreeIndex(
+        latest_tree_ids,
+        refresh_interval=float(os.getenv("PLM_TREE_INDEX_REFRESH_INTERVAL", "60")),
+    )
+    if utils.getenv_bool("PLM_TREE_INDEX")
+    else None
+)
+
+DEST_ARCH_CACHE_SIZE = int(os.getenv("PLM_DEST_ARCH_CACHE_SIZE", "0"))
+DEST_ARCH_CACHE = (
+    DestArchCache(DEST_ARCH_CACHE_SIZE) if DEST_ARCH_CACHE_SIZE > 0 else None
+)
+PACKAGE_NAME_FILTERS = (
+    PackageNameFilters(float(os.getenv("PLM_BLOOM_FILTER_ERROR_RATE", "0.001")))
+    if utils.getenv_bool("PLM_BLOOM_FILTER")
+    else None
+)
+IMPORTED_TREES = ImportedTrees()
+# "python" evaluates listings from results of simple queries, "sql" computes
+# them with a single SQL statement
+LISTINGS_ENGINE = os.getenv("PLM_LISTINGS_ENGINE", "python")
+VARIANT_WORKERS = int(os.getenv("PLM_VARIANT_WORKERS", "0"))
+VARIANT_EXECUTOR = (
+    VariantExecutor(
+        VARIANT_WORKERS, int(os.getenv("PLM_VARIANT_WORKERS_PER_REQUEST", "4"))
+    )
+    if VARIANT_WORKERS > 0
+    else None
+)
+
+
+_DEST_ARCHS_QUERY = (
+    select(_packages.c.arch, _trees.c.arch, _packages.c.name)
+    .select_from(_trees)
+    .join(_tree_packages, _tree_packages.c.trees_id == _trees.c.id)
+    .join(_packages, _packages.c.id == _tree_packages.c.packages_id)
+    .where(
+        any_of(_packages.c.arch, key="arches"),
+        any_of(_packages.c.name, key="names"),
+        any_of(_trees.c.id, key="trees"),
+        _trees.c.imported == 1,
     )
+)
+_VERSION_DEST_ARCHS_QUERY = _DEST_ARCHS_QUERY.where(
+    _packages.c.version == bindparam("version")
+)
+
+
+def _query_dest_archs(db, trees, names_by_arch, version=None):
+    """
+    Returns (package arch, tree arch, package name) of the packages found in
+    the trees. May include packages of names listed for another arch only.
+    """
+    names = {name for arch_names in names_by_arch.values() for name in arch_names}
+    params = {"arches": list(names_by_arch), "trees": list(trees)}
+    query = _DEST_ARCHS_QUERY
     if version:
-        query = query.filter(models.Packages.version == version)
+        query = _VERSION_DEST_ARCHS_QUERY
+        params["version"] = version
 
-    ret = {}
-    for arow in query.all():
-        ret.setdefault(arow.name, {}).setdefault(arow.arch, 1)
-
-    for name in names:
-        # use cached map entry if there are no records from treetables
-        if koji.is_debuginfo(name) and not ret.get(name, {}):
-            ret[name] = copy.deepcopy(cache_entry)
-
-        if (
-            overrides
-            and name in overrides
-            and src_arch in overrides[name]
-            and not version
-        ):
-            for tree_arch, include in overrides[name][src_arch].items():
-                if include:
-                    ret.setdefault(name, {}).setdefault(tree_arch, 1)
-                elif name in ret and tree_arch in ret[name]:
-                    del ret[name][tree_arch]
+    rows = []
+    for chunk in chunks(names, MAX_ARRAY_SIZE):
+        rows.extend(db.execute(query, {**params, "names": chunk}))
+    return rows
+
+
+@observe_db_query
+def dest_get_archs(db, trees, names_by_arch, arch_table, version=None):
+    """
+    Return masks of arches (see ArchTable) of the trees containing each
+    package as {arch: {name: mask}} for the given {arch: [name, ...]}.
+    """
+    bit = arch_table.bit
+
+    if trees is None:
+        return {
+            arch: {name: bit(arch) for name in names}
+            for arch, names in names_by_arch.items()
+        }
+
+    version = version or None
+    cache = DEST_ARCH_CACHE
+    name_filters = PACKAGE_NAME_FILTERS
+    if cache is not None or name_filters is not None:
+        # Only the imported trees are searched
+        trees = IMPORTED_TREES.fingerprint(db, trees)
+    if cache is not None:
+        cached, names_by_arch = cache.lookup(trees, names_by_arch, version)
+
+    ret: dict[str, dict[str, int]] = {arch: {} for arch in names_by_arch}
+    lookup = names_by_arch
+    if name_filters is not None and lookup and trees:
+        lookup = name_filters.possible_names(db, trees, lookup)
+    if lookup and trees:
+        rows = None
+        if TREE_INDEX is not None:
+            rows = TREE_INDEX.find_packages(db, trees, lookup, version)
+        if rows is None:
+            rows = _query_dest_archs(db, trees, lookup, version)
+
+        for src_arch, tree_arch, name in rows:
+            masks = ret[src_arch]
+            masks[name] = masks.get(name, 0) | bit(tree_arch)
+        if name_filters is not None:
+            name_filters.count_false_positives(lookup, ret)
+
+    if cache is not None:
+        cache.store(
+            trees,
+            {
+                (arch, name): arch_table.expand(ret[arch].get(name, 0))
+                for arch, names in names_by_arch.items()
+                for name in names
+            },
+            version,
+        )
+        for arch, archs_by_name in cached.items():
+            masks = ret.setdefault(arch, {})
+            for name, archs in archs_by_name.items():
+                mask = 0
+                for tree_arch in archs:
+                    mask |= bit(tree_arch)
+                masks[name] = mask
     return ret
 
 
-def get_module_overrides(
-    db, product, version, module_name, module_stream, variant=None
-):
-    """Returns the list of module overrides for the particular product specified."""
+_MODULE_OVERRIDES_QUERY = (
+    select(
+        _products.c.variant,
+        _module_overrides.c.name,
+        _module_overrides.c.stream,
+        _module_overrides.c.product_arch,
+    )
+    .join(_products, _products.c.id == _module_overrides.c.product)
+    .where(
+        _products.c.label == bindparam("product"),
+        _products.c.version == bindparam("version"),
+        tuple_(_module_overrides.c.name, _module_overrides.c.stream).in_(
+            bindparam("modules", expanding=True)
+        ),
+    )
+)
 
-    query = (
-        db.query(models.ModuleOverrides)
-        .join(models.ModuleOverrides.productref)
-        .filter(
+
+@observe_db_query
+def get_module_overrides(db, product, version, modules):
+    """
+    Returns module overrides of all variants of the particular product
+    specified for the given modules ((name, stream) pairs) as (variant, name,
+    stream, arch).
+    """
+
+    params = {"product": product, "version": version, "modules": list(modules)}
+    return db.execute(_MODULE_OVERRIDES_QUERY, params).all()
+
+
+@observe_db_query
+def get_module_trees(db, product, version, modules):
+    """
+    Returns the latest trees of each variant of the product (one per arch of
+    regular and of compat layer trees), latest first, with name and stream of
+    each of the given modules ((name, stream) pairs) the tree contains, or a
+    single row with None if it contains none of them.
+
+    The latest trees of the product without variant are the latest of these
+    (see _latest_trees).
+    """
+    ranked_trees = (
+        select(
+            models.Products.variant,
+            models.Trees.id,
+            models.Trees.arch,
+            models.Trees.compatlayer,
+            models.Trees.date,
+            func.row_number()
+            .over(
+                partition_by=(
+                    models.Products.variant,
+                    models.Trees.arch,
+                    models.Trees.compatlayer,
+                ),
+                order_by=(models.Trees.date.desc(), models.Trees.id.desc()),
+            )
+            .label("position"),
+        )
+        .join(models.Trees.products)
+        .where(
             models.Products.label == product,
             models.Products.version == version,
-            models.ModuleOverrides.name == module_name,
-            models.ModuleOverrides.stream == module_stream,
         )
+        .subquery()
     )
-    if variant:
-        query = query.filter(models.Products.variant == variant)
-
-    return [row.product_arch for row in query.all()]
+    tree_modules = (
+        select(models.TreeModules.trees_id, models.Modules.name, models.Modules.stream)
+        .join(models.Modules, models.Modules.id == models.TreeModules.modules_id)
+        .where(tuple_(models.Modules.name, models.Modules.stream).in_(modules))
+        .subquery()
+    )
+    query = (
+        select(
+            ranked_trees.c.variant,
+            ranked_trees.c.id,
+            ranked_trees.c.arch,
+            ranked_trees.c.compatlayer,
+            tree_modules.c.name,
+            tree_modules.c.stream,
+        )
+        .outerjoin(tree_modules, tree_modules.c.trees_id == ranked_trees.c.id)
+        .where(ranked_trees.c.position == 1)
+        .order_by(ranked_trees.c.date.desc(), ranked_trees.c.id.desc())
+    )
+    return db.execute(query).all()
 
 
+@observe_db_query
 def get_product_labels(db):
     rows = (
         db.query(models.Products).with_entities(models.Products.label).distinct().all()
@@ -283,156 +547,412 @@ def get_product_labels(db):
     return [{"label": row.label} for row in rows]
 
 
-def get_product_listings(db, product_label, build_info):
+@dataclass
+class ProductContext:
     """
-    Get a map of which variants of the given product included packages built
-    by the given build, and which arches each variant included.
+    Product data for the listings independent of the build, loaded from the
+    DB (see load_product_context).
+    """
+
+    version: str
+    variants: list[str | None]
+    allow_src_only: bool
+    match_version: list[str] = field(default_factory=list)
+    # Latest trees and overrides of the variants with trees
+    treelists: dict[str, list[int]] = field(default_factory=dict)
+    overrides: dict[str, dict] = field(default_factory=dict)
+
+
+def load_product_context(db, product_label) -> ProductContext:
+    """
+    Loads the product version, variants, match versions, source-only flag and
+    the latest trees and overrides of each variant.
+    """
+    version, variants = get_product_info(db, product_label)
+    # BREW-260: Read allow_src_only flag for the product/version
+    allow_src_only = get_srconly_flag(db, product_label, version)
+    product = ProductContext(version, variants, allow_src_only)
+    if LISTINGS_ENGINE == "sql":
+        # computed by the listings statement
+        return product
+
+    product.match_version = get_match_versions(db, product_label)
+    # dict keys must be a string
+    for variant in dict.fromkeys(variant or "" for variant in variants):
+        treelist = precalc_treelist(db, product_label, version, variant)
+        if treelist:
+            product.treelists[variant] = treelist
+            product.overrides[variant] = get_overrides(
+                db, product_label, version, variant
+            )
+    return product
+
+
+KOJI_EXECUTOR = ThreadPoolExecutor(KOJI_FETCH_THREADS, thread_name_prefix="plm-koji")
+
+
+def get_build_rpms(build_info):
+    """
+    Get RPMs of the given build from kojihub.
     """
     session = get_koji_session()
     build = get_build(build_info, session)
 
-    rpms = session.listRPMs(buildID=build["id"])
+    with observe_koji_call("listRPMs"):
+        rpms = session.listRPMs(buildID=build["id"])
     if not rpms:
         raise ProductListingsNotFoundError(
             f"Could not find any RPMs for build: {build_info}"
         )
+    return rpms
+
 
+def get_product_listings(db, product_label, build_info, max_workers=None):
+    """
+    Get a map of which variants of the given product included packages built
+    by the given build, and which arches each variant included.
+
+    Variants are evaluated by at most max_workers threads at once if parallel
+    evaluation is enabled (see VARIANT_EXECUTOR).
+    """
+    # The build is fetched from kojihub while the product is loaded
+    context = contextvars.copy_context()
+    rpms_future = KOJI_EXECUTOR.submit(context.run, get_build_rpms, build_info)
+    try:
+        product = load_product_context(db, product_label)
+    except Exception:
+        # Errors of the build are reported first
+        rpms_future.result()
+        raise
+    rpms = rpms_future.result()
+
+    return get_rpms_product_listings(db, product_label, rpms, max_workers, product)
+
+
+def sort_rpms(rpms):
+    """
+    Returns the RPMs sorted by NVR, the non-debuginfo RPMs first.
+    """
     # sort rpms, so first part of list consists of sorted 'normal' rpms and
     # second part are sorted debuginfos
     debuginfos = [x for x in rpms if "-debuginfo" in x["nvr"]]
     base_rpms = [x for x in rpms if "-debuginfo" not in x["nvr"]]
-    rpms = sorted(base_rpms, key=lambda x: x["nvr"]) + sorted(
+    return sorted(base_rpms, key=lambda x: x["nvr"]) + sorted(
         debuginfos, key=lambda x: x["nvr"]
     )
-    srpm = "{package_name}-{version}-{release}.src.rpm".format(**build)
 
-    prodinfo = get_product_info(db, product_label)
-    version, variants = prodinfo
 
-    listings = {}
-    match_version = get_match_versions(db, product_label)
-    for variant in variants:
+def get_rpms_product_listings(db, product_label, rpms, max_workers=None, product=None):
+    """
+    Get product listings (see get_product_listings) of the given RPMs of a
+    build, for the product loaded by load_product_context if given.
+    """
+    rpms = sort_rpms(rpms)
+    if product is None:
+        product = load_product_context(db, product_label)
+
+    # Non-debug RPMs are resolved first, debuginfo RPMs not found in the trees
+    # fall back to the arches of the non-debug RPMs
+    rpms_nondebug = []
+    rpms_debug = []
+    names_by_arch: dict[str, list[str]] = {}
+    for rpm in rpms:
+        if koji.is_debuginfo(rpm["name"]):
+            rpms_debug.append(rpm)
+        else:
+            rpms_nondebug.append(rpm)
+        names_by_arch.setdefault(rpm["arch"], []).append(rpm["name"])
+
+    if LISTINGS_ENGINE == "sql":
+        return _sql_product_listings(
+            db, product_label, product, rpms, rpms_nondebug, rpms_debug
+        )
+
+    # listings[variant][nvr][arch] is a list of masks of destination arches
+    listings: dict[str, dict[str, dict[str, list[int]]]] = {}
+    arch_table = ArchTable()
+    bit = arch_table.bit
+    # The version is matched for all packages if the last RPM is listed in
+    # match versions
+    last_rpm = rpms[-1]
+    rpm_version = (
+        last_rpm["version"] if last_rpm["name"] in product.match_version else None
+    )
+
+    def evaluate(variant_db, variant, arch_table):
+        return _variant_listings(
+            variant_db,
+            product.treelists[variant],
+            # overrides apply only if versions are not matched
+            {} if rpm_version else product.overrides[variant],
+            rpm_version,
+            rpms_nondebug,
+            rpms_debug,
+            names_by_arch,
+            arch_table,
+        )
+
+    variants = list(product.treelists)
+    if VARIANT_EXECUTOR is None:
+        found = {variant: evaluate(db, variant, arch_table) for variant in variants}
+    else:
+        # ArchTable is not thread-safe, workers return arches and the masks
+        # are built here
+        def evaluate_arches(variant_db, variant):
+            worker_arch_table = ArchTable()
+            rows = evaluate(variant_db, variant, worker_arch_table)
+            return [
+                (nvr, arch, worker_arch_table.expand(dest_mask))
+                for nvr, arch, dest_mask in rows
+            ]
+
+        results = VARIANT_EXECUTOR.map(db, evaluate_arches, variants, max_workers)
+        found = {
+            variant: [
+                (nvr, arch, sum(bit(dest_arch) for dest_arch in dest_arches))
+                for nvr, arch, dest_arches in rows
+            ]
+            for variant, rows in zip(variants, results)
+        }
+
+    # Variants are merged in product order, a variant listed twice gets the
+    # masks twice
+    for variant in product.variants:
         if variant is None:
-            # dict keys must be a string
             variant = ""
-        treelist = precalc_treelist(db, product_label, version, variant)
-        if not treelist:
+        rows = found.get(variant)
+        if rows is None:
             continue
-        overrides = get_overrides(db, product_label, version, variant)
-        cache_map = {}
-        for rpm in rpms:
-            if rpm["name"] in match_version:
-                rpm_version = rpm["version"]
-            else:
-                rpm_version = None
-
-        # without debuginfos
-        rpms_nondebug = [rpm for rpm in rpms if not koji.is_debuginfo(rpm["name"])]
-        d = {}
-        all_archs = {rpm["arch"] for rpm in rpms_nondebug}
-        for arch in all_archs:
-            d[arch] = dest_get_archs(
-                db,
-                treelist,
-                arch,
-                [rpm["name"] for rpm in rpms_nondebug if rpm["arch"] == arch],
-                cache_map.get(srpm, {}).get(arch, {}),
-                rpm_version,
-                overrides,
-            )
+        for nvr, arch, dest_mask in rows:
+            listings.setdefault(variant, {}).setdefault(nvr, {}).setdefault(
+                arch, []
+            ).append(dest_mask)
+
+        # BREW-260: check for allow_src_only flag added
+        drop_source_only(listings, variant, product.allow_src_only)
+
+    return expand_listings(listings, arch_table)
+
+
+def _variant_listings(
+    db,
+    treelist,
+    overrides,
+    rpm_version,
+    rpms_nondebug,
+    rpms_debug,
+    names_by_arch,
+    arch_table,
+):
+    """
+    Returns (NVR, arch, mask of destination arches) of the RPMs listed in the
+    variant with the given latest trees and overrides.
+    """
+    bit = arch_table.bit
+    found = dest_get_archs(db, treelist, names_by_arch, arch_table, rpm_version)
+
+    rows = []
+    # arch -> mask of destination arches of the non-debug RPMs
+    cache_map: dict[str, int] = {}
+    for debuginfo, group in ((False, rpms_nondebug), (True, rpms_debug)):
+        for rpm in group:
+            name = rpm["name"]
+            arch = rpm["arch"]
+            dest_mask = found[arch].get(name, 0)
+            # use cached map entry if there are no records from treetables
+            if debuginfo and not dest_mask:
+                dest_mask = cache_map.get(arch, 0)
+            for tree_arch, include in overrides.get(name, {}).get(arch, {}).items():
+                if include:
+                    dest_mask |= bit(tree_arch)
+                else:
+                    dest_mask &= ~bit(tree_arch)
 
-        for rpm in rpms_nondebug:
-            dest_archs = d[rpm["arch"]].get(rpm["name"], {}).keys()
-            if rpm["arch"] != "src":
-                cache_map.setdefault(srpm, {})
-                cache_map[srpm].setdefault(rpm["arch"], {})
-                for x in dest_archs:
-                    cache_map[srpm][rpm["arch"]][x] = 1
-            for dest_arch in dest_archs:
-                listings.setdefault(variant, {}).setdefault(rpm["nvr"], {}).setdefault(
-                    rpm["arch"], []
-                ).append(dest_arch)
-
-        # debuginfo only
-        rpms_debug = [rpm for rpm in rpms if koji.is_debuginfo(rpm["name"])]
-        d = {}
-        all_archs = {rpm["arch"] for rpm in rpms_debug}
-        for arch in all_archs:
-            d[arch] = dest_get_archs(
-                db,
-                treelist,
-                arch,
-                [rpm["name"] for rpm in rpms_debug if rpm["arch"] == arch],
-                cache_map.get(srpm, {}).get(arch, {}),
-                rpm_version,
-                overrides,
-            )
+            if not debuginfo and arch != "src":
+                cache_map[arch] = cache_map.get(arch, 0) | dest_mask
+            if dest_mask:
+                rows.append((rpm["nvr"], arch, dest_mask))
+    return rows
 
-        for rpm in rpms_debug:
-            dest_archs = d[rpm["arch"]].get(rpm["name"], {}).keys()
-            if rpm["arch"] != "src":
-                cache_map.setdefault(srpm, {})
-                cache_map[srpm].setdefault(rpm["arch"], {})
-                for x in dest_archs:
-                    cache_map[srpm][rpm["arch"]][x] = 1
-            for dest_arch in dest_archs:
-                listings.setdefault(variant, {}).setdefault(rpm["nvr"], {}).setdefault(
-                    rpm["arch"], []
-                ).append(dest_arch)
-
-        for variant in list(listings.keys()):
-            nvrs = list(listings[variant].keys())
-            # BREW-260: Read allow_src_only flag for the product/version
-            allow_src_only = get_srconly_flag(db, product_label, version)
-            if len(nvrs) == 1:
-                maps = list(listings[variant][nvrs[0]].keys())
-                # BREW-260: check for allow_src_only flag added
-                if len(maps) == 1 and maps[0] == "src" and not allow_src_only:
-                    del listings[variant]
-    return listings
 
+def drop_source_only(listings, variant, allow_src_only):
+    """Removes the variant listing only the source RPM if not allowed."""
+    nvrs = listings.get(variant)
+    if nvrs and len(nvrs) == 1 and not allow_src_only:
+        (maps,) = nvrs.values()
+        if list(maps) == ["src"]:
+            del listings[variant]
 
-def get_module_product_listings(db, product_label, module_nvr):
+
+def expand_listings(listings, arch_table):
     """
-    Get a map of which variants of the given product included the given module,
-    and which arches each variant included.
+    Expands arch masks, a list of masks only if a variant is listed twice.
     """
-    build = get_build(module_nvr)
+    return {
+        variant: {
+            nvr: {arch: arch_table.expand_all(masks) for arch, masks in archs.items()}
+            for nvr, archs in nvrs.items()
+        }
+        for variant, nvrs in listings.items()
+    }
+
+
+def _sql_product_listings(db, product_label, product, rpms, rpms_nondebug, rpms_debug):
+    """
+    Get product listings of the sorted RPMs of a build computed by a single
+    SQL statement (see listings_query).
+    """
+    version, variants = product.version, product.variants
+    allow_src_only = product.allow_src_only
+    rows = select_product_listings(
+        db,
+        product_label,
+        version,
+        [
+            (i, rpm["nvr"], rpm["name"], rpm["arch"], int(debuginfo))
+            for i, (rpm, debuginfo) in enumerate(
+                [(rpm, False) for rpm in rpms_nondebug]
+                + [(rpm, True) for rpm in rpms_debug]
+            )
+        ],
+        rpms[-1],
+    )
+
+    arch_table = ArchTable()
+    bit = arch_table.bit
+    # variant -> (nvr, arch) -> mask of destination arches in order of RPMs
+    found: dict[str, dict[tuple[str, str], int]] = {}
+    for variant, nvr, arch, dest_arch in rows:
+        masks = found.setdefault(variant, {})
+        masks[(nvr, arch)] = masks.get((nvr, arch), 0) | bit(dest_arch)
+
+    listings: dict[str, dict[str, dict[str, list[int]]]] = {}
+    for variant in variants:
+        if variant is None:
+            # dict keys must be a string
+            variant = ""
+        for (nvr, arch), dest_mask in found.get(variant, {}).items():
+            listings.setdefault(variant, {}).setdefault(nvr, {}).setdefault(
+                arch, []
+            ).append(dest_mask)
+        drop_source_only(listings, variant, allow_src_only)
+
+    return expand_listings(listings, arch_table)
+
+
+def _build_module(build, module_nvr):
+    """Returns (name, stream) of the module build."""
     try:
         module = build["extra"]["typeinfo"]["module"]
-        module_name = module["name"]
-        module_stream = module["stream"]
+        return module["name"], module["stream"]
     except (KeyError, TypeError):
         raise ProductListingsNotFoundError(f"This is not a module build: {module_nvr}")
 
+
+def _call_module(call, module_nvr):
+    """
+    Returns (name, stream) of the module build from a getBuild multicall
+    result, or the error.
+    """
+    try:
+        return _build_module(call.result, module_nvr)
+    except koji.GenericError as ex:
+        return ProductListingsNotFoundError(str(ex))
+    except ProductListingsNotFoundError as ex:
+        return ex
+
+
+def _modules_product_listings(db, product_label, modules):
+    """
+    Returns module product listings for each of the given modules ((name,
+    stream) pairs) evaluated against trees and overrides fetched at once.
+    """
     prodinfo = get_product_info(db, product_label)
     version, variants = prodinfo
 
-    listings = {}
+    # Trees and overrides of all variants are fetched at once, a product
+    # without variant gets all of them (see precalc_treelist)
+    trees: dict[str, dict] = {"": {}}
+    tree_modules: dict[int, set] = {}
+    for row in get_module_trees(db, product_label, version, modules):
+        trees[""].setdefault(row.id, row)
+        if row.variant:
+            trees.setdefault(row.variant, {}).setdefault(row.id, row)
+        if row.name is not None:
+            tree_modules.setdefault(row.id, set()).add((row.name, row.stream))
+    overrides: dict[str, dict[tuple[str, str], list[str]]] = {"": {}}
+    for override_variant, name, stream, arch in get_module_overrides(
+        db, product_label, version, modules
+    ):
+        overrides[""].setdefault((name, stream), []).append(arch)
+        if override_variant:
+            overrides.setdefault(override_variant, {}).setdefault(
+                (name, stream), []
+            ).append(arch)
+
+    latest_trees = {}
     for variant in variants:
         if variant is None:
             # dict keys must be a string
             variant = ""
-        trees = precalc_treelist(db, product_label, version, variant)
-
-        module_trees = (
-            db.query(models.Trees)
-            .with_entities(models.Trees.arch)
-            .join(models.Trees.modules)
-            .filter(
-                models.Modules.name == module_name,
-                models.Modules.stream == module_stream,
-            )
-            .filter(models.Trees.id.in_(trees))
-        )
+        if variant not in latest_trees:
+            latest_trees[variant] = _latest_trees(trees.get(variant, {}).values())
 
-        overrides = get_module_overrides(
-            db, product_label, version, module_name, module_stream, variant
-        )
+    ret = {}
+    for module in modules:
+        listings = {}
+        for variant, variant_trees in latest_trees.items():
+            module_archs = [
+                row.arch
+                for row in variant_trees
+                if module in tree_modules.get(row.id, ())
+            ]
+            variant_overrides = overrides.get(variant, {}).get(module, [])
+            archs = sorted(set(module_archs + variant_overrides))
+
+            if archs:
+                listings.setdefault(variant, archs)
+        ret[module] = listings
+    return ret
+
+
+def get_module_product_listings(db, product_label, module_nvr):
+    """
+    Get a map of which variants of the given product included the given module,
+    and which arches each variant included.
+    """
+    build = get_build(module_nvr)
+    module = _build_module(build, module_nvr)
+    return _modules_product_listings(db, product_label, [module])[module]
 
-        archs = sorted(set([arch for (arch,) in module_trees] + overrides))
 
-        if archs:
-            listings.setdefault(variant, archs)
+def get_bulk_module_product_listings(db, product_label, module_nvrs):
+    """
+    Get module product listings (see get_module_product_listings) of multiple
+    module builds, fetched from kojihub in a single multicall.
 
-    return listings
+    Returns a map of module build NVRs to listings or to a
+    ProductListingsNotFoundError for unknown and non-module builds.
+    """
+    session = get_koji_session()
+    with (
+        observe_koji_call("multiCall"),
+        session.multicall(strict=False, batch=KOJI_MULTICALL_BATCH) as m,
+    ):
+        calls = {nvr: m.getBuild(nvr, strict=True) for nvr in module_nvrs}
+
+    results: dict[str, Any] = {}
+    modules = {}
+    for nvr, call in calls.items():
+        module = _call_module(call, nvr)
+        if isinstance(module, ProductListingsNotFoundError):
+            results[nvr] = module
+        else:
+            modules[nvr] = module
+
+    listings = _modules_product_listings(
+        db, product_label, list(dict.fromkeys(modules.values()))
+    )
+    for nvr, module in modules.items():
+        results[nvr] = listings[module]
+    return {nvr: results[nvr] for nvr in calls}
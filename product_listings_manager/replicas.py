@@ -0,0 +1,115 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Routing of read-only DB sessions to read replicas
+
+Replicas are used in round-robin order. A replica lagging behind the primary
+more than the allowed maximum (or failing the lag check) is skipped; if no
+replica is usable, the primary is used.
+"""
+
+import itertools
+import logging
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import sessionmaker
+
+from product_listings_manager.metrics import DB_READ_SESSIONS
+
+logger = logging.getLogger(__name__)
+
+# Replication lag in seconds, zero if the replica replayed everything it
+# received or if it is not a replica
+POSTGRESQL_LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery()
+        OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+    THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END
+"""
+
+
+def measure_lag(conn) -> float:
+    if conn.dialect.name != "postgresql":
+        return 0.0
+    lag = conn.execute(text(POSTGRESQL_LAG_QUERY)).scalar()
+    return float(lag or 0.0)
+
+
+class Replica:
+    def __init__(self, engine, max_lag: float, lag_check_interval: float):
+        self.engine = engine
+        self.session_factory = sessionmaker(
+            autocommit=False, autoflush=False, bind=engine
+        )
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.lag: float | None = None
+        self.lag_checked_at: float | None = None
+        self.checking = False
+        self.lock = threading.Lock()
+
+    def check_lag(self) -> float | None:
+        """
+        Returns the cached replication lag, None if the check failed or has
+        not finished yet.
+
+        Only one caller runs the check at a time, the others get the cached
+        lag instead of waiting for a slow or unreachable replica.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.checking or (
+                self.lag_checked_at is not None
+                and now - self.lag_checked_at < self.lag_check_interval
+            ):
+                return self.lag
+            self.checking = True
+            self.lag_checked_at = now
+
+        lag = None
+        try:
+            with self.engine.connect() as conn:
+                lag = measure_lag(conn)
+        except SQLAlchemyError as e:
+            logger.warning("Replica lag check failed: %s", e)
+        finally:
+            with self.lock:
+                self.lag = lag
+                self.checking = False
+        return lag
+
+    def is_usable(self) -> bool:
+        lag = self.check_lag()
+        return lag is not None and lag <= self.max_lag
+
+
+class ReplicaSet:
+    def __init__(
+        self,
+        primary_session_factory,
+        replica_engines,
+        max_lag: float = 30.0,
+        lag_check_interval: float = 5.0,
+    ):
+        self.primary_session_factory = primary_session_factory
+        self.replicas = [
+            Replica(engine, max_lag, lag_check_interval) for engine in replica_engines
+        ]
+        self._next = itertools.cycle(range(len(self.replicas) or 1))
+
+    def read_session(self):
+        """Returns session for read-only queries."""
+        if self.replicas:
+            start = next(self._next)
+            for i in range(len(self.replicas)):
+                replica = self.replicas[(start + i) % len(self.replicas)]
+                if replica.is_usable():
+                    DB_READ_SESSIONS.labels("replica").inc()
+                    return replica.session_factory()
+            logger.warning("No usable read replica, falling back to primary")
+
+        DB_READ_SESSIONS.labels("primary").inc()
+        return self.primary_session_factory()
@@ -0,0 +1,33 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Fast JSON serialization of API responses"""
+
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic_core import to_jsonable_python
+
+from product_listings_manager.server_timing import timed
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serializes content to JSON.
+
+    Values which are not natively supported by JSON (Decimal, datetime,
+    timedelta etc. returned from DB queries) are encoded the same way as
+    pydantic encodes them in FastAPI responses.
+    """
+    return orjson.dumps(content, default=to_jsonable_python, option=orjson.OPT_UTC_Z)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response which skips the generic FastAPI encoder and validation.
+
+    Content must consist of dicts, lists and scalar values only.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with timed("serialization"):
+            return dumps(content)
@@ -5,28 +5,46 @@ import os
 from functools import lru_cache
 from typing import Annotated, Any
 
-from fastapi import APIRouter, Body, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
-from product_listings_manager import __version__, products, utils
+from product_listings_manager import __version__, batch, models, products, utils
 from product_listings_manager.auth import get_user
 from product_listings_manager.authorization import LdapConfig, get_user_groups
-from product_listings_manager.db_queries import execute_queries
-from product_listings_manager.models import get_db
+from product_listings_manager.db_queries import execute_queries, is_read_only
+from product_listings_manager.explain import explain_call
+from product_listings_manager.metrics import observe_koji_call
+from product_listings_manager.models import (
+    DBQUERY_STATEMENT_TIMEOUT,
+    LISTINGS_STATEMENT_TIMEOUT,
+    get_db,
+    get_listings_db,
+    set_statement_timeout,
+)
 from product_listings_manager.permissions import has_permission
+from product_listings_manager.responses import FastJSONResponse
 from product_listings_manager.schemas import (
     SQL_QUERY_EXAMPLES,
+    BuildListings,
+    BulkListingsQuery,
+    BulkModuleListingsQuery,
+    ExplainedListings,
+    ExplainedStatement,
     HealthOkMessage,
     LoginInfo,
     Message,
+    ModuleListings,
     Permission,
     SqlQuery,
 )
 
 router = APIRouter(prefix="/api/v1.0")
 
+# Users allowed to run this query can use the explain endpoints
+EXPLAIN_QUERY = "EXPLAIN ANALYZE"
+
 logger = logging.getLogger(__name__)
 
 
@@ -40,11 +58,21 @@ def ldap_config() -> LdapConfig:
             detail="Server configuration LDAP_HOST and LDAP_SEARCHES is required.",
         )
 
-    use_gssapi = os.getenv("PLM_LDAP_GSSAPI", "").lower() in ("true", "1", "yes")
+    use_gssapi = utils.getenv_bool("PLM_LDAP_GSSAPI")
 
     return LdapConfig(host=ldap_host, searches=ldap_searches, use_gssapi=use_gssapi)
 
 
+def json_response(content):
+    """
+    Returns content wrapped in FastJSONResponse if PLM_FAST_JSON is enabled,
+    otherwise returns content as is to be serialized by FastAPI.
+    """
+    if utils.getenv_bool("PLM_FAST_JSON"):
+        return FastJSONResponse(content)
+    return content
+
+
 @lru_cache
 def parse_permissions(filename) -> list[Permission]:
     """
@@ -121,7 +149,8 @@ def health(db: Session = Depends(get_db)):
         )
 
     try:
-        products.get_koji_session().getAPIVersion()
+        with observe_koji_call("getAPIVersion"):
+            products.get_koji_session().getAPIVersion()
     except Exception as e:
         logger.warning("Koji health check failed: %s", e)
         raise HTTPException(
@@ -162,7 +191,7 @@ def login(request: Request) -> LoginInfo:
     },
 )
 def product_info(
-    label: str, request: Request, db: Session = Depends(get_db)
+    label: str, request: Request, db: Session = Depends(get_listings_db)
 ) -> tuple[str, list[str]]:
     """Get the latest version of a product and its variants."""
     try:
@@ -195,10 +224,10 @@ def product_info(
         },
     },
 )
-def product_labels(request: Request, db: Session = Depends(get_db)):
+def product_labels(request: Request, db: Session = Depends(get_listings_db)):
     """List all product labels."""
     try:
-        return products.get_product_labels(db)
+        return json_response(products.get_product_labels(db))
     except Exception as ex:
         utils.log_remote_call_error(request, "API call get_product_labels() failed")
         raise HTTPException(
@@ -243,14 +272,27 @@ def product_listings(
     label: str,
     build_info: str,
     request: Request,
-    db: Session = Depends(get_db),
+    parallelism: Annotated[
+        int | None,
+        Query(
+            ge=1,
+            description=(
+                "Maximum number of variants evaluated at once if parallel"
+                " evaluation is enabled (limited by"
+                " PLM_VARIANT_WORKERS_PER_REQUEST)"
+            ),
+        ),
+    ] = None,
+    db: Session = Depends(get_listings_db),
 ):
     """
     Get a map of which variants of the given product included packages built
     by the given build, and which arches each variant included.
     """
     try:
-        return products.get_product_listings(db, label, build_info)
+        listings = products.get_product_listings(
+            db, label, build_info, max_workers=parallelism
+        )
     except products.ProductListingsNotFoundError as ex:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(ex))
     except Exception as ex:
@@ -263,6 +305,71 @@ def product_listings(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(ex)
         )
+    return json_response(listings)
+
+
+@router.post(
+    "/product-listings",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "example": {
+                        "python-dasbus-1.2-1.el8": {
+                            "listings": {
+                                "AppStream-8.3.0.GA": {
+                                    "python-dasbus-1.2-1.el8": {
+                                        "src": ["aarch64", "x86_64"]
+                                    },
+                                    "python3-dasbus-1.2-1.el8": {
+                                        "noarch": ["aarch64", "x86_64"]
+                                    },
+                                }
+                            }
+                        },
+                        "missing-1.0-1.el8": {"error": "No such build: missing"},
+                    }
+                }
+            },
+        },
+        404: {"model": Message},
+    },
+    response_model_exclude_none=True,
+)
+def bulk_product_listings(
+    query: BulkListingsQuery,
+    request: Request,
+    db: Session = Depends(get_listings_db),
+) -> dict[str, BuildListings]:
+    """
+    Get product listings (see **product-listings**) of multiple builds of the
+    given product, evaluated at once.
+
+    Unknown builds and builds without RPMs are reported in the `error` field
+    of the build.
+    """
+    try:
+        results = batch.get_bulk_product_listings(db, query.label, query.build_nvrs)
+    except products.ProductListingsNotFoundError as ex:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(ex))
+    except Exception as ex:
+        utils.log_remote_call_error(
+            request,
+            "API call get_bulk_product_listings() failed",
+            query.label,
+            query.build_nvrs,
+        )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(ex)
+        )
+    return {
+        nvr: (
+            BuildListings(error=str(result))
+            if isinstance(result, products.ProductListingsNotFoundError)
+            else BuildListings(listings=result)
+        )
+        for nvr, result in results.items()
+    }
 
 
 @router.get("/module-product-listings/{label}/{module_build_nvr}")
@@ -270,14 +377,14 @@ def module_product_listings(
     label: str,
     module_build_nvr: str,
     request: Request,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_listings_db),
 ):
     """
     Get a map of which variants of the given product included the given module,
     and which arches each variant included.
     """
     try:
-        return products.get_module_product_listings(db, label, module_build_nvr)
+        listings = products.get_module_product_listings(db, label, module_build_nvr)
     except products.ProductListingsNotFoundError as ex:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(ex))
     except Exception as ex:
@@ -290,6 +397,160 @@ def module_product_listings(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(ex)
         )
+    return json_response(listings)
+
+
+@router.post(
+    "/module-product-listings",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "example": {
+                        "ruby-3.1-9040020230615080342.9": {
+                            "listings": {"AppStream-9.4.0": ["aarch64", "x86_64"]}
+                        },
+                        "bash-5.1.8-9.el9": {
+                            "error": "This is not a module build: bash-5.1.8-9.el9"
+                        },
+                    }
+                }
+            },
+        },
+        404: {"model": Message},
+    },
+    response_model_exclude_none=True,
+)
+def bulk_module_product_listings(
+    query: BulkModuleListingsQuery,
+    request: Request,
+    db: Session = Depends(get_listings_db),
+) -> dict[str, ModuleListings]:
+    """
+    Get module product listings (see **module-product-listings**) of multiple
+    module builds of the given product.
+
+    Unknown and non-module builds are reported in the `error` field of the
+    build.
+    """
+    try:
+        results = products.get_bulk_module_product_listings(
+            db, query.label, query.module_build_nvrs
+        )
+    except products.ProductListingsNotFoundError as ex:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(ex))
+    except Exception as ex:
+        utils.log_remote_call_error(
+            request,
+            "API call get_bulk_module_product_listings() failed",
+            query.label,
+            query.module_build_nvrs,
+        )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(ex)
+        )
+    return {
+        nvr: (
+            ModuleListings(error=str(result))
+            if isinstance(result, products.ProductListingsNotFoundError)
+            else ModuleListings(listings=result)
+        )
+        for nvr, result in results.items()
+    }
+
+
+def explain_listings(request: Request, db: Session, func, label: str, nvr: str):
+    ldap_config_ = ldap_config()
+    user, headers = get_user(request)
+    if not has_permission(
+        user, [SqlQuery(query=EXPLAIN_QUERY)], permissions(), ldap_config_
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"User {user} is not authorized to explain queries",
+        )
+
+    # Plans are always of the primary database, not of a replica or snapshot
+    set_statement_timeout(db, LISTINGS_STATEMENT_TIMEOUT)
+    try:
+        listings, queries = explain_call(db, func, label, nvr)
+    except products.ProductListingsNotFoundError as ex:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(ex))
+    except Exception as ex:
+        utils.log_remote_call_error(
+            request, f"API call {func.__name__}() explain failed", label, nvr
+        )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(ex)
+        )
+
+    return ExplainedListings(
+        database=db.get_bind().dialect.name,
+        listings=listings,
+        queries={
+            query: [
+                ExplainedStatement(
+                    statement=statement.statement,
+                    parameters=statement.parameters,
+                    duration_ms=statement.duration_ms,
+                    plan=statement.plan and statement.plan.plan,
+                    cost=statement.plan and statement.plan.cost,
+                    execution_ms=statement.plan and statement.plan.execution_ms,
+                    sequential_scans=(
+                        statement.plan.sequential_scans if statement.plan else []
+                    ),
+                )
+                for statement in statements
+            ]
+            for query, statements in queries.items()
+        },
+    )
+
+
+@router.get(
+    "/explain/product-listings/{label}/{build_info}",
+    responses={401: {}, 403: {}},
+)
+def explain_product_listings(
+    label: str,
+    build_info: str,
+    request: Request,
+    db: Session = Depends(get_db),
+) -> ExplainedListings:
+    """
+    Runs **product-listings** query on the primary database and returns query
+    plans (`EXPLAIN ANALYZE` on PostgreSQL) for each executed SQL statement,
+    grouped by the logical DB query.
+
+    User must be logged in and have permission to execute `EXPLAIN ANALYZE`
+    query.
+    """
+    return explain_listings(
+        request, db, products.get_product_listings, label, build_info
+    )
+
+
+@router.get(
+    "/explain/module-product-listings/{label}/{module_build_nvr}",
+    responses={401: {}, 403: {}},
+)
+def explain_module_product_listings(
+    label: str,
+    module_build_nvr: str,
+    request: Request,
+    db: Session = Depends(get_db),
+) -> ExplainedListings:
+    """
+    Runs **module-product-listings** query on the primary database and returns
+    query plans (`EXPLAIN ANALYZE` on PostgreSQL) for each executed SQL
+    statement, grouped by the logical DB query.
+
+    User must be logged in and have permission to execute `EXPLAIN ANALYZE`
+    query.
+    """
+    return explain_listings(
+        request, db, products.get_module_product_listings, label, module_build_nvr
+    )
 
 
 @router.get("/permissions", responses={401: {}})
@@ -345,6 +606,10 @@ def dbquery(
     Instead of using a `IN` SQL operator with a placeholder in a `WHERE` clause,
     use format like `trees_id = ANY(:tree_ids)` where value for the placeholder
     would be a list with the required values.
+
+    If all queries are plain `SELECT` queries calling only common functions
+    without side effects (like `count` or `lower`), they may be executed on a
+    read replica.
     """
     if not query_or_queries:
         raise HTTPException(
@@ -375,4 +640,10 @@ def dbquery(
 
     logger.info("Authorized DB queries for user %s: %s", user, queries)
 
-    return execute_queries(db, queries)
+    if all(is_read_only(query.query) for query in queries):
+        with models.replica_set.read_session() as read_db:
+            set_statement_timeout(read_db, DBQUERY_STATEMENT_TIMEOUT)
+            return json_response(execute_queries(read_db, queries))
+
+    set_statement_timeout(db, DBQUERY_STATEMENT_TIMEOUT)
+    return json_response(execute_queries(db, queries))
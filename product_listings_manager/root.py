@@ -1,5 +1,7 @@
 # SPDX-License-Identifier: GPL-2.0+
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, Response
+
+from product_listings_manager.metrics import generate_metrics
 
 router = APIRouter()
 
@@ -14,4 +16,12 @@ def index(request: Request):
         "api_reference": str(request.url_for("redoc_html")),
         "swagger_ui": str(request.url_for("swagger_ui_html")),
         "api_v1_url": str(request.url_for("api_index")),
+        "metrics_url": str(request.url_for("metrics")),
     }
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Metrics in Prometheus text format."""
+    data, content_type = generate_metrics()
+    return Response(content=data, media_type=content_type)
@@ -98,3 +98,40 @@ class SqlQuery(BaseModel):
 
     def __repr__(self):
         return f"<SqlQuery: {self.query!r} | {self.params!r}>"
+
+
+class ExplainedStatement(BaseModel):
+    statement: str
+    parameters: Any
+    duration_ms: float
+    plan: str | None
+    cost: float | None
+    execution_ms: float | None
+    sequential_scans: list[str]
+
+
+class ExplainedListings(BaseModel):
+    # Dialect of the explained database, for example "postgresql"
+    database: str
+    listings: dict[str, Any]
+    queries: dict[str, list[ExplainedStatement]]
+
+
+class BulkListingsQuery(BaseModel):
+    label: str = Field(min_length=1)
+    build_nvrs: list[str] = Field(min_length=1, max_length=1000)
+
+
+class BuildListings(BaseModel):
+    listings: dict[str, dict[str, dict[str, list[str]]]] | None = None
+    error: str | None = None
+
+
+class BulkModuleListingsQuery(BaseModel):
+    label: str = Field(min_length=1)
+    module_build_nvrs: list[str] = Field(min_length=1, max_length=1000)
+
+
+class ModuleListings(BaseModel):
+    listings: dict[str, list[str]] | None = None
+    error: str | None = None
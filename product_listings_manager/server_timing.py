@@ -0,0 +1,118 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Per-request accounting of time spent in processing stages
+
+Stages are koji, db, auth and serialization. The number of executed SQL
+statements is counted too.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RequestTimings:
+    stages: dict[str, float] = field(default_factory=dict)
+    db_statements: int = 0
+
+    def add(self, stage: str, duration: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + duration
+
+    def server_timing(self, total: float) -> str:
+        """Returns value for Server-Timing header."""
+        metrics = []
+        for stage, duration in self.stages.items():
+            metric = f"{stage};dur={duration * 1000:.1f}"
+            if stage == "db":
+                metric += f';desc="{self.db_statements} statements"'
+            metrics.append(metric)
+        metrics.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+current_timings: ContextVar[RequestTimings | None] = ContextVar(
+    "current_timings", default=None
+)
+
+
+def record(stage: str, duration: float) -> None:
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(stage, duration)
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def record_statement(statement, parameters, duration: float) -> None:
+    """
+    Accounts time and number of SQL statements to the current request (see
+    metrics.instrument_engine).
+    """
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add("db", duration)
+        timings.db_statements += 1
+
+
+class ServerTimingMiddleware:
+    """
+    Adds Server-Timing header with the time spent in processing stages and
+    logs the stages for slow requests.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        add_header: bool = True,
+        slow_request_seconds: float | None = None,
+    ) -> None:
+        self.app = app
+        self.add_header = add_header
+        self.slow_request_seconds = slow_request_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and self.add_header:
+                headers = MutableHeaders(scope=message)
+                total = time.perf_counter() - start
+                headers.append("Server-Timing", timings.server_timing(total))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_timings.reset(token)
+            total = time.perf_counter() - start
+            if (
+                self.slow_request_seconds is not None
+                and total >= self.slow_request_seconds
+            ):
+                logger.warning(
+                    "Slow request: %s %s, path_params=%r: %s",
+                    scope["method"],
+                    scope["path"],
+                    scope.get("path_params", {}),
+                    timings.server_timing(total),
+                )
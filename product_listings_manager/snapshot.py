@@ -0,0 +1,80 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Read-only serving from a SQLite snapshot of composedb
+
+The snapshot file (see "product-listings-manager export-snapshot") is opened
+as immutable and memory-mapped. A refreshed snapshot replaces the file
+atomically; new sessions use the new file while the sessions in progress
+finish with the previous one.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy.orm import sessionmaker
+
+logger = logging.getLogger(__name__)
+
+
+def connect(path: str):
+    """Opens the snapshot file as read-only, immutable and memory-mapped."""
+    uri = Path(path).absolute().as_uri() + "?mode=ro&immutable=1"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.execute(f"PRAGMA mmap_size = {os.path.getsize(path)}")
+    return conn
+
+
+class Snapshot:
+    def __init__(self, path: str, engine_factory, check_interval: float = 5.0):
+        """
+        The engine_factory(path, creator) creates a DB engine for the
+        snapshot file using the creator function to open connections.
+        """
+        self.path = path
+        self.engine_factory = engine_factory
+        self.check_interval = check_interval
+        self.engine = None
+        self.session_factory = None
+        self.file_id: tuple[int, int] | None = None
+        self.checked_at: float | None = None
+        self.lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            if self.engine is None:
+                raise
+            logger.warning("Keeping the current snapshot: %s", e)
+            return
+
+        file_id = (stat.st_ino, stat.st_mtime_ns)
+        if file_id == self.file_id:
+            return
+
+        path = self.path
+        engine = self.engine_factory(path, lambda: connect(path))
+
+        old_engine = self.engine
+        self.engine = engine
+        self.session_factory = sessionmaker(
+            autocommit=False, autoflush=False, bind=engine
+        )
+        self.file_id = file_id
+        logger.info("Loaded snapshot %s (%d bytes)", self.path, stat.st_size)
+
+        if old_engine is not None:
+            # Checked out connections are closed when returned
+            old_engine.dispose()
+
+    def session(self):
+        """Returns session for the current snapshot."""
+        with self.lock:
+            now = time.monotonic()
+            if self.checked_at is None or now - self.checked_at >= self.check_interval:
+                self._refresh()
+                self.checked_at = now
+            return self.session_factory()
@@ -0,0 +1,72 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""Lists of values bound as a single parameter
+
+any_of(column, values) renders as ``column = ANY(:values)`` with an array
+parameter on PostgreSQL. Unlike ``column.in_(values)``, the SQL string does
+not depend on the number of values, so the statement is compiled once (and
+planned once for prepared statements) for lists of any length.
+
+Other databases (SQLite) get ``column IN (...)`` with the list expanded when
+the statement is executed. SQLite has no plan cache shared across statements
+and, given ``IN (SELECT value FROM json_each(:values))``, its planner starts
+joins from the list of values, which is twice as slow for large builds.
+"""
+
+from typing import ClassVar
+
+from sqlalchemy import Boolean, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+# Longer lists are split to chunks by the callers
+MAX_ARRAY_SIZE = 10000
+
+
+class AnyOf(ColumnElement):
+    inherit_cache = True
+    type = Boolean()
+    # Rendered as is in WHERE clauses, not as "... = 1" on SQLite
+    _is_implicitly_boolean = True
+    # Declared as an instance attribute by SQLAlchemy, but only set per class
+    _traverse_internals: ClassVar[list[tuple[str, InternalTraversal]]] = [  # type: ignore[misc]
+        ("column", InternalTraversal.dp_clauseelement),
+        ("values", InternalTraversal.dp_clauseelement),
+        ("expanded_values", InternalTraversal.dp_clauseelement),
+    ]
+
+    def __init__(self, column, values=None, key=None):
+        if hasattr(column, "__clause_element__"):
+            column = column.__clause_element__()
+        self.column = column
+        # Only one of the parameters is rendered, so they can share the key
+        kwargs = {"unique": key is None}
+        if values is not None:
+            kwargs["value"] = list(values)
+        self.values = bindparam(key, type_=ARRAY(column.type), **kwargs)
+        self.expanded_values = bindparam(
+            key, type_=column.type, expanding=True, **kwargs
+        )
+
+
+@compiles(AnyOf)
+def _compile_any_of(element, compiler, **kw):
+    return compiler.process(element.column.in_(element.expanded_values), **kw)
+
+
+@compiles(AnyOf, "postgresql")
+def _compile_any_of_postgresql(element, compiler, **kw):
+    column = compiler.process(element.column, **kw)
+    values = compiler.process(element.values, **kw)
+    return f"{column} = ANY({values})"
+
+
+def any_of(column, values=None, key=None) -> AnyOf:
+    """
+    Returns condition that the column is one of the values.
+
+    With a key instead of values, the values are given as the parameter of
+    the key when the statement is executed.
+    """
+    return AnyOf(column, values, key)
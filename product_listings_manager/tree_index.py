@@ -0,0 +1,234 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""In-memory index of packages in the latest trees
+
+Each imported tree gets a bit position and each package (name, arch,
+version) maps to a bitset (int) of the trees containing it, so finding the
+trees containing packages of a build takes a bitwise AND per package instead
+of a DB query.
+
+The index covers only trees currently returned by the select_trees function
+(latest trees of the latest product versions). New and newly imported trees
+are added on refresh; lookups involving any other tree return None so the
+caller can query the DB instead.
+"""
+
+import logging
+import sys
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from product_listings_manager import models
+from product_listings_manager.metrics import (
+    TREE_INDEX_BYTES,
+    TREE_INDEX_PACKAGES,
+    TREE_INDEX_TREES,
+    observe_db_query,
+)
+from product_listings_manager.utils import chunks
+
+logger = logging.getLogger(__name__)
+
+# Number of trees to load packages for in a single query
+LOAD_CHUNK_SIZE = 20
+
+
+class _IndexedTree:
+    __slots__ = ("arch", "imported", "position")
+
+    def __init__(self, position: int, arch: str, imported: bool):
+        self.position = position
+        self.arch = arch
+        self.imported = imported
+
+
+class _State:
+    def __init__(self):
+        # tree ID -> indexed tree
+        self.trees: dict[int, _IndexedTree] = {}
+        # (name, arch) -> version -> bitset of tree positions
+        self.packages: dict[tuple[str, str], dict[str, int]] = {}
+        self.next_position = 0
+        # positions of trees no longer in the index
+        self.dropped = 0
+
+    def memory_size(self) -> int:
+        """Returns approximate memory footprint in bytes."""
+        size = sys.getsizeof(self.trees) + sys.getsizeof(self.packages)
+        size += sum(
+            sys.getsizeof(tree) + sys.getsizeof(tree_id)
+            for tree_id, tree in self.trees.items()
+        )
+        strings: set[str] = set()
+        for key, versions in self.packages.items():
+            size += sys.getsizeof(key) + sys.getsizeof(versions)
+            size += sum(sys.getsizeof(bits) for bits in versions.values())
+            strings.update(key)
+            strings.update(versions)
+        size += sum(sys.getsizeof(string) for string in strings)
+        return size
+
+
+@observe_db_query
+def _load_tree_packages(db, state: _State, trees: dict[int, _IndexedTree]):
+    """Sets bits of the given trees for packages they contain."""
+    tree_packages = models.TreePackages.__table__
+    packages = models.Packages.__table__
+    intern = sys.intern
+    # Lookups iterate the version dicts without the lock, so the changed ones
+    # are copied and replaced instead of modified in place
+    updated: dict[tuple[str, str], dict[str, int]] = {}
+    for chunk in chunks(trees, LOAD_CHUNK_SIZE):
+        query = (
+            select(
+                tree_packages.c.trees_id,
+                packages.c.name,
+                packages.c.arch,
+                packages.c.version,
+            )
+            .join(packages, packages.c.id == tree_packages.c.packages_id)
+            .where(tree_packages.c.trees_id.in_(chunk))
+        )
+        for tree_id, name, arch, version in db.execute(query):
+            bit = 1 << trees[tree_id].position
+            key = (intern(name), intern(arch))
+            versions = updated.get(key)
+            if versions is None:
+                versions = updated[key] = dict(state.packages.get(key, {}))
+            version = intern(version)
+            versions[version] = versions.get(version, 0) | bit
+    state.packages.update(updated)
+
+
+@observe_db_query
+def _select_tree_info(db, tree_ids) -> dict[int, tuple[str, bool]]:
+    trees = models.Trees.__table__
+    info = {}
+    for chunk in chunks(tree_ids):
+        query = select(trees.c.id, trees.c.arch, trees.c.imported).where(
+            trees.c.id.in_(chunk)
+        )
+        for tree_id, arch, imported in db.execute(query):
+            info[tree_id] = (arch, imported == 1)
+    return info
+
+
+class TreeIndex:
+    def __init__(self, select_trees, refresh_interval: float = 60.0):
+        """
+        The select_trees(db) function returns IDs of the trees to index.
+        """
+        self.select_trees = select_trees
+        self.refresh_interval = refresh_interval
+        self.state: _State | None = None
+        self.refreshed_at: float | None = None
+        self.lock = threading.Lock()
+
+    def _update(self, db, state: _State):
+        info = _select_tree_info(db, self.select_trees(db))
+
+        for tree_id in list(state.trees):
+            if tree_id not in info:
+                del state.trees[tree_id]
+                state.dropped += 1
+
+        load = {}
+        for tree_id, (arch, imported) in info.items():
+            tree = state.trees.get(tree_id)
+            if tree is None:
+                tree = _IndexedTree(state.next_position, arch, imported)
+                state.next_position += 1
+            elif tree.imported or not imported:
+                continue
+            if imported:
+                load[tree_id] = _IndexedTree(tree.position, arch, imported)
+            else:
+                state.trees[tree_id] = tree
+
+        # Bits are set before the trees are published for lookups
+        _load_tree_packages(db, state, load)
+        state.trees.update(load)
+
+    def refresh(self, db):
+        """Adds new and newly imported trees and removes the old ones."""
+        state = self.state
+        if state is not None:
+            self._update(db, state)
+        if state is None or state.dropped > len(state.trees):
+            # Full rebuild to free positions of the removed trees
+            state = _State()
+            self._update(db, state)
+            self.state = state
+        self.refreshed_at = time.monotonic()
+
+        size = state.memory_size()
+        TREE_INDEX_TREES.set(len(state.trees))
+        TREE_INDEX_PACKAGES.set(len(state.packages))
+        TREE_INDEX_BYTES.set(size)
+        logger.info(
+            "Tree index: %d trees, %d package names/arches, %d bytes",
+            len(state.trees),
+            len(state.packages),
+            size,
+        )
+
+    def _is_stale(self) -> bool:
+        return (
+            self.refreshed_at is None
+            or time.monotonic() - self.refreshed_at >= self.refresh_interval
+        )
+
+    def _refresh_if_needed(self, db):
+        if not self._is_stale():
+            return
+
+        # Other requests use the current index while one refreshes it
+        if not self.lock.acquire(blocking=self.state is None):
+            return
+        try:
+            if self._is_stale():
+                self.refresh(db)
+        except SQLAlchemyError as e:
+            logger.warning("Tree index refresh failed: %s", e)
+        finally:
+            self.lock.release()
+
+    def find_packages(self, db, trees, names_by_arch, version=None):
+        """
+        Returns (package arch, tree arch, package name) of the packages found
+        in the trees (see products.dest_get_archs), or None if a tree is not
+        in the index.
+        """
+        self._refresh_if_needed(db)
+        state = self.state
+        if state is None:
+            return None
+
+        indexed = []
+        for tree_id in sorted(trees):
+            tree = state.trees.get(tree_id)
+            if tree is None:
+                return None
+            if tree.imported:
+                indexed.append(tree)
+
+        ret = []
+        for src_arch, names in names_by_arch.items():
+            for name in names:
+                versions = state.packages.get((name, src_arch))
+                if not versions:
+                    continue
+                if version:
+                    bits = versions.get(version, 0)
+                else:
+                    bits = 0
+                    for version_bits in versions.values():
+                        bits |= version_bits
+                ret.extend(
+                    (src_arch, tree.arch, name)
+                    for tree in indexed
+                    if bits >> tree.position & 1
+                )
+        return ret
@@ -1,5 +1,6 @@
 # SPDX-License-Identifier: GPL-2.0+
 import logging
+import os
 
 from fastapi import Request
 
@@ -14,3 +15,14 @@ def log_remote_call_error(request: Request, label, *args, **kwargs):
         args,
         kwargs,
     )
+
+
+def getenv_bool(name: str, default: str = "") -> bool:
+    return os.getenv(name, default).lower() in ("true", "1", "yes")
+
+
+def chunks(values, size: int = 500):
+    """Splits values to lists of at most the given size (for IN clauses)."""
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
@@ -5,9 +5,10 @@ from unittest.mock import patch
 
 from fastapi.testclient import TestClient
 from pytest import fixture, mark
+from sqlalchemy import event
 
 from product_listings_manager.app import create_app
-from product_listings_manager.models import BaseModel, SessionLocal
+from product_listings_manager.models import BaseModel, SessionLocal, engine
 
 LDAP_HOST = "ldap://ldap.example.com"
 LDAP_BASE = "ou=Groups,dc=example,dc=com"
@@ -77,6 +78,53 @@ def client(app):
     yield TestClient(app)
 
 
+@fixture
+def mock_koji_session():
+    with (
+        patch("product_listings_manager.products.koji.ClientSession") as mocked,
+        patch("product_listings_manager.products.koji.read_config", autospec=True),
+    ):
+        yield mocked()
+
+
+class QueryCounter:
+    """
+    Records SQL statements executed within the context.
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    def _before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(engine, "before_cursor_execute", self._before_cursor_execute)
+
+    def __len__(self):
+        return len(self.statements)
+
+    def assert_at_most(self, limit):
+        assert len(self) <= limit, (
+            f"Executed {len(self)} SQL statements, expected at most {limit}:\n"
+            + "\n".join(
+                f"{i}: {statement} {parameters!r}"
+                for i, (statement, parameters) in enumerate(self.statements, 1)
+            )
+        )
+
+
+@fixture
+def query_counter(db):
+    yield QueryCounter
+
+
 @fixture
 def gssapi_context(client):
     with patch(
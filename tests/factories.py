@@ -5,6 +5,7 @@ from factory.fuzzy import FuzzyNaiveDateTime, FuzzyText
 
 from product_listings_manager.models import (
     BaseModel,
+    ModuleOverrides,
     Modules,
     Overrides,
     Packages,
@@ -77,3 +78,13 @@ class OverridesFactory(BaseFactory):
     product_arch = FuzzyText()
     product = None
     include = False
+
+
+class ModuleOverridesFactory(BaseFactory):
+    class Meta:
+        model = ModuleOverrides
+
+    name = FuzzyText()
+    stream = FuzzyText()
+    product = None
+    product_arch = FuzzyText()
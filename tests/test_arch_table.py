@@ -0,0 +1,32 @@
+# SPDX-License-Identifier: GPL-2.0+
+from product_listings_manager.arch_table import ArchTable
+
+
+def test_bits():
+    arch_table = ArchTable()
+    assert arch_table.bit("x86_64") == 1
+    assert arch_table.bit("aarch64") == 2
+    assert arch_table.bit("x86_64") == 1
+    assert arch_table.archs == ["x86_64", "aarch64"]
+
+
+def test_expand():
+    arch_table = ArchTable()
+    mask = arch_table.bit("x86_64") | arch_table.bit("aarch64")
+    assert arch_table.expand(mask) == ["aarch64", "x86_64"]
+    assert arch_table.expand(0) == []
+    # Expanded lists are shared
+    assert arch_table.expand(mask) is arch_table.expand(mask)
+
+
+def test_expand_all():
+    arch_table = ArchTable()
+    x86_64 = arch_table.bit("x86_64")
+    i686 = arch_table.bit("i686")
+    assert arch_table.expand_all([x86_64 | i686]) == ["i686", "x86_64"]
+    # Variant listed twice lists the arches twice
+    assert arch_table.expand_all([x86_64, x86_64 | i686]) == [
+        "x86_64",
+        "i686",
+        "x86_64",
+    ]
@@ -0,0 +1,72 @@
+# SPDX-License-Identifier: GPL-2.0+
+from pytest import fixture, importorskip, mark
+
+from product_listings_manager import batch, products
+
+from .test_golden_listings import BUILD, SCENARIOS, rpm
+
+NVR = "bash-5.1.8-9.el9"
+
+
+@fixture
+def koji_build(mock_koji_session):
+    mock_koji_session.getBuild.return_value = BUILD
+    yield mock_koji_session
+
+
+def builds(rpms):
+    """Returns RPMs of the scenario build and of builds sharing packages."""
+    debuginfo = [x for x in rpms if "debuginfo" in x["name"]]
+    return {
+        NVR: rpms,
+        "bash-doc": [x for x in rpms if x["name"] == "bash-doc"],
+        "debuginfo": debuginfo,
+        "src": [x for x in rpms if x["arch"] == "src"],
+        "other": [rpm("zsh", "src"), rpm("zsh", "x86_64"), *debuginfo],
+        "matched": [
+            {**x, "version": "5.0.0"} if x["name"] == "bash-devel-debuginfo" else x
+            for x in rpms
+        ],
+    }
+
+
+@mark.parametrize("name", SCENARIOS)
+def test_same_as_single_builds(db, koji_build, name):
+    importorskip("numpy")
+    label, rpms = SCENARIOS[name]()
+    rpms_by_build = builds(rpms)
+
+    assert batch.product_listings(db, label, rpms_by_build) == {
+        build: products.get_rpms_product_listings(db, label, build_rpms)
+        for build, build_rpms in rpms_by_build.items()
+    }
+
+
+def test_without_numpy(db, koji_build, monkeypatch):
+    label, rpms = SCENARIOS["overrides"]()
+    expected = products.get_rpms_product_listings(db, label, rpms)
+    monkeypatch.setattr(batch, "numpy", None)
+    assert batch.product_listings(db, label, {NVR: rpms}) == {NVR: expected}
+
+
+def test_too_many_arches(db, koji_build, monkeypatch):
+    importorskip("numpy")
+    label, rpms = SCENARIOS["basic"]()
+    expected = products.get_rpms_product_listings(db, label, rpms)
+    monkeypatch.setattr(batch, "MAX_ARCHES", 2)
+    assert batch.product_listings(db, label, {NVR: rpms}) == {NVR: expected}
+
+
+def test_query_counts(db, koji_build, query_counter):
+    importorskip("numpy")
+    label, rpms = SCENARIOS["basic"]()
+    rpms_by_build = {
+        f"build-{i}": [{**x, "nvr": f"{x['nvr']}.{i}"} for x in rpms] for i in range(20)
+    }
+
+    with query_counter() as queries:
+        listings = batch.product_listings(db, label, rpms_by_build)
+    assert len(listings) == 20
+    # product info, match versions, source-only flag, trees and overrides of 2
+    # variants and the packages
+    queries.assert_at_most(8)
@@ -0,0 +1,90 @@
+# SPDX-License-Identifier: GPL-2.0+
+from pytest import fixture
+
+from product_listings_manager import metrics, products
+from product_listings_manager.bloom import BloomFilter, PackageNameFilters
+
+from .test_dest_cache import NVR, dest_statements
+from .test_query_counts import BUILD, LABEL, create_product
+
+
+def count(metric, *labels):
+    if labels:
+        metric = metric.labels(*labels)
+    return metric._value.get()
+
+
+@fixture
+def koji_build(mock_koji_session):
+    mock_koji_session.getBuild.return_value = BUILD
+    yield mock_koji_session
+
+
+@fixture
+def composedb(db, koji_build):
+    koji_build.listRPMs.return_value = create_product(2, 2, debuginfo=True)
+    yield db
+
+
+@fixture
+def name_filters(monkeypatch):
+    name_filters = PackageNameFilters(0.01)
+    monkeypatch.setattr(products, "PACKAGE_NAME_FILTERS", name_filters)
+    yield name_filters
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(1000, 0.01)
+    names = [f"package-{i}" for i in range(1000)]
+    for name in names:
+        bloom.add(name)
+
+    assert all(name in bloom for name in names)
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_empty_bloom_filter():
+    bloom = BloomFilter(0, 0.01)
+    assert "bash" not in bloom
+
+
+def test_skipped_query(composedb, name_filters, koji_build, query_counter):
+    products.get_product_listings(composedb, LABEL, NVR)
+    koji_build.listRPMs.return_value = [
+        {**rpm, "name": rpm["name"].replace("bash", "zsh")}
+        for rpm in koji_build.listRPMs.return_value
+    ]
+    absent = count(metrics.BLOOM_FILTER_CHECKS, "absent")
+    skipped = count(metrics.BLOOM_FILTER_SKIPPED_QUERIES)
+
+    with query_counter() as queries:
+        listings = products.get_product_listings(composedb, LABEL, "zsh-5.1.8-9.el9")
+    assert not dest_statements(queries)
+    assert listings == {}
+    # 2 variants, src and 6 packages for each of 2 arches
+    assert count(metrics.BLOOM_FILTER_CHECKS, "absent") - absent == 2 * 13
+    assert count(metrics.BLOOM_FILTER_SKIPPED_QUERIES) - skipped == 2
+
+
+def test_same_listings(composedb, name_filters):
+    possible = count(metrics.BLOOM_FILTER_CHECKS, "possible")
+    listings = products.get_product_listings(composedb, LABEL, NVR)
+
+    products.PACKAGE_NAME_FILTERS = None
+    assert products.get_product_listings(composedb, LABEL, NVR) == listings
+    assert count(metrics.BLOOM_FILTER_CHECKS, "possible") > possible
+
+
+def test_false_positives(composedb, name_filters, koji_build, monkeypatch):
+    monkeypatch.setattr(BloomFilter, "__contains__", lambda self, key: True)
+    koji_build.listRPMs.return_value = [
+        {**rpm, "name": rpm["name"].replace("bash-devel", "zsh")}
+        for rpm in koji_build.listRPMs.return_value
+    ]
+    false_positives = count(metrics.BLOOM_FILTER_FALSE_POSITIVES)
+
+    listings = products.get_product_listings(composedb, LABEL, NVR)
+    assert "bash-devel-5.1.8-9.el9" not in listings["Variant0"]
+    # zsh and zsh-debuginfo for each of 2 arches in 2 variants
+    assert count(metrics.BLOOM_FILTER_FALSE_POSITIVES) - false_positives == 2 * 4
@@ -0,0 +1,74 @@
+# SPDX-License-Identifier: GPL-2.0+
+from pytest import raises
+from sqlalchemy import text
+
+from product_listings_manager.cli import main
+from product_listings_manager.explain import explain
+
+from .factories import PackagesFactory
+
+
+class TestCheckIndexes:
+    def test_all_indexes_present(self, db, capsys):
+        assert main(["check-indexes"]) == 0
+        out = capsys.readouterr().out
+        assert "MISSING" not in out
+        assert (
+            "OK      packages (name, arch, version): ix_packages_name_arch_version"
+            in out
+        )
+        assert "0 of 11 recommended indexes missing" in out
+
+    def test_index_covered_by_other_index(self, db, capsys):
+        db.execute(text("DROP INDEX ix_overrides_product"))
+        db.execute(text("CREATE INDEX ix_other ON overrides (product, name)"))
+        assert main(["check-indexes"]) == 0
+        assert "OK      overrides (product): ix_other" in capsys.readouterr().out
+
+    def test_missing_index(self, db, capsys):
+        PackagesFactory(name="bash", arch="x86_64", version="5.1.8")
+        db.commit()
+        db.execute(text("DROP INDEX ix_packages_name_arch_version"))
+        assert main(["check-indexes"]) == 1
+        out = capsys.readouterr().out
+        assert (
+            "MISSING packages (name, arch, version): CREATE INDEX"
+            " ix_packages_name_arch_version ON packages (name, arch, version);\n"
+            "    estimated rows: 1\n"
+            "    sequential scan: packages\n"
+            "    | SCAN packages\n"
+        ) in out
+        assert "1 of 11 recommended indexes missing" in out
+
+    def test_missing_index_empty_table(self, db, capsys):
+        db.execute(text("DROP INDEX ix_modules_name_stream"))
+        assert main(["check-indexes"]) == 1
+        out = capsys.readouterr().out
+        assert "    estimated rows: 0\n" in out
+        assert "SCAN" not in out
+
+    def test_command_required(self, capsys):
+        with raises(SystemExit):
+            main([])
+
+
+class TestExplain:
+    def test_explain_index_search(self, db):
+        plan = explain(
+            db,
+            "SELECT id FROM packages WHERE name = :name AND arch = :arch",
+            {"name": "bash", "arch": "x86_64"},
+        )
+        assert plan.sequential_scans == []
+        assert plan.cost is None
+        assert "ix_packages_name_arch_version" in plan.plan
+
+    def test_explain_join(self, db):
+        plan = explain(
+            db,
+            "SELECT trees.arch FROM trees"
+            " JOIN tree_packages ON tree_packages.trees_id = trees.id"
+            " WHERE tree_packages.packages_id = 1",
+        )
+        assert plan.sequential_scans == []
+        assert len(plan.plan.splitlines()) == 2
@@ -0,0 +1,136 @@
+# SPDX-License-Identifier: GPL-2.0+
+import datetime
+
+from pytest import fixture
+
+from product_listings_manager import metrics, models, products
+from product_listings_manager.dest_cache import DestArchCache
+
+from .factories import PackagesFactory, TreesFactory
+from .test_query_counts import BUILD, LABEL, MODULE, create_product
+
+NVR = "bash-5.1.8-9.el9"
+NEWER = datetime.datetime.now() + datetime.timedelta(days=1)
+
+
+def lookups(result):
+    return metrics.DEST_ARCH_CACHE_LOOKUPS.labels(result)._value.get()
+
+
+@fixture
+def koji_build(mock_koji_session):
+    mock_koji_session.getBuild.return_value = {
+        **BUILD,
+        "extra": {"typeinfo": {"module": MODULE}},
+    }
+    yield mock_koji_session
+
+
+@fixture
+def composedb(db, koji_build):
+    koji_build.listRPMs.return_value = create_product(2, 2, debuginfo=True)
+    yield db
+
+
+@fixture
+def cache(monkeypatch):
+    cache = DestArchCache(1000)
+    monkeypatch.setattr(products, "DEST_ARCH_CACHE", cache)
+    yield cache
+
+
+def dest_statements(queries):
+    return [
+        statement for statement, _ in queries.statements if "tree_packages" in statement
+    ]
+
+
+def test_cache_hits(composedb, cache, query_counter):
+    expected = products.get_product_listings(composedb, LABEL, NVR)
+    hits = lookups("hit")
+
+    with query_counter() as queries:
+        assert products.get_product_listings(composedb, LABEL, NVR) == expected
+    assert not dest_statements(queries)
+    # 2 variants, src and 6 packages for each of 2 arches
+    assert lookups("hit") - hits == 2 * 13
+
+
+def test_rebuild(composedb, cache, koji_build, query_counter):
+    products.get_product_listings(composedb, LABEL, NVR)
+    rpms = [
+        {**rpm, "nvr": rpm["nvr"].replace("9.el9", "10.el9")}
+        for rpm in koji_build.listRPMs.return_value
+    ]
+    koji_build.listRPMs.return_value = rpms
+
+    with query_counter() as queries:
+        listings = products.get_product_listings(composedb, LABEL, "bash-5.1.8-10.el9")
+    assert not dest_statements(queries)
+    assert listings["Variant0"]["bash-5.1.8-10.el9"] == {
+        "src": ["aarch64", "x86_64"],
+        "x86_64": ["x86_64"],
+        "aarch64": ["aarch64"],
+    }
+
+
+def test_new_tree(composedb, cache):
+    products.get_product_listings(composedb, LABEL, NVR)
+    session = TreesFactory._meta.sqlalchemy_session
+    variant = session.query(models.Products).filter_by(variant="Variant0").one()
+    package = PackagesFactory(name="bash", arch="x86_64", version=BUILD["version"])
+    tree = TreesFactory(arch="s390x", date=NEWER)
+    tree.products.append(variant)
+    tree.packages.append(package)
+    session.commit()
+
+    listings = products.get_product_listings(composedb, LABEL, NVR)
+    assert listings["Variant0"][NVR]["x86_64"] == ["s390x", "x86_64"]
+    assert listings["Variant1"][NVR]["x86_64"] == ["x86_64"]
+
+
+def test_newly_imported_tree(composedb, cache):
+    session = TreesFactory._meta.sqlalchemy_session
+    variant = session.query(models.Products).filter_by(variant="Variant0").one()
+    package = PackagesFactory(name="bash", arch="x86_64", version=BUILD["version"])
+    tree = TreesFactory(arch="s390x", date=NEWER, imported=0)
+    tree.products.append(variant)
+    tree.packages.append(package)
+    session.commit()
+
+    listings = products.get_product_listings(composedb, LABEL, NVR)
+    assert listings["Variant0"][NVR]["x86_64"] == ["x86_64"]
+
+    tree.imported = 1
+    session.commit()
+    listings = products.get_product_listings(composedb, LABEL, NVR)
+    assert listings["Variant0"][NVR]["x86_64"] == ["s390x", "x86_64"]
+
+
+def test_matched_version(composedb, cache, koji_build):
+    products.get_product_listings(composedb, LABEL, NVR)
+    session = TreesFactory._meta.sqlalchemy_session
+    session.add(models.MatchVersions(name="bash-doc-debuginfo", product=LABEL))
+    session.commit()
+    # Version of the last RPM is matched, no package of that version
+    koji_build.listRPMs.return_value = [
+        {**rpm, "version": "4.4.19"} if rpm["name"] == "bash-doc-debuginfo" else rpm
+        for rpm in koji_build.listRPMs.return_value
+    ]
+
+    assert products.get_product_listings(composedb, LABEL, NVR) == {}
+
+
+def test_eviction():
+    cache = DestArchCache(2)
+    fingerprint = (1, 2)
+    cache.store(fingerprint, {("x86_64", "bash"): ["x86_64"]}, None)
+    cache.store(fingerprint, {("x86_64", "bash-devel"): []}, None)
+    cache.lookup(fingerprint, {"x86_64": ["bash"]}, None)
+    cache.store(fingerprint, {("x86_64", "bash-doc"): ["x86_64"]}, None)
+
+    found, missing = cache.lookup(
+        fingerprint, {"x86_64": ["bash", "bash-devel", "bash-doc"]}, None
+    )
+    assert found == {"x86_64": {"bash": ("x86_64",), "bash-doc": ("x86_64",)}}
+    assert missing == {"x86_64": ["bash-devel"]}
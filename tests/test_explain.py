@@ -0,0 +1,135 @@
+# SPDX-License-Identifier: GPL-2.0+
+from unittest.mock import Mock, patch
+
+from pytest import fixture
+
+from product_listings_manager import models, products
+from product_listings_manager.cli import main
+from product_listings_manager.explain import explain_call
+from product_listings_manager.schemas import Permission
+
+from .conftest import auth_headers
+from .test_query_counts import BUILD, LABEL, MODULE, create_product
+
+ADMIN_PERMISSION = Permission(name="admin", users=["test_user"], queries=["*"])
+
+
+@fixture
+def koji_build(mock_koji_session):
+    mock_koji_session.getBuild.return_value = {
+        **BUILD,
+        "extra": {"typeinfo": {"module": MODULE}},
+    }
+    yield mock_koji_session
+
+
+@fixture
+def admin_client(auth_client):
+    with patch(
+        "product_listings_manager.rest_api_v1.parse_permissions",
+        return_value=[ADMIN_PERMISSION],
+    ):
+        yield auth_client
+
+
+class TestExplainCall:
+    def test_statements_grouped_by_query(self, db, koji_build):
+        koji_build.listRPMs.return_value = create_product(2, 2, debuginfo=True)
+        listings, queries = explain_call(
+            db, products.get_product_listings, LABEL, "bash-5.1.8-9.el9"
+        )
+        assert listings == products.get_product_listings(db, LABEL, "bash-5.1.8-9.el9")
+        assert set(queries) == {
+            "get_product_info",
+            "get_match_versions",
+            "precalc_treelist",
+            "get_overrides",
+            "dest_get_archs",
+            "get_srconly_flag",
+        }
+        assert len(queries["precalc_treelist"]) == 2
+        for statements in queries.values():
+            for statement in statements:
+                assert statement.statement.startswith("SELECT")
+                assert statement.duration_ms >= 0
+                assert statement.plan is not None
+                assert statement.plan.plan
+
+    def test_no_capture_outside_call(self, db, query_counter):
+        explain_call(db, products.get_product_labels)
+        with query_counter() as queries:
+            products.get_product_labels(db)
+        assert len(queries) == 1
+
+
+class TestExplainEndpoint:
+    def test_product_listings(self, admin_client, koji_build):
+        koji_build.listRPMs.return_value = create_product(1, 2, debuginfo=False)
+        r = admin_client.get(
+            f"/api/v1.0/explain/product-listings/{LABEL}/bash-5.1.8-9.el9",
+            headers=auth_headers(),
+        )
+        assert r.status_code == 200, r.text
+        data = r.json()
+        assert data["database"] == "sqlite"
+        assert list(data["listings"]) == ["Variant0"]
+        statement = data["queries"]["precalc_treelist"][0]
+        assert statement["statement"].startswith("SELECT")
+        assert statement["parameters"] == [LABEL, "9.4.0", "Variant0"]
+        assert statement["plan"]
+        assert statement["cost"] is None
+
+    def test_module_product_listings(self, admin_client, koji_build):
+        create_product(1, 2, debuginfo=False)
+        r = admin_client.get(
+            f"/api/v1.0/explain/module-product-listings/{LABEL}/ruby-3.1-1.el9",
+            headers=auth_headers(),
+        )
+        assert r.status_code == 200, r.text
+        data = r.json()
+        assert data["listings"] == {"Variant0": ["aarch64", "x86_64"]}
+        assert "get_module_trees" in data["queries"]
+
+    def test_primary_database(self, admin_client, koji_build, monkeypatch):
+        koji_build.listRPMs.return_value = create_product(1, 2, debuginfo=False)
+        snapshot = Mock(session=Mock(side_effect=AssertionError("snapshot used")))
+        monkeypatch.setattr(models, "snapshot", snapshot)
+        r = admin_client.get(
+            f"/api/v1.0/explain/product-listings/{LABEL}/bash-5.1.8-9.el9",
+            headers=auth_headers(),
+        )
+        assert r.status_code == 200, r.text
+        assert list(r.json()["listings"]) == ["Variant0"]
+
+    def test_not_found(self, admin_client, koji_build):
+        r = admin_client.get(
+            "/api/v1.0/explain/product-listings/RHEL-missing/bash-5.1.8-9.el9",
+            headers=auth_headers(),
+        )
+        assert r.status_code == 404, r.text
+
+    def test_unauthorized(self, auth_client, koji_build):
+        r = auth_client.get(
+            f"/api/v1.0/explain/product-listings/{LABEL}/bash-5.1.8-9.el9",
+            headers=auth_headers(),
+        )
+        assert r.status_code == 403, r.text
+        assert r.json() == {
+            "message": "User test_user is not authorized to explain queries"
+        }
+
+
+class TestExplainCommand:
+    def test_product_listings(self, db, koji_build, capsys):
+        koji_build.listRPMs.return_value = create_product(1, 1, debuginfo=False)
+        assert main(["explain", "product-listings", LABEL, "bash-5.1.8-9.el9"]) == 0
+        out = capsys.readouterr().out
+        assert "== precalc_treelist: 1 statements, " in out
+        assert "-- " in out
+        assert "   | " in out
+
+    def test_not_found(self, db, koji_build, capsys):
+        assert (
+            main(["explain", "module-product-listings", LABEL, "ruby-3.1-1.el9"]) == 1
+        )
+        assert capsys.readouterr().err.startswith("Error: Could not find a product")
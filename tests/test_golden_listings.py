@@ -0,0 +1,317 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""
+Golden outputs of product listings for composedbs exercising overrides,
+debuginfo fallback, match versions, source-only variants, compat and not
+imported trees and duplicate variants, and of module product listings.
+
+The serialized listings must stay byte-identical. After an intended change of
+the output, regenerate the files with:
+
+    PLM_UPDATE_GOLDEN=1 python -m pytest tests/test_golden_listings.py
+"""
+
+import datetime
+import json
+import os
+from pathlib import Path
+
+from pytest import fixture, importorskip, mark
+
+from product_listings_manager import batch, models, products
+from product_listings_manager.bloom import PackageNameFilters
+from product_listings_manager.dest_cache import DestArchCache
+from product_listings_manager.parallel import VariantExecutor
+from product_listings_manager.tree_index import TreeIndex
+
+from .factories import (
+    ModuleOverridesFactory,
+    ModulesFactory,
+    OverridesFactory,
+    PackagesFactory,
+    ProductsFactory,
+    TreesFactory,
+)
+
+GOLDEN_DIR = Path(__file__).parent / "golden" / "product_listings"
+LABEL = "RHEL-9.4.0"
+VERSION = "9.4.0"
+BUILD = {
+    "id": 1,
+    "package_name": "bash",
+    "version": "5.1.8",
+    "release": "9.el9",
+}
+NVR = "bash-5.1.8-9.el9"
+NAMES = [
+    "bash",
+    "bash-devel",
+    "bash-debuginfo",
+    "bash-debugsource",
+    "bash-devel-debuginfo",
+]
+OLD = datetime.datetime(2020, 1, 1)
+
+
+def rpm(name, arch):
+    return {
+        "name": name,
+        "arch": arch,
+        "nvr": f"{name}-{BUILD['version']}-{BUILD['release']}",
+        "version": BUILD["version"],
+    }
+
+
+def build_rpms(arches, names=NAMES):
+    rpms = [rpm("bash", "src"), rpm("bash-doc", "noarch")]
+    rpms.extend(rpm(name, arch) for arch in arches for name in names)
+    return rpms
+
+
+def product(variant, label=LABEL, version=VERSION, **kwargs):
+    return ProductsFactory(label=label, version=version, variant=variant, **kwargs)
+
+
+def tree(
+    products_, arch, names, version=BUILD["version"], pkg_arch=None, noarch=True, **kw
+):
+    """
+    Creates a tree containing packages of the given names and the source (and
+    noarch) package.
+    """
+    packages = [
+        PackagesFactory(name=name, arch=pkg_arch or arch, version=version)
+        for name in names
+    ]
+    packages.append(PackagesFactory(name="bash", arch="src", version=version))
+    if noarch:
+        packages.append(
+            PackagesFactory(name="bash-doc", arch="noarch", version=version)
+        )
+    t = TreesFactory(arch=arch, **kw)
+    t.products.extend(products_)
+    t.packages.extend(packages)
+    return t
+
+
+def commit():
+    TreesFactory._meta.sqlalchemy_session.commit()
+
+
+def scenario_basic():
+    for variant in ("AppStream", "BaseOS"):
+        p = product(variant)
+        for arch in ("x86_64", "aarch64", "s390x"):
+            tree([p], arch, NAMES)
+    commit()
+    return LABEL, build_rpms(["x86_64", "aarch64", "s390x"])
+
+
+def scenario_compat_trees():
+    p = product("BaseOS")
+    tree([p], "x86_64", NAMES)
+    tree([p], "x86_64", ["bash", "bash-debuginfo"], pkg_arch="i686", compatlayer=True)
+    tree([p], "ppc64le", NAMES)
+    commit()
+    return LABEL, build_rpms(["x86_64", "i686", "ppc64le"])
+
+
+def scenario_debuginfo_fallback():
+    for variant in ("AppStream", "BaseOS"):
+        p = product(variant)
+        # Debuginfo packages are missing in the trees
+        tree([p], "x86_64", ["bash", "bash-devel"])
+        tree([p], "aarch64", ["bash"])
+    commit()
+    return LABEL, build_rpms(["x86_64", "aarch64", "ppc64le"])
+
+
+def scenario_overrides():
+    appstream = product("AppStream")
+    baseos = product("BaseOS")
+    for p in (appstream, baseos):
+        tree([p], "x86_64", NAMES)
+        tree([p], "aarch64", ["bash"])
+    session = TreesFactory._meta.sqlalchemy_session
+    for name, pkg_arch, product_arch, include, p in (
+        ("bash-devel", "x86_64", "i686", True, appstream),
+        ("bash-devel", "x86_64", "x86_64", False, appstream),
+        ("bash", "aarch64", "aarch64", False, baseos),
+        ("bash-devel", "aarch64", "aarch64", True, baseos),
+        ("bash-devel-debuginfo", "aarch64", "s390x", True, baseos),
+        ("bash-missing", "x86_64", "x86_64", True, baseos),
+    ):
+        OverridesFactory(
+            name=name,
+            pkg_arch=pkg_arch,
+            product_arch=product_arch,
+            include=include,
+            product=p.id,
+        )
+    session.commit()
+    return LABEL, build_rpms(["x86_64", "aarch64"])
+
+
+def scenario_match_versions():
+    p = product("BaseOS")
+    tree([p], "x86_64", NAMES, date=OLD)
+    tree([p], "aarch64", NAMES, version="5.0.0")
+    OverridesFactory(
+        name="bash",
+        pkg_arch="x86_64",
+        product_arch="ppc64le",
+        include=True,
+        product=p.id,
+    )
+    session = TreesFactory._meta.sqlalchemy_session
+    session.add(models.MatchVersions(name="bash-devel-debuginfo", product=LABEL))
+    session.commit()
+    return LABEL, build_rpms(["x86_64", "aarch64"])
+
+
+def scenario_source_only():
+    label = "RHEL-9.4.0-SRC"
+    for label_, allow_source_only in ((LABEL, False), (label, True)):
+        for variant in ("AppStream", "BaseOS"):
+            p = product(variant, label=label_, allow_source_only=allow_source_only)
+            if variant == "AppStream":
+                tree([p], "x86_64", NAMES)
+            else:
+                tree([p], "x86_64", [], noarch=False)
+    commit()
+    return label, build_rpms(["x86_64"])
+
+
+def scenario_source_only_dropped():
+    for variant in ("AppStream", "BaseOS"):
+        p = product(variant)
+        if variant == "AppStream":
+            tree([p], "x86_64", NAMES)
+        else:
+            tree([p], "x86_64", [], noarch=False)
+    commit()
+    return LABEL, build_rpms(["x86_64"])
+
+
+def scenario_trees():
+    p = product("BaseOS")
+    # Latest tree is not imported, older tree is superseded
+    tree([p], "x86_64", NAMES, imported=0)
+    tree([p], "x86_64", NAMES, date=OLD)
+    tree([p], "aarch64", ["bash"], date=OLD)
+    tree([p], "aarch64", NAMES)
+    product("BaseOS", version="9.3.0")
+    commit()
+    return LABEL, build_rpms(["x86_64", "aarch64"])
+
+
+def scenario_variants():
+    # Duplicate variant rows and a product without variant
+    first = product("BaseOS")
+    second = product("BaseOS")
+    no_variant = product(None)
+    tree([first], "x86_64", NAMES)
+    tree([second], "aarch64", NAMES)
+    tree([no_variant], "s390x", ["bash"])
+    commit()
+    return LABEL, build_rpms(["x86_64", "aarch64", "s390x"])
+
+
+SCENARIOS = {
+    name.removeprefix("scenario_"): func
+    for name, func in globals().items()
+    if name.startswith("scenario_")
+}
+
+
+@fixture
+def koji_build(mock_koji_session):
+    mock_koji_session.getBuild.return_value = BUILD
+    yield mock_koji_session
+
+
+@mark.parametrize(
+    "engine",
+    (
+        "db",
+        "tree_index",
+        "dest_arch_cache",
+        "bloom_filter",
+        "batch",
+        "sql",
+        "parallel",
+    ),
+)
+@mark.parametrize("name", SCENARIOS)
+def test_product_listings(db, koji_build, monkeypatch, name, engine):
+    label, rpms = SCENARIOS[name]()
+    koji_build.listRPMs.return_value = rpms
+    if engine == "tree_index":
+        index = TreeIndex(products.latest_tree_ids, refresh_interval=3600)
+        monkeypatch.setattr(products, "TREE_INDEX", index)
+    elif engine == "dest_arch_cache":
+        monkeypatch.setattr(products, "DEST_ARCH_CACHE", DestArchCache(1000))
+        # Listings from the cache are the same
+        products.get_product_listings(db, label, NVR)
+    elif engine == "bloom_filter":
+        monkeypatch.setattr(products, "PACKAGE_NAME_FILTERS", PackageNameFilters(0.01))
+    elif engine == "sql":
+        monkeypatch.setattr(products, "LISTINGS_ENGINE", "sql")
+    elif engine == "parallel":
+        monkeypatch.setattr(products, "VARIANT_EXECUTOR", VariantExecutor(4, 2))
+    if engine == "batch":
+        importorskip("numpy")
+        listings = batch.product_listings(db, label, {NVR: rpms})[NVR]
+    else:
+        listings = products.get_product_listings(db, label, NVR)
+    output = json.dumps(listings, indent=2) + "\n"
+
+    path = GOLDEN_DIR / f"{name}.json"
+    if os.getenv("PLM_UPDATE_GOLDEN"):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(output)
+    assert output == path.read_text()
+
+
+def module_tree(products_, arch, modules, **kw):
+    t = TreesFactory(arch=arch, **kw)
+    t.products.extend(products_)
+    t.modules.extend(modules)
+    return t
+
+
+def test_module_product_listings(db, koji_build):
+    koji_build.getBuild.return_value = {
+        **BUILD,
+        "extra": {"typeinfo": {"module": {"name": "ruby", "stream": "3.1"}}},
+    }
+    ruby = ModulesFactory(name="ruby", stream="3.1", version="1")
+    ruby_2 = ModulesFactory(name="ruby", stream="3.1", version="2")
+    other = ModulesFactory(name="ruby", stream="3.3")
+    appstream = product("AppStream")
+    crb = product("CRB")
+    baseos = product("BaseOS")
+    duplicate = product("AppStream")
+    no_variant = product(None)
+    module_tree([appstream], "x86_64", [ruby, ruby_2])
+    module_tree([appstream], "x86_64", [], compatlayer=True)
+    module_tree([appstream], "aarch64", [ruby], date=OLD)
+    module_tree([appstream], "aarch64", [other])
+    module_tree([duplicate], "s390x", [ruby])
+    module_tree([crb], "ppc64le", [other])
+    module_tree([baseos], "x86_64", [other], date=OLD)
+    module_tree([no_variant], "i686", [ruby])
+    # Product of an older version
+    module_tree([product("CRB", version="9.3.0")], "x86_64", [ruby])
+    for arch, p in (("ppc64le", crb), ("s390x", crb), ("ppc64le", appstream)):
+        ModuleOverridesFactory(
+            name="ruby", stream="3.1", product=p.id, product_arch=arch
+        )
+    commit()
+
+    listings = products.get_module_product_listings(db, LABEL, "ruby-3.1-1.el9")
+    output = json.dumps(listings, indent=2) + "\n"
+
+    path = GOLDEN_DIR.parent / "module_product_listings.json"
+    if os.getenv("PLM_UPDATE_GOLDEN"):
+        path.write_text(output)
+    assert output == path.read_text()
@@ -0,0 +1,46 @@
+# SPDX-License-Identifier: GPL-2.0+
+from pytest import fixture, mark
+from sqlalchemy.dialects import postgresql
+
+from product_listings_manager import products
+from product_listings_manager.listings_query import product_listings_statement
+
+from .test_batch import builds
+from .test_golden_listings import BUILD, SCENARIOS
+
+
+@fixture
+def koji_build(mock_koji_session):
+    mock_koji_session.getBuild.return_value = BUILD
+    yield mock_koji_session
+
+
+@mark.parametrize("name", SCENARIOS)
+def test_same_as_python_engine(db, koji_build, monkeypatch, name):
+    label, rpms = SCENARIOS[name]()
+    for build, build_rpms in builds(rpms).items():
+        monkeypatch.setattr(products, "LISTINGS_ENGINE", "python")
+        expected = products.get_rpms_product_listings(db, label, build_rpms)
+        monkeypatch.setattr(products, "LISTINGS_ENGINE", "sql")
+        listings = products.get_rpms_product_listings(db, label, build_rpms)
+        assert listings == expected, build
+
+
+def test_query_count(db, koji_build, monkeypatch, query_counter):
+    label, rpms = SCENARIOS["overrides"]()
+    monkeypatch.setattr(products, "LISTINGS_ENGINE", "sql")
+
+    with query_counter() as queries:
+        products.get_rpms_product_listings(db, label, rpms)
+    # product info, source-only flag and the listings
+    queries.assert_at_most(3)
+
+
+def test_postgresql_arrays():
+    rpms = [(0, "bash-5.1.8-9.el9", "bash", "src", 0)]
+    query = product_listings_statement(
+        "postgresql", "RHEL-9.4.0", "9.4.0", rpms, {"name": "bash", "version": "5"}
+    )
+    compiled = query.compile(dialect=postgresql.dialect())
+    assert "unnest(%(rpm_idx)s::INTEGER[], %(rpm_nvr)s::VARCHAR[]" in str(compiled)
+    assert compiled.params["rpm_name"] == ["bash"]
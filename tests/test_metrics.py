@@ -0,0 +1,83 @@
+# SPDX-License-Identifier: GPL-2.0+
+from unittest.mock import patch
+
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import create_engine, text
+
+from product_listings_manager.metrics import generate_metrics, instrument_engine
+
+from .factories import ProductsFactory
+
+
+def get_samples(client):
+    r = client.get("/metrics")
+    assert r.status_code == 200, r.text
+    assert r.headers["content-type"].startswith("text/plain")
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(r.text)
+        for sample in family.samples
+    }
+
+
+class TestMetrics:
+    def test_request_metrics(self, client):
+        ProductsFactory(label="RHEL-8", version="8.0", variant="BaseOS")
+        before = get_samples(client)
+        r = client.get("/api/v1.0/product-info/RHEL-8")
+        assert r.status_code == 200, r.text
+        after = get_samples(client)
+
+        route = "/api/v1.0/product-info/{label}"
+        key = (
+            "plm_http_requests_total",
+            (("method", "GET"), ("route", route), ("status", "200")),
+        )
+        assert after[key] - before.get(key, 0) == 1
+
+        key = (
+            "plm_http_request_duration_seconds_count",
+            (("method", "GET"), ("route", route)),
+        )
+        assert after[key] - before.get(key, 0) == 1
+
+        key = ("plm_db_statements_total", (("query", "get_product_info"),))
+        assert after[key] - before.get(key, 0) == 1
+
+        key = ("plm_db_query_duration_seconds_count", (("query", "get_product_info"),))
+        assert after[key] - before.get(key, 0) == 1
+
+    @patch("product_listings_manager.rest_api_v1.products.get_koji_session")
+    def test_koji_metrics(self, mock_koji, client):
+        key = ("plm_koji_call_duration_seconds_count", (("method", "getAPIVersion"),))
+        before = get_samples(client)
+        client.get("/api/v1.0/health")
+        after = get_samples(client)
+        assert after[key] - before.get(key, 0) == 1
+
+    def test_pool_metrics(self, client):
+        samples = get_samples(client)
+        assert samples[("plm_db_pool_connections", ())] >= 0
+        assert samples[("plm_db_pool_checked_out_connections", ())] >= 0
+
+    def test_statement_subscribers(self):
+        engine = create_engine("sqlite://")
+        statements = []
+        instrument_engine(
+            engine,
+            statement_subscribers=[
+                lambda statement, parameters, duration: statements.append(
+                    (statement, parameters, duration >= 0)
+                )
+            ],
+        )
+        with engine.connect() as conn:
+            conn.execute(text("SELECT :value"), {"value": 1})
+        assert statements == [("SELECT ?", (1,), True)]
+        engine.dispose()
+
+    def test_multiprocess(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+        data, content_type = generate_metrics()
+        assert content_type.startswith("text/plain")
+        assert data == b""
@@ -0,0 +1,113 @@
+# SPDX-License-Identifier: GPL-2.0+
+import threading
+import time
+
+from pytest import raises
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+from product_listings_manager import models
+from product_listings_manager.parallel import VariantExecutor
+from product_listings_manager.server_timing import RequestTimings, current_timings
+
+
+def test_results_in_order(db):
+    executor = VariantExecutor(4, 4)
+
+    def evaluate(worker_db, item):
+        time.sleep(0.01 * (5 - item))
+        return item * 10
+
+    assert executor.map(db, evaluate, range(5)) == [0, 10, 20, 30, 40]
+
+
+def test_limit_per_request(db):
+    executor = VariantExecutor(8, 3)
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def evaluate(worker_db, item):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return item
+
+    assert executor.map(db, evaluate, range(10)) == list(range(10))
+    assert running[1] == 3
+
+    running[1] = 0
+    executor.map(db, evaluate, range(10), max_workers=2)
+    assert running[1] == 2
+
+
+def test_sequential(db):
+    executor = VariantExecutor(4, 4)
+    sessions = executor.map(db, lambda worker_db, item: worker_db, [1], max_workers=1)
+    assert sessions == [db]
+
+
+def test_worker_sessions(db):
+    executor = VariantExecutor(4, 4)
+    models.set_statement_timeout(db, 5)
+
+    def evaluate(worker_db, item):
+        return (
+            worker_db is not db,
+            worker_db.get_bind() is db.get_bind(),
+            worker_db.info["statement_timeout"],
+        )
+
+    assert executor.map(db, evaluate, range(3)) == [(True, True, 5)] * 3
+
+
+def test_request_connection_released(tmp_path):
+    executor = VariantExecutor(4, 4)
+    engine = create_engine(
+        f"sqlite:///{tmp_path}/plm.db",
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=5,
+    )
+
+    def evaluate(worker_db, item):
+        return worker_db.execute(text("SELECT :item"), {"item": item}).scalar()
+
+    with Session(bind=engine) as db:
+        assert db.execute(text("SELECT 1")).scalar() == 1
+        assert executor.map(db, evaluate, range(3)) == [0, 1, 2]
+    engine.dispose()
+
+
+def test_request_context(db):
+    executor = VariantExecutor(4, 4)
+    timings = RequestTimings()
+    token = current_timings.set(timings)
+    try:
+        results = executor.map(
+            db, lambda worker_db, item: current_timings.get(), range(3)
+        )
+    finally:
+        current_timings.reset(token)
+    assert results == [timings] * 3
+
+
+def test_error(db):
+    executor = VariantExecutor(1, 2)
+    started = []
+
+    def evaluate(worker_db, item):
+        started.append(item)
+        if item == 0:
+            raise ValueError("failed")
+        time.sleep(0.05)
+        return item
+
+    with raises(ValueError, match="failed"):
+        executor.map(db, evaluate, range(5))
+    assert 4 not in started
@@ -0,0 +1,116 @@
+# SPDX-License-Identifier: GPL-2.0+
+from unittest.mock import Mock
+
+from pytest import fixture, raises
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from product_listings_manager import metrics, models
+
+from .test_query_counts import LABEL, create_product
+
+
+def sample_value(name):
+    return metrics.REGISTRY.get_sample_value(name) or 0
+
+
+@fixture
+def pool_engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path}/pool.db",
+        poolclass=metrics.InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.01,
+    )
+    yield engine
+    engine.dispose()
+
+
+def test_pool_options_defaults(monkeypatch):
+    for name in (
+        "PLM_DB_POOL_SIZE",
+        "PLM_DB_MAX_OVERFLOW",
+        "PLM_DB_POOL_TIMEOUT",
+        "PLM_DB_POOL_RECYCLE",
+        "PLM_DB_POOL_PRE_PING",
+    ):
+        monkeypatch.delenv(name, raising=False)
+    assert models.pool_options() == {
+        "poolclass": metrics.InstrumentedQueuePool,
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30.0,
+        "pool_recycle": -1,
+        "pool_pre_ping": False,
+    }
+
+
+def test_pool_options_from_env(monkeypatch):
+    monkeypatch.setenv("PLM_DB_POOL_SIZE", "40")
+    monkeypatch.setenv("PLM_DB_MAX_OVERFLOW", "0")
+    monkeypatch.setenv("PLM_DB_POOL_TIMEOUT", "2.5")
+    monkeypatch.setenv("PLM_DB_POOL_RECYCLE", "3600")
+    monkeypatch.setenv("PLM_DB_POOL_PRE_PING", "true")
+    options = models.pool_options()
+    assert options["pool_size"] == 40
+    assert options["max_overflow"] == 0
+    assert options["pool_timeout"] == 2.5
+    assert options["pool_recycle"] == 3600
+    assert options["pool_pre_ping"] is True
+
+
+def test_pool_checkout_wait_observed(pool_engine):
+    count = sample_value("plm_db_pool_checkout_wait_seconds_count")
+    with pool_engine.connect():
+        pass
+    assert sample_value("plm_db_pool_checkout_wait_seconds_count") == count + 1
+
+
+def test_pool_timeout_counted(pool_engine):
+    timeouts = sample_value("plm_db_pool_timeouts_total")
+    with pool_engine.connect(), raises(PoolTimeoutError):
+        pool_engine.connect()
+    assert sample_value("plm_db_pool_timeouts_total") == timeouts + 1
+
+
+class TestStatementTimeout:
+    def connection(self, dialect):
+        connection = Mock()
+        connection.dialect.name = dialect
+        return connection
+
+    def test_set_local_on_postgresql(self):
+        session = Mock(info={"statement_timeout": 1.5})
+        connection = self.connection("postgresql")
+        models._set_local_statement_timeout(session, None, connection)
+        connection.exec_driver_sql.assert_called_once_with(
+            "SET LOCAL statement_timeout = 1500"
+        )
+
+    def test_not_set_without_timeout(self):
+        session = Mock(info={})
+        connection = self.connection("postgresql")
+        models._set_local_statement_timeout(session, None, connection)
+        connection.exec_driver_sql.assert_not_called()
+
+    def test_not_set_on_other_dialects(self):
+        session = Mock(info={"statement_timeout": 1.5})
+        connection = self.connection("sqlite")
+        models._set_local_statement_timeout(session, None, connection)
+        connection.exec_driver_sql.assert_not_called()
+
+    def test_listings_timeout(self, client, monkeypatch):
+        sessions = []
+        set_statement_timeout = models.set_statement_timeout
+
+        def record(db, timeout):
+            sessions.append(timeout)
+            set_statement_timeout(db, timeout)
+
+        monkeypatch.setattr(models, "LISTINGS_STATEMENT_TIMEOUT", 10.0)
+        monkeypatch.setattr(models, "set_statement_timeout", record)
+        create_product(1, 1, debuginfo=False)
+        r = client.get(f"/api/v1.0/product-info/{LABEL}")
+        assert r.status_code == 200, r.text
+        assert sessions == [10.0]
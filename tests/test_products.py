@@ -1,12 +1,10 @@
+import threading
+from collections import namedtuple
 from unittest.mock import patch
 
 import pytest
 
 from product_listings_manager.models import MatchVersions as MatchVersionsModel
-from product_listings_manager.models import (
-    ModuleOverrides as ModuleOverridesModel,
-)
-from product_listings_manager.models import Overrides as OverridesModel
 from product_listings_manager.models import Products as ProductsModel
 from product_listings_manager.models import Trees as TreesModel
 from product_listings_manager.products import (
@@ -23,6 +21,10 @@ from product_listings_manager.products import (
     score,
 )
 
+TreeRow = namedtuple(
+    "TreeRow", ["variant", "id", "arch", "compatlayer", "name", "stream"]
+)
+
 
 @pytest.fixture
 def db():
@@ -87,23 +89,10 @@ class TestProduct:
     def test_get_overrides(self, db):
         label = "RHEL-7"
         version = "7.5"
-        mock_join = db.query(OverridesModel).join.return_value
-        mock_join.filter.return_value.all.return_value = [
-            OverridesModel(
-                name="fake",
-                pkg_arch="src",
-                product_arch="x86_64",
-                include=True,
-            ),
-            OverridesModel(
-                name="fake", pkg_arch="src", product_arch="ppc64", include=True
-            ),
-            OverridesModel(
-                name="fake",
-                pkg_arch="x86_64",
-                product_arch="x86_64",
-                include=False,
-            ),
+        db.execute.return_value = [
+            ("fake", "src", "x86_64", True),
+            ("fake", "src", "ppc64", True),
+            ("fake", "x86_64", "x86_64", False),
         ]
         assert get_overrides(db, label, version) == {
             "fake": {
@@ -125,12 +114,10 @@ class TestProduct:
         pass
 
     def test_precalc_treelist(self, db):
-        mock_join = db.query(TreesModel).join.return_value
-        mock_join_order_by = mock_join.order_by.return_value
-        mock_join_order_by.filter.return_value.filter.return_value.all.return_value = [
-            TreesModel(id=3, arch="x86_64"),
-            TreesModel(id=2, arch="x86_64"),
-            TreesModel(id=1, arch="ppc64"),
+        db.execute.return_value = [
+            TreesModel(id=3, arch="x86_64", compatlayer=False),
+            TreesModel(id=2, arch="x86_64", compatlayer=False),
+            TreesModel(id=1, arch="ppc64", compatlayer=False),
         ]
         assert sorted(precalc_treelist(db, "fake-product", "7.5", "Server")) == sorted(
             [1, 3]
@@ -142,30 +129,14 @@ class TestProduct:
     def test_get_module_overrides(self, db):
         module_name = "perl"
         module_stream = "5.24"
-        mock_join = db.query(ModuleOverridesModel).join.return_value
-        mock_join.filter.return_value.filter.return_value.all.return_value = [
-            ModuleOverridesModel(
-                name=module_name,
-                stream=module_stream,
-                product=1,
-                product_arch="x86_64",
-            ),
-            ModuleOverridesModel(
-                name=module_name,
-                stream=module_stream,
-                product=1,
-                product_arch="ppc64le",
-            ),
-            ModuleOverridesModel(
-                name=module_name,
-                stream=module_stream,
-                product=1,
-                product_arch="s390x",
-            ),
+        rows = [
+            ("AppStream", module_name, module_stream, "x86_64"),
+            ("AppStream", module_name, module_stream, "ppc64le"),
+            ("CRB", module_name, module_stream, "s390x"),
         ]
-        assert get_module_overrides(
-            db, "fake", "fake", module_name, module_stream, "fake"
-        ) == ["x86_64", "ppc64le", "s390x"]
+        db.execute.return_value.all.return_value = rows
+        modules = [(module_name, module_stream)]
+        assert get_module_overrides(db, "fake", "fake", modules) == rows
 
     def test_get_product_labels(self, db):
         mock_with_entities = db.query(ProductsModel).with_entities.return_value
@@ -188,6 +159,49 @@ class TestGetProductListings:
             get_product_listings(db, "fake-label", build)
         assert f"Could not find any RPMs for build: {build}" == str(excinfo.value)
 
+    @patch("product_listings_manager.products.get_rpms_product_listings")
+    @patch("product_listings_manager.products.load_product_context")
+    @patch("product_listings_manager.products.get_koji_session")
+    def test_koji_and_db_overlap(
+        self, mock_get_koji_session, mock_load, mock_get_rpms_listings, db
+    ):
+        loading = threading.Event()
+        fetching = threading.Event()
+        rpms = [{"name": "bash", "arch": "x86_64", "nvr": "bash-1-1"}]
+
+        def list_rpms(**kwargs):
+            fetching.set()
+            assert loading.wait(5)
+            return rpms
+
+        def load(db, label):
+            loading.set()
+            assert fetching.wait(5)
+            return "product"
+
+        mock_get_koji_session.return_value.listRPMs.side_effect = list_rpms
+        mock_load.side_effect = load
+        mock_get_rpms_listings.return_value = {}
+
+        assert get_product_listings(db, "fake-label", "bash-1-1") == {}
+        mock_get_rpms_listings.assert_called_once_with(
+            db, "fake-label", rpms, None, "product"
+        )
+
+    @patch("product_listings_manager.products.load_product_context")
+    @patch("product_listings_manager.products.get_koji_session")
+    def test_build_error_first(self, mock_get_koji_session, mock_load, db):
+        mock_get_koji_session.return_value.listRPMs.return_value = []
+        mock_load.side_effect = ProductListingsNotFoundError("unknown label")
+        with pytest.raises(ProductListingsNotFoundError) as excinfo:
+            get_product_listings(db, "fake-label", "bash-1-1")
+        assert "Could not find any RPMs for build: bash-1-1" == str(excinfo.value)
+
+        mock_get_koji_session.return_value.listRPMs.return_value = [{}]
+        with pytest.raises(ProductListingsNotFoundError) as excinfo:
+            get_product_listings(db, "fake-label", "bash-1-1")
+        assert "unknown label" == str(excinfo.value)
+
 
 class TestGetModuleProductListings:
     @patch("product_listings_manager.products.get_build")
@@ -200,19 +214,24 @@ class TestGetModuleProductListings:
 
     @patch("product_listings_manager.products.get_module_overrides")
     @patch("product_listings_manager.products.get_product_info")
-    @patch("product_listings_manager.products.precalc_treelist")
+    @patch("product_listings_manager.products.get_module_trees")
     @patch("product_listings_manager.products.get_build")
     def test_get_module_product_listings(
         self,
         mock_get_build,
-        mock_precalc_treelist,
+        mock_get_module_trees,
         mock_get_product_info,
         mock_get_module_overrides,
         db,
     ):
-        mock_with_entities = db.query(TreesModel).with_entities.return_value
-        mock_with_entities.join.return_value.filter.return_value.filter.return_value = [
-            ("x86_64",),
+        mock_get_build.return_value = {
+            "extra": {"typeinfo": {"module": {"name": "perl", "stream": "5.24"}}}
+        }
+        mock_get_module_trees.return_value = [
+            TreeRow("AppStream-8.0", 1, "x86_64", False, "perl", "5.24"),
+            TreeRow("AppStream-8.0", 2, "x86_64", False, None, None),
+            TreeRow("AppStream-8.0", 3, "aarch64", False, None, None),
+            TreeRow("BaseOS-8.0", 4, "s390x", False, "perl", "5.24"),
         ]
         nvr = "perl-5.24-8010020190529084201.3af8e029"
         mock_get_product_info.return_value = ("8.0", ["AppStream-8.0"])
@@ -224,7 +243,16 @@ class TestGetModuleProductListings:
         }
 
         # test with overrides
-        mock_get_module_overrides.return_value = ["ppc64le"]
+        mock_get_module_overrides.return_value = [
+            ("AppStream-8.0", "perl", "5.24", "ppc64le"),
+            ("BaseOS-8.0", "perl", "5.24", "i686"),
+        ]
         assert get_module_product_listings(db, "fake-label", nvr) == {
             "AppStream-8.0": ["ppc64le", "x86_64"]
         }
+
+        # product without variant gets trees and overrides of all variants
+        mock_get_product_info.return_value = ("8.0", [None])
+        assert get_module_product_listings(db, "fake-label", nvr) == {
+            "": ["i686", "ppc64le", "s390x", "x86_64"]
+        }
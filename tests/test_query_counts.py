@@ -0,0 +1,152 @@
+# SPDX-License-Identifier: GPL-2.0+
+"""
+Upper bounds for number of SQL statements executed per API call.
+
+If a bound is exceeded, the assertion message lists all the statements.
+"""
+
+import datetime
+
+from pytest import fixture, mark
+
+from product_listings_manager import models, products
+
+from .factories import ModulesFactory, PackagesFactory, ProductsFactory, TreesFactory
+
+LABEL = "RHEL-9.4.0"
+VERSION = "9.4.0"
+ARCHES = ["x86_64", "aarch64", "ppc64le", "s390x", "i686", "noarch"]
+BUILD = {
+    "id": 1,
+    "package_name": "bash",
+    "version": "5.1.8",
+    "release": "9.el9",
+}
+PACKAGE_NAMES = ["bash", "bash-devel", "bash-doc"]
+MODULE = {"name": "ruby", "stream": "3.1"}
+
+
+def create_product(variant_count, arch_count, debuginfo):
+    """
+    Creates variants of a product with a tree per arch, each containing
+    packages from BUILD.
+    """
+    arches = ARCHES[:arch_count]
+    names = PACKAGE_NAMES + (
+        [f"{name}-debuginfo" for name in PACKAGE_NAMES] if debuginfo else []
+    )
+    packages = {
+        arch: [
+            PackagesFactory(name=name, arch=arch, version=BUILD["version"])
+            for name in names
+        ]
+        for arch in arches
+    }
+    src = PackagesFactory(name="bash", arch="src", version=BUILD["version"])
+    module = ModulesFactory(**MODULE)
+
+    for i in range(variant_count):
+        p = ProductsFactory(label=LABEL, version=VERSION, variant=f"Variant{i}")
+        for arch in arches:
+            t = TreesFactory(arch=arch)
+            t.products.append(p)
+            t.packages.extend(packages[arch])
+            t.packages.append(src)
+            t.modules.append(module)
+    TreesFactory._meta.sqlalchemy_session.commit()
+
+    nvr = "{package_name}-{version}-{release}".format(**BUILD)
+    rpms = [{"name": "bash", "arch": "src", "nvr": nvr, "version": BUILD["version"]}]
+    rpms.extend(
+        {
+            "name": name,
+            "arch": arch,
+            "nvr": f"{name}-{BUILD['version']}-{BUILD['release']}",
+            "version": BUILD["version"],
+        }
+        for arch in arches
+        for name in names
+    )
+    return rpms
+
+
+@fixture
+def koji_build(mock_koji_session):
+    mock_koji_session.getBuild.return_value = {
+        **BUILD,
+        "extra": {"typeinfo": {"module": MODULE}},
+    }
+    yield mock_koji_session
+
+
+class TestQueryCounts:
+    @mark.parametrize(
+        ("variants", "arches", "debuginfo", "limit"),
+        (
+            (1, 1, False, 6),
+            (1, 1, True, 6),
+            (1, 6, False, 6),
+            (1, 6, True, 6),
+            (20, 1, False, 63),
+            (20, 1, True, 63),
+            (20, 6, False, 63),
+            (20, 6, True, 63),
+        ),
+    )
+    def test_product_listings(
+        self, client, koji_build, query_counter, variants, arches, debuginfo, limit
+    ):
+        koji_build.listRPMs.return_value = create_product(variants, arches, debuginfo)
+        with query_counter() as queries:
+            r = client.get(f"/api/v1.0/product-listings/{LABEL}/bash-5.1.8-9.el9")
+        assert r.status_code == 200, r.text
+        assert len(r.json()) == variants
+        queries.assert_at_most(limit)
+
+    @mark.parametrize(
+        ("variants", "limit"),
+        (
+            (1, 3),
+            (20, 3),
+        ),
+    )
+    def test_module_product_listings(
+        self, client, koji_build, query_counter, variants, limit
+    ):
+        create_product(variants, 6, debuginfo=False)
+        with query_counter() as queries:
+            r = client.get(f"/api/v1.0/module-product-listings/{LABEL}/ruby-3.1-1.el9")
+        assert r.status_code == 200, r.text
+        assert len(r.json()) == variants
+        queries.assert_at_most(limit)
+
+    @mark.parametrize("variants", (1, 20))
+    def test_product_info(self, client, query_counter, variants):
+        create_product(variants, 1, debuginfo=False)
+        with query_counter() as queries:
+            r = client.get(f"/api/v1.0/product-info/{LABEL}")
+        assert r.status_code == 200, r.text
+        queries.assert_at_most(1)
+
+    def test_product_labels(self, client, query_counter):
+        create_product(20, 1, debuginfo=False)
+        with query_counter() as queries:
+            r = client.get("/api/v1.0/product-labels")
+        assert r.status_code == 200, r.text
+        queries.assert_at_most(1)
+
+
+def test_module_trees_latest_only(db):
+    create_product(2, 2, debuginfo=False)
+    session = TreesFactory._meta.sqlalchemy_session
+    variant = session.query(models.Products).filter_by(variant="Variant0").one()
+    old_tree = TreesFactory(arch="x86_64", date=datetime.datetime(2000, 1, 1))
+    old_tree.products.append(variant)
+    module = ModulesFactory(**MODULE)
+    old_tree.modules.append(module)
+    session.commit()
+
+    rows = products.get_module_trees(db, LABEL, VERSION, [tuple(MODULE.values())])
+    assert old_tree.id not in {row.id for row in rows}
+    assert len(rows) == 4
+    assert {(row.name, row.stream) for row in rows} == {("ruby", "3.1")}
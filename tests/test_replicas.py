@@ -0,0 +1,175 @@
+# SPDX-License-Identifier: GPL-2.0+
+import threading
+from unittest.mock import patch
+
+from pytest import fixture, mark
+from sqlalchemy.exc import OperationalError
+
+from product_listings_manager import models
+from product_listings_manager.db_queries import is_read_only
+from product_listings_manager.models import BaseModel, Products, create_db_engine
+from product_listings_manager.replicas import ReplicaSet
+
+from .conftest import auth_headers
+from .factories import ProductsFactory
+
+
+@fixture
+def replica_engine():
+    engine = create_db_engine("sqlite://")
+    BaseModel.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            Products.__table__.insert(),
+            {"id": 1, "label": "RHEL-replica", "version": "1", "variant": "Server"},
+        )
+    yield engine
+    engine.dispose()
+
+
+@fixture
+def replica_set(db, replica_engine, monkeypatch):
+    replica_set = ReplicaSet(models.SessionLocal, [replica_engine])
+    monkeypatch.setattr(models, "replica_set", replica_set)
+    yield replica_set
+
+
+def read_session_label(replica_set):
+    with replica_set.read_session() as session:
+        return session.query(Products.label).scalar()
+
+
+@mark.parametrize(
+    ("query", "expected"),
+    (
+        ("SELECT * FROM products", True),
+        ("  select label from products;", True),
+        ("SELECT * FROM products FOR UPDATE", False),
+        ("SELECT nextval('products_id_seq')", False),
+        ("SELECT pg_advisory_lock(1)", False),
+        ("SELECT set_config('search_path', 'x', false)", False),
+        ("SELECT public.write_products()", False),
+        ('SELECT "lo_unlink"(1)', False),
+        ("SELECT label FROM products WHERE id = ANY(:ids);", True),
+        ("SELECT count(*), max(version) FROM products", True),
+        ("SELECT * FROM products WHERE label IN (SELECT label FROM x)", True),
+        ("SELECT 'pg_advisory_lock(1); DELETE' FROM products", True),
+        ("SELECT * FROM products FOR NO KEY UPDATE", False),
+        ("SELECT 1 -- comment", False),
+        ("SELECT $$x$$", False),
+        ("SELECT * INTO new_products FROM products", False),
+        ("SELECT 1; DELETE FROM products", False),
+        ("DELETE FROM products", False),
+        ("WITH x AS (DELETE FROM products RETURNING *) SELECT * FROM x", False),
+    ),
+)
+def test_is_read_only(query, expected):
+    assert is_read_only(query) == expected
+
+
+class TestReplicaSet:
+    def test_no_replicas(self, db):
+        ProductsFactory(label="RHEL-primary")
+        replica_set = ReplicaSet(models.SessionLocal, [])
+        assert read_session_label(replica_set) == "RHEL-primary"
+
+    def test_replica(self, replica_set):
+        assert read_session_label(replica_set) == "RHEL-replica"
+
+    def test_round_robin(self, db, replica_engine):
+        other = create_db_engine("sqlite://")
+        replica_set = ReplicaSet(models.SessionLocal, [replica_engine, other])
+        binds = [replica_set.read_session().get_bind() for _ in range(4)]
+        assert binds == [replica_engine, other, replica_engine, other]
+
+    def test_lagging_replica(self, db, replica_set):
+        ProductsFactory(label="RHEL-primary")
+        with patch("product_listings_manager.replicas.measure_lag", return_value=31.0):
+            assert read_session_label(replica_set) == "RHEL-primary"
+
+    def test_lag_check_failed(self, db, replica_set):
+        ProductsFactory(label="RHEL-primary")
+        with patch(
+            "product_listings_manager.replicas.measure_lag",
+            side_effect=OperationalError("SELECT", {}, Exception("down")),
+        ):
+            assert read_session_label(replica_set) == "RHEL-primary"
+
+    def test_lag_check_cached(self, replica_set):
+        with patch(
+            "product_listings_manager.replicas.measure_lag", return_value=0.0
+        ) as measure_lag:
+            read_session_label(replica_set)
+            read_session_label(replica_set)
+        assert measure_lag.call_count == 1
+
+    def test_lag_check_in_progress(self, replica_set):
+        (replica,) = replica_set.replicas
+        checking = threading.Event()
+        done = threading.Event()
+
+        def slow_measure_lag(conn):
+            checking.set()
+            assert done.wait(5)
+            return 0.0
+
+        with patch(
+            "product_listings_manager.replicas.measure_lag",
+            side_effect=slow_measure_lag,
+        ) as measure_lag:
+            thread = threading.Thread(target=replica.check_lag)
+            thread.start()
+            assert checking.wait(5)
+            # Other callers get the cached lag without waiting for the check
+            assert replica.check_lag() is None
+            done.set()
+            thread.join()
+            assert replica.check_lag() == 0.0
+        assert measure_lag.call_count == 1
+
+
+class TestReadRouting:
+    def test_product_labels(self, client, replica_set):
+        ProductsFactory(label="RHEL-primary")
+        r = client.get("/api/v1.0/product-labels")
+        assert r.status_code == 200, r.text
+        assert r.json() == [{"label": "RHEL-replica"}]
+
+    def test_dbquery_select_on_replica(self, auth_client, replica_set):
+        ProductsFactory(label="RHEL-primary")
+        query = "SELECT label FROM products"
+        r = auth_client.post(
+            "/api/v1.0/dbquery", json={"query": query}, headers=auth_headers()
+        )
+        assert r.status_code == 200, r.text
+        assert r.json() == [{"label": "RHEL-replica"}]
+
+    def test_dbquery_select_with_trailing_semicolon_on_replica(
+        self, auth_client, replica_set
+    ):
+        ProductsFactory(label="RHEL-primary")
+        query = "SELECT lower(label) AS label FROM products;"
+        r = auth_client.post(
+            "/api/v1.0/dbquery", json={"query": query}, headers=auth_headers()
+        )
+        assert r.status_code == 200, r.text
+        assert r.json() == [{"label": "rhel-replica"}]
+
+    def test_dbquery_function_call_on_primary(self, auth_client, replica_set):
+        ProductsFactory(label="RHEL-primary")
+        query = "SELECT label, typeof(label) AS type FROM products"
+        r = auth_client.post(
+            "/api/v1.0/dbquery", json={"query": query}, headers=auth_headers()
+        )
+        assert r.status_code == 200, r.text
+        assert r.json() == [{"label": "RHEL-primary", "type": "text"}]
+
+    def test_dbquery_write_on_primary(self, auth_client, replica_set):
+        queries = [
+            "INSERT INTO products (id, label, version, variant)"
+            " VALUES (2, 'RHEL-new', '1', 'Server')",
+            "SELECT label FROM products",
+        ]
+        r = auth_client.post("/api/v1.0/dbquery", json=queries, headers=auth_headers())
+        assert r.status_code == 200, r.text
+        assert r.json() == [{"label": "RHEL-new"}]
@@ -0,0 +1,60 @@
+# SPDX-License-Identifier: GPL-2.0+
+import datetime
+import json
+from decimal import Decimal
+from unittest.mock import ANY
+
+from pydantic import TypeAdapter
+
+from product_listings_manager.responses import FastJSONResponse, dumps
+
+from .conftest import auth_headers
+from .factories import TreesFactory
+
+ROWS = [
+    {
+        "id": 1,
+        "name": "kernel",
+        "imported": True,
+        "date": datetime.datetime(2020, 1, 2, 3, 4, 5, 6),
+        "day": datetime.date(2020, 1, 2),
+        "utc": datetime.datetime(2020, 1, 2, tzinfo=datetime.timezone.utc),
+        "size": Decimal("1.50"),
+        "count": Decimal(3),
+        "empty": None,
+        "unicode": "žluťoučký kůň",
+    }
+]
+
+
+def test_dumps_matches_pydantic():
+    assert dumps(ROWS) == TypeAdapter(list[dict]).dump_json(ROWS)
+
+
+def test_fast_json_response():
+    content = {"AppStream": {"bash-5.1-1.el9": {"x86_64": ["x86_64"]}}}
+    response = FastJSONResponse(content)
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == content
+
+
+def test_dbquery_fast_json(auth_client, monkeypatch):
+    t = TreesFactory()
+    query = "SELECT id, date FROM trees"
+
+    r = auth_client.post("/api/v1.0/dbquery", json=query, headers=auth_headers())
+    assert r.status_code == 200, r.text
+    expected = r.content
+
+    monkeypatch.setenv("PLM_FAST_JSON", "1")
+    r = auth_client.post("/api/v1.0/dbquery", json=query, headers=auth_headers())
+    assert r.status_code == 200, r.text
+    assert r.content == expected
+    assert r.json() == [{"id": t.id, "date": ANY}]
+
+
+def test_product_labels_fast_json(client, monkeypatch):
+    monkeypatch.setenv("PLM_FAST_JSON", "true")
+    r = client.get("/api/v1.0/product-labels")
+    assert r.status_code == 200, r.text
+    assert r.json() == []
@@ -9,6 +9,7 @@ from product_listings_manager import products
 from product_listings_manager.models import get_db
 
 from .factories import (
+    ModuleOverridesFactory,
     ModulesFactory,
     OverridesFactory,
     PackagesFactory,
@@ -25,13 +26,6 @@ def exception_log(app):
         yield mocked
 
 
-@fixture
-def mock_koji_session():
-    with patch("product_listings_manager.products.koji.ClientSession") as mocked:
-        with patch("product_listings_manager.products.koji.read_config", autospec=True):
-            yield mocked()
-
-
 class TestIndex:
     def test_get_index(self, client):
         r = client.get("/api/v1.0/")
@@ -228,6 +222,18 @@ class TestProductListings:
             {},
         )
 
+    @patch("product_listings_manager.products.get_product_listings")
+    def test_parallelism(self, mock_getlistings, client):
+        mock_getlistings.return_value = {}
+        r = client.get(self.path, params={"parallelism": 2})
+        assert r.status_code == 200, r.text
+        mock_getlistings.assert_called_once_with(
+            ANY, self.product_label, self.nvr, max_workers=2
+        )
+
+        r = client.get(self.path, params={"parallelism": 0})
+        assert r.status_code == 422
+
     def test_get_product_listings_src_only(self, mock_koji_session, client):
         mock_koji_session.getBuild.return_value = {
             "id": 1,
@@ -393,6 +399,237 @@ class TestModuleProductListings:
         )
 
 
+def multicall_result(build, method="getBuild"):
+    """Returns the result of a call within a koji multicall."""
+    call = koji.VirtualCall(method, (), {})
+    if build is None:
+        call._result = {
+            "faultCode": koji.GenericError.faultCode,
+            "faultString": "No such build",
+        }
+    else:
+        call._result = [build]
+    return call
+
+
+class TestBulkProductListings:
+    product_label = "RHEL-9.4.0"
+    path = "/api/v1.0/product-listings"
+
+    @fixture
+    def koji_builds(self, mock_koji_session):
+        builds = {
+            "bash-5.1.8-9.el9": {"id": 1},
+            "zsh-5.8-9.el9": {"id": 2},
+            "empty-1.0-1.el9": {"id": 3},
+        }
+        rpms = {
+            1: [
+                {"name": "bash", "arch": "src", "nvr": "bash-5.1.8-9.el9"},
+                {"name": "bash", "arch": "x86_64", "nvr": "bash-5.1.8-9.el9"},
+            ],
+            2: [
+                {"name": "zsh", "arch": "src", "nvr": "zsh-5.8-9.el9"},
+                {"name": "zsh", "arch": "x86_64", "nvr": "zsh-5.8-9.el9"},
+            ],
+            3: [],
+        }
+        for build_rpms in rpms.values():
+            for rpm in build_rpms:
+                rpm["version"] = rpm["nvr"].split("-")[1]
+        multicall = mock_koji_session.multicall.return_value.__enter__.return_value
+        multicall.getBuild.side_effect = lambda nvr, strict: multicall_result(
+            builds.get(nvr)
+        )
+        multicall.listRPMs.side_effect = lambda **kwargs: multicall_result(
+            rpms[kwargs["buildID"]], "listRPMs"
+        )
+        mock_koji_session.getBuild.side_effect = lambda nvr, strict: builds[nvr]
+        mock_koji_session.listRPMs.side_effect = lambda **kwargs: rpms[
+            kwargs["buildID"]
+        ]
+        yield mock_koji_session
+
+    def test_bulk_product_listings(self, koji_builds, client, query_counter):
+        p = ProductsFactory(label=self.product_label, version="9.4.0", variant="BaseOS")
+        packages = [
+            PackagesFactory(name="bash", arch="src", version="5.1.8"),
+            PackagesFactory(name="bash", arch="x86_64", version="5.1.8"),
+        ]
+        for arch in ("x86_64", "aarch64"):
+            t = TreesFactory(arch=arch)
+            t.products.append(p)
+            t.packages.extend(packages)
+        TreesFactory._meta.sqlalchemy_session.commit()
+
+        nvrs = ["bash-5.1.8-9.el9", "zsh-5.8-9.el9"]
+        r = client.post(
+            self.path,
+            json={
+                "label": self.product_label,
+                "build_nvrs": [*nvrs, "empty-1.0-1.el9", "missing-1-1"],
+            },
+        )
+        assert r.status_code == 200, r.text
+        results = r.json()
+        assert results == {
+            "bash-5.1.8-9.el9": {
+                "listings": {
+                    "BaseOS": {
+                        "bash-5.1.8-9.el9": {
+                            "src": ["aarch64", "x86_64"],
+                            "x86_64": ["aarch64", "x86_64"],
+                        }
+                    }
+                }
+            },
+            "zsh-5.8-9.el9": {"listings": {}},
+            "empty-1.0-1.el9": {
+                "error": "Could not find any RPMs for build: empty-1.0-1.el9"
+            },
+            "missing-1-1": {"error": "No such build"},
+        }
+        assert koji_builds.multicall.call_count == 2
+
+        # Same as listings of single builds
+        for nvr in nvrs:
+            r = client.get(f"{self.path}/{self.product_label}/{nvr}")
+            assert r.json() == results[nvr]["listings"]
+
+    def test_product_not_found(self, koji_builds, client):
+        r = client.post(
+            self.path,
+            json={"label": self.product_label, "build_nvrs": ["bash-5.1.8-9.el9"]},
+        )
+        assert r.status_code == 404, r.text
+        assert r.json() == {
+            "message": f"Could not find a product with label: {self.product_label}"
+        }
+
+    def test_empty_list(self, client):
+        r = client.post(self.path, json={"label": self.product_label, "build_nvrs": []})
+        assert r.status_code == 422, r.text
+
+    def test_koji_error(self, mock_koji_session, exception_log, client):
+        mock_koji_session.multicall.side_effect = koji.GenericError("Koji is down")
+        r = client.post(
+            self.path,
+            json={"label": self.product_label, "build_nvrs": ["bash-5.1.8-9.el9"]},
+        )
+        assert r.status_code == 500
+        exception_log.assert_any_call(
+            "%s: callee=%r, args=%r, kwargs=%r",
+            "API call get_bulk_product_listings() failed",
+            ANY,
+            (self.product_label, ["bash-5.1.8-9.el9"]),
+            {},
+        )
+
+
+class TestBulkModuleProductListings:
+    product_label = "RHEL-8.0.0"
+    path = "/api/v1.0/module-product-listings"
+
+    @fixture
+    def koji_builds(self, mock_koji_session):
+        builds = {
+            "ruby-2.5-1": {
+                "extra": {"typeinfo": {"module": {"name": "ruby", "stream": "2.5"}}}
+            },
+            "ruby-2.5-2": {
+                "extra": {"typeinfo": {"module": {"name": "ruby", "stream": "2.5"}}}
+            },
+            "perl-5.24-1": {
+                "extra": {"typeinfo": {"module": {"name": "perl", "stream": "5.24"}}}
+            },
+            "nodejs-18-1": {
+                "extra": {"typeinfo": {"module": {"name": "nodejs", "stream": "18"}}}
+            },
+            "bash-5.1-1": {"extra": None},
+        }
+        multicall = mock_koji_session.multicall.return_value.__enter__.return_value
+        multicall.getBuild.side_effect = lambda nvr, strict: multicall_result(
+            builds.get(nvr)
+        )
+        mock_koji_session.getBuild.side_effect = lambda nvr, strict: builds[nvr]
+        yield mock_koji_session
+
+    def test_bulk_module_product_listings(self, koji_builds, client, query_counter):
+        variant = "AppStream-8.0.0"
+        p = ProductsFactory(label=self.product_label, version="8.0.0", variant=variant)
+        crb = ProductsFactory(label=self.product_label, version="8.0.0", variant="CRB")
+        ruby = ModulesFactory(name="ruby", stream="2.5")
+        perl = ModulesFactory(name="perl", stream="5.24")
+        t1 = TreesFactory(arch="x86_64")
+        t1.products.append(p)
+        t1.modules.extend([ruby, perl])
+        t2 = TreesFactory(arch="aarch64")
+        t2.products.append(p)
+        t2.modules.append(ruby)
+        TreesFactory._meta.sqlalchemy_session.commit()
+        ModuleOverridesFactory(
+            name="perl", stream="5.24", product=crb.id, product_arch="s390x"
+        )
+
+        nvrs = ["ruby-2.5-1", "perl-5.24-1", "ruby-2.5-2", "nodejs-18-1"]
+        with query_counter() as queries:
+            r = client.post(
+                self.path,
+                json={
+                    "label": self.product_label,
+                    "module_build_nvrs": [*nvrs, "bash-5.1-1", "missing-1-1"],
+                },
+            )
+        assert r.status_code == 200, r.text
+        results = r.json()
+        assert results == {
+            "ruby-2.5-1": {"listings": {variant: ["aarch64", "x86_64"]}},
+            "perl-5.24-1": {"listings": {variant: ["x86_64"], "CRB": ["s390x"]}},
+            "ruby-2.5-2": {"listings": {variant: ["aarch64", "x86_64"]}},
+            "nodejs-18-1": {"listings": {}},
+            "bash-5.1-1": {"error": "This is not a module build: bash-5.1-1"},
+            "missing-1-1": {"error": "No such build"},
+        }
+        queries.assert_at_most(3)
+        assert koji_builds.multicall.call_count == 1
+
+        # Same as listings of single modules
+        for nvr in nvrs:
+            r = client.get(f"{self.path}/{self.product_label}/{nvr}")
+            assert r.json() == results[nvr]["listings"]
+
+    def test_product_not_found(self, koji_builds, client):
+        r = client.post(
+            self.path,
+            json={"label": self.product_label, "module_build_nvrs": ["ruby-2.5-1"]},
+        )
+        assert r.status_code == 404, r.text
+        assert r.json() == {
+            "message": f"Could not find a product with label: {self.product_label}"
+        }
+
+    def test_empty_list(self, client):
+        r = client.post(
+            self.path, json={"label": self.product_label, "module_build_nvrs": []}
+        )
+        assert r.status_code == 422, r.text
+
+    def test_koji_error(self, mock_koji_session, exception_log, client):
+        mock_koji_session.multicall.side_effect = koji.GenericError("Koji is down")
+        r = client.post(
+            self.path,
+            json={"label": self.product_label, "module_build_nvrs": ["ruby-2.5-1"]},
+        )
+        assert r.status_code == 500
+        exception_log.assert_any_call(
+            "%s: callee=%r, args=%r, kwargs=%r",
+            "API call get_bulk_module_product_listings() failed",
+            ANY,
+            (self.product_label, ["ruby-2.5-1"]),
+            {},
+        )
+
+
 class TestLabels:
     @patch("product_listings_manager.products.get_product_labels")
     def test_unknown_error(self, mock_getlabels, exception_log, client):
@@ -412,4 +649,7 @@ class TestLabels:
         p2 = ProductsFactory()
         r = client.get("/api/v1.0/product-labels")
         assert r.status_code == 200
-        assert r.json() == [{"label": p1.label}, {"label": p2.label}]
+        # Order of the labels is not defined (DISTINCT without ORDER BY)
+        assert sorted(r.json(), key=lambda row: row["label"]) == sorted(
+            [{"label": p1.label}, {"label": p2.label}], key=lambda row: row["label"]
+        )
@@ -10,6 +10,7 @@ class TestRoot:
             "documentation_url": expected_docs,
             "api_reference": "http://testserver/redoc",
             "swagger_ui": "http://testserver/docs",
+            "metrics_url": "http://testserver/metrics",
         }
         assert r.status_code == 200
         assert r.json() == expected_json
@@ -0,0 +1,72 @@
+# SPDX-License-Identifier: GPL-2.0+
+import logging
+import re
+
+from fastapi.testclient import TestClient
+from pytest import fixture
+
+from product_listings_manager.app import create_app
+from product_listings_manager.server_timing import RequestTimings
+
+from .factories import ProductsFactory
+
+
+@fixture
+def timing_client(db, monkeypatch):
+    monkeypatch.setenv("PLM_SERVER_TIMING", "true")
+    monkeypatch.setenv("PLM_FAST_JSON", "true")
+    yield TestClient(create_app())
+
+
+def parse_server_timing(header):
+    metrics = {}
+    for metric in header.split(", "):
+        name, *params = metric.split(";")
+        metrics[name] = dict(param.split("=", 1) for param in params)
+    return metrics
+
+
+class TestServerTiming:
+    def test_server_timing_header(self, timing_client):
+        ProductsFactory(label="RHEL-8")
+        r = timing_client.get("/api/v1.0/product-labels")
+        assert r.status_code == 200, r.text
+        metrics = parse_server_timing(r.headers["Server-Timing"])
+        assert set(metrics) == {"db", "serialization", "total"}
+        assert metrics["db"]["desc"] == '"1 statements"'
+        for metric in metrics.values():
+            assert re.fullmatch(r"\d+\.\d", metric["dur"])
+
+    def test_disabled_by_default(self, client):
+        r = client.get("/api/v1.0/product-labels")
+        assert r.status_code == 200, r.text
+        assert "Server-Timing" not in r.headers
+
+    def test_slow_request_log(self, db, monkeypatch, caplog):
+        monkeypatch.setenv("PLM_SLOW_REQUEST_SECONDS", "0")
+        client = TestClient(create_app())
+        with caplog.at_level(logging.WARNING):
+            r = client.get("/api/v1.0/product-info/RHEL-8")
+        assert r.status_code == 404, r.text
+        assert "Server-Timing" not in r.headers
+        messages = [
+            record.message
+            for record in caplog.records
+            if record.name == "product_listings_manager.server_timing"
+        ]
+        assert len(messages) == 1
+        assert messages[0].startswith(
+            "Slow request: GET /api/v1.0/product-info/RHEL-8,"
+            " path_params={'label': 'RHEL-8'}: db;dur="
+        )
+
+
+def test_request_timings():
+    timings = RequestTimings()
+    timings.add("koji", 0.5)
+    timings.add("koji", 0.25)
+    timings.add("db", 0.1)
+    timings.db_statements = 3
+    assert timings.server_timing(1.0) == (
+        'koji;dur=750.0, db;dur=100.0;desc="3 statements", total;dur=1000.0'
+    )
@@ -0,0 +1,162 @@
+# SPDX-License-Identifier: GPL-2.0+
+import datetime
+
+from pytest import fixture, raises
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from product_listings_manager import models, products
+from product_listings_manager.cli import main
+from product_listings_manager.export import export_snapshot
+from product_listings_manager.snapshot import Snapshot
+
+from .factories import PackagesFactory, ProductsFactory, TreesFactory
+from .test_query_counts import BUILD, LABEL, MODULE, VERSION, create_product
+
+NVR = "bash-5.1.8-9.el9"
+
+
+def sorted_arches(listings):
+    # Order of the destination arches is not defined (no ORDER BY)
+    return {
+        variant: {
+            nvr: {arch: sorted(dest_arches) for arch, dest_arches in archs.items()}
+            for nvr, archs in nvrs.items()
+        }
+        for variant, nvrs in listings.items()
+    }
+
+
+@fixture
+def koji_build(mock_koji_session):
+    mock_koji_session.getBuild.return_value = {
+        **BUILD,
+        "extra": {"typeinfo": {"module": MODULE}},
+    }
+    yield mock_koji_session
+
+
+@fixture
+def composedb(db, koji_build):
+    koji_build.listRPMs.return_value = create_product(2, 2, debuginfo=True)
+
+    # Older tree of the latest version and a tree of an older version
+    old_package = PackagesFactory(name="bash", arch="x86_64", version="4.4.19")
+    session = TreesFactory._meta.sqlalchemy_session
+    latest = session.query(models.Products).filter_by(variant="Variant0").one()
+    old_tree = TreesFactory(arch="x86_64", date=datetime.datetime(2000, 1, 1))
+    old_tree.products.append(latest)
+    old_tree.packages.append(old_package)
+    old_product = ProductsFactory(label=LABEL, version="9.3.0", variant="Variant0")
+    tree = TreesFactory(arch="x86_64")
+    tree.products.append(old_product)
+    tree.packages.append(old_package)
+    session.commit()
+    yield db
+
+
+@fixture
+def snapshot_path(composedb, tmp_path):
+    path = str(tmp_path / "snapshot.db")
+    with models.engine.connect() as conn:
+        export_snapshot(conn, path)
+    yield path
+
+
+@fixture
+def snapshot(snapshot_path):
+    yield Snapshot(snapshot_path, models.create_snapshot_engine, check_interval=0)
+
+
+class TestExport:
+    def test_latest_trees_only(self, composedb, tmp_path):
+        path = str(tmp_path / "snapshot.db")
+        with models.engine.connect() as conn:
+            counts = export_snapshot(conn, path)
+        assert counts == {
+            "products": 2,
+            "trees": 4,
+            "tree_product_map": 4,
+            "tree_packages": 28,
+            "packages": 13,
+            "tree_modules": 4,
+            "modules": 1,
+            "overrides": 0,
+            "module_overrides": 0,
+            "match_versions": 0,
+        }
+        assert list(tmp_path.iterdir()) == [tmp_path / "snapshot.db"]
+
+    def test_labels(self, composedb, tmp_path):
+        path = str(tmp_path / "snapshot.db")
+        with models.engine.connect() as conn:
+            counts = export_snapshot(conn, path, labels=["RHEL-missing"])
+        assert counts["products"] == 0
+
+    def test_same_listings(self, composedb, snapshot):
+        with snapshot.session() as session:
+            assert products.get_product_info(
+                session, LABEL
+            ) == products.get_product_info(composedb, LABEL)
+            assert products.get_product_labels(session) == [{"label": LABEL}]
+            assert sorted_arches(
+                products.get_product_listings(session, LABEL, NVR)
+            ) == sorted_arches(products.get_product_listings(composedb, LABEL, NVR))
+            assert products.get_module_product_listings(
+                session, LABEL, "ruby-3.1-1.el9"
+            ) == products.get_module_product_listings(
+                composedb, LABEL, "ruby-3.1-1.el9"
+            )
+
+    def test_command(self, composedb, tmp_path, capsys):
+        path = str(tmp_path / "snapshot.db")
+        assert main(["export-snapshot", path, "--label", LABEL]) == 0
+        assert "products: 2 rows\n" in capsys.readouterr().out
+
+
+class TestSnapshot:
+    def test_read_only(self, snapshot):
+        with (
+            snapshot.session() as session,
+            raises(OperationalError, match="readonly"),
+        ):
+            session.execute(text("DELETE FROM products"))
+
+    def test_refresh(self, composedb, snapshot, snapshot_path):
+        old_session = snapshot.session()
+        assert products.get_product_info(old_session, LABEL)[0] == VERSION
+
+        ProductsFactory(label="RHEL-10.0.0", version="10.0.0", variant="BaseOS")
+        with models.engine.connect() as conn:
+            export_snapshot(conn, snapshot_path)
+
+        with snapshot.session() as session:
+            labels = products.get_product_labels(session)
+            assert sorted(label["label"] for label in labels) == [
+                "RHEL-10.0.0",
+                LABEL,
+            ]
+        # Session in progress keeps using the previous snapshot
+        assert products.get_product_labels(old_session) == [{"label": LABEL}]
+        old_session.close()
+
+    def test_refresh_interval(self, snapshot_path):
+        snapshot = Snapshot(snapshot_path, models.create_snapshot_engine)
+        snapshot.session().close()
+        engine = snapshot.engine
+        with models.engine.connect() as conn:
+            export_snapshot(conn, snapshot_path)
+        snapshot.session().close()
+        assert snapshot.engine is engine
+
+    def test_missing_file(self, tmp_path):
+        snapshot = Snapshot(str(tmp_path / "missing.db"), models.create_snapshot_engine)
+        with raises(FileNotFoundError):
+            snapshot.session()
+
+    def test_listing_endpoints(self, client, snapshot, monkeypatch):
+        monkeypatch.setattr(models, "snapshot", snapshot)
+        ProductsFactory(label="RHEL-not-exported")
+        r = client.get("/api/v1.0/product-labels")
+        assert r.status_code == 200, r.text
+        assert r.json() == [{"label": LABEL}]
@@ -0,0 +1,63 @@
+# SPDX-License-Identifier: GPL-2.0+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from product_listings_manager import models, products
+from product_listings_manager.sql_arrays import any_of
+
+from .factories import PackagesFactory
+
+
+def package_names(db, names):
+    query = select(models.Packages.name).where(any_of(models.Packages.name, names))
+    return sorted(db.execute(query).scalars())
+
+
+def test_any_of(db):
+    for name in ("bash", "bash-devel", "zsh"):
+        PackagesFactory(name=name)
+    db.commit()
+
+    assert package_names(db, ["bash", "zsh", "fish"]) == ["bash", "zsh"]
+    assert package_names(db, ["bash-devel"]) == ["bash-devel"]
+    assert package_names(db, []) == []
+
+
+def test_same_statement_for_any_length():
+    statements = {
+        str(
+            select(models.Packages.id)
+            .where(any_of(models.Packages.name, [f"package-{i}" for i in range(size)]))
+            .compile(dialect=postgresql.dialect())
+        )
+        for size in (1, 10, 1000)
+    }
+    assert len(statements) == 1
+
+
+def test_any_of_key(db):
+    for name in ("bash", "zsh"):
+        PackagesFactory(name=name)
+    db.commit()
+
+    query = select(models.Packages.name).where(
+        any_of(models.Packages.name, key="names")
+    )
+    assert db.execute(query, {"names": ["zsh", "fish"]}).scalars().all() == ["zsh"]
+    assert db.execute(query, {"names": ["bash"]}).scalars().all() == ["bash"]
+    assert "= ANY(%(names)s" in str(query.compile(dialect=postgresql.dialect()))
+
+
+def test_dest_archs_chunks(db, query_counter, monkeypatch):
+    monkeypatch.setattr(products, "MAX_ARRAY_SIZE", 10)
+    names = [f"package-{i}" for i in range(25)]
+    with query_counter() as queries:
+        products._query_dest_archs(db, [1, 2], {"x86_64": names, "src": names})
+    assert len(queries.statements) == 3
+
+
+def test_postgresql():
+    query = select(models.Packages.id).where(any_of(models.Packages.name, ["bash"]))
+    compiled = query.compile(dialect=postgresql.dialect())
+    assert "packages.name = ANY(%(param_1)s::VARCHAR(255)[])" in str(compiled)
+    assert compiled.params == {"param_1": ["bash"]}
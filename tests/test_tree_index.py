@@ -0,0 +1,155 @@
+# SPDX-License-Identifier: GPL-2.0+
+import datetime
+
+from pytest import fixture, mark
+
+from product_listings_manager import metrics, models, products
+from product_listings_manager.tree_index import TreeIndex
+
+from .factories import PackagesFactory, TreesFactory
+from .test_query_counts import (
+    BUILD,
+    LABEL,
+    MODULE,
+    PACKAGE_NAMES,
+    VERSION,
+    create_product,
+)
+
+NVR = "bash-5.1.8-9.el9"
+NEWER = datetime.datetime.now() + datetime.timedelta(days=1)
+
+
+@fixture
+def koji_build(mock_koji_session):
+    mock_koji_session.getBuild.return_value = {
+        **BUILD,
+        "extra": {"typeinfo": {"module": MODULE}},
+    }
+    yield mock_koji_session
+
+
+@fixture
+def composedb(db, koji_build):
+    koji_build.listRPMs.return_value = create_product(2, 3, debuginfo=True)
+    yield db
+
+
+@fixture
+def tree_index(composedb):
+    tree_index = TreeIndex(products.latest_tree_ids, refresh_interval=3600)
+    tree_index.refresh(composedb)
+    yield tree_index
+
+
+def product(variant="Variant0"):
+    session = TreesFactory._meta.sqlalchemy_session
+    return session.query(models.Products).filter_by(variant=variant).one()
+
+
+def treelist(db, variant="Variant0"):
+    return products.precalc_treelist(db, LABEL, VERSION, variant)
+
+
+@mark.parametrize("version", [None, BUILD["version"], "4.4.19"])
+@mark.parametrize("arch", ["x86_64", "aarch64", "src", "s390x"])
+def test_same_as_query(composedb, tree_index, arch, version):
+    names = PACKAGE_NAMES + ["bash-debuginfo", "missing"]
+    for variant in ("Variant0", "Variant1", ""):
+        trees = treelist(composedb, variant)
+        names_by_arch = {arch: names, "noarch": ["bash-doc"]}
+        expected = products._query_dest_archs(composedb, trees, names_by_arch, version)
+        rows = tree_index.find_packages(composedb, trees, names_by_arch, version)
+        assert sorted(rows) == sorted(tuple(row) for row in expected)
+
+
+def test_unknown_tree(composedb, tree_index):
+    tree = TreesFactory(arch="x86_64", date=NEWER)
+    tree.products.append(product())
+    package = PackagesFactory(name="bash", arch="x86_64", version="6")
+    tree.packages.append(package)
+    TreesFactory._meta.sqlalchemy_session.commit()
+
+    trees = treelist(composedb)
+    assert tree.id in trees
+    assert tree_index.find_packages(composedb, trees, {"x86_64": ["bash"]}) is None
+
+    tree_index.refresh(composedb)
+    assert tree_index.find_packages(composedb, trees, {"x86_64": ["bash"]}, "6") == [
+        ("x86_64", "x86_64", "bash")
+    ]
+    # Superseded tree is removed
+    assert len(tree_index.state.trees) == 6
+    assert tree_index.state.dropped == 1
+
+
+def test_not_imported_tree(composedb, tree_index):
+    tree = TreesFactory(arch="x86_64", date=NEWER, imported=0)
+    tree.products.append(product())
+    package = PackagesFactory(name="bash", arch="x86_64", version="6")
+    tree.packages.append(package)
+    TreesFactory._meta.sqlalchemy_session.commit()
+    tree_index.refresh(composedb)
+
+    trees = treelist(composedb)
+    assert tree_index.find_packages(composedb, trees, {"x86_64": ["bash"]}, "6") == []
+
+    tree.imported = 1
+    TreesFactory._meta.sqlalchemy_session.commit()
+    tree_index.refresh(composedb)
+    assert tree_index.find_packages(composedb, trees, {"x86_64": ["bash"]}, "6") == [
+        ("x86_64", "x86_64", "bash")
+    ]
+
+
+def test_refresh_copies_versions(composedb, tree_index):
+    versions = tree_index.state.packages["bash", "x86_64"]
+    published = dict(versions)
+    tree = TreesFactory(arch="x86_64", date=NEWER)
+    tree.products.append(product())
+    package = PackagesFactory(name="bash", arch="x86_64", version="6")
+    tree.packages.append(package)
+    TreesFactory._meta.sqlalchemy_session.commit()
+    tree_index.refresh(composedb)
+
+    # Lookups in progress keep iterating the unchanged dict
+    assert versions == published
+    assert "6" in tree_index.state.packages["bash", "x86_64"]
+
+
+def test_rebuild_after_removals(composedb, tree_index):
+    for i in range(7):
+        tree = TreesFactory(arch="x86_64", date=NEWER + datetime.timedelta(days=i))
+        tree.products.append(product())
+        TreesFactory._meta.sqlalchemy_session.commit()
+        tree_index.refresh(composedb)
+    assert tree_index.state.dropped == 0
+    assert tree_index.state.next_position == len(tree_index.state.trees) == 6
+
+
+def test_refresh_interval(composedb):
+    tree_index = TreeIndex(products.latest_tree_ids, refresh_interval=3600)
+    trees = treelist(composedb)
+    assert tree_index.find_packages(composedb, trees, {"x86_64": ["bash"]}) == [
+        ("x86_64", "x86_64", "bash")
+    ]
+    state = tree_index.state
+    tree_index.find_packages(composedb, trees, {"x86_64": ["bash"]})
+    assert tree_index.state is state
+    assert state.next_position == 6
+
+
+def test_memory_footprint(tree_index):
+    assert metrics.TREE_INDEX_TREES._value.get() == 6
+    assert metrics.TREE_INDEX_PACKAGES._value.get() == 19
+    assert metrics.TREE_INDEX_BYTES._value.get() == tree_index.state.memory_size()
+
+
+def test_product_listings(client, tree_index, query_counter, monkeypatch):
+    expected = client.get(f"/api/v1.0/product-listings/{LABEL}/{NVR}").json()
+    monkeypatch.setattr(products, "TREE_INDEX", tree_index)
+    with query_counter() as queries:
+        r = client.get(f"/api/v1.0/product-listings/{LABEL}/{NVR}")
+    assert r.status_code == 200, r.text
+    assert r.json() == expected
+    assert not any("tree_packages" in statement for statement, _ in queries.statements)